@@ -0,0 +1,167 @@
+# src/ann_index.py
+"""
+FAISS index construction for the chunk embeddings (inner product on L2-normalized vectors).
+Index types: flat (exact), ivf_flat, ivf_pq, hnsw. Trained types are trained on a random
+sample of the vectors. Indices built with explicit ids take vectors by id: IVF indices
+keep the ids in their inverted lists (with a hashtable direct map for reconstruct and
+remove), flat and HNSW are wrapped in IndexIDMap2. The build parameters are written next to the index file
+(faiss_index.faiss -> faiss_index.params.json) so the retriever can read them back and
+apply the default nprobe / efSearch at query time.
+"""
+import os, json
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+IVF_TYPES = ("ivf_flat", "ivf_pq")
+DEFAULT_PARAMS = {
+    "type": "flat",
+    "nlist": None,          # IVF cells; None -> ~4*sqrt(n)
+    "pq_m": 16,             # PQ sub-quantizers (must divide the embedding dim)
+    "pq_bits": 8,
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "nprobe": 16,           # query-time defaults
+    "ef_search": 64,
+    "train_sample": 50000,
+}
+
+def params_path(index_file):
+    return os.path.splitext(index_file)[0] + ".params.json"
+
+def _nlist(n):
+    # ~4*sqrt(n) cells, but keep >= 39 training points per cell as FAISS recommends
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def make_index(dim, params, n):
+    import faiss
+    kind = params["type"]
+    if kind == "flat":
+        return faiss.IndexFlatIP(dim)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+    nlist = params["nlist"] or _nlist(n)
+    params["nlist"] = nlist
+    quantizer = faiss.IndexFlatIP(dim)
+    if kind == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    if kind == "ivf_pq":
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_bits"], faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"unknown index type {kind!r}, expected one of {INDEX_TYPES}")
+
+def train_index(index, vectors, params, seed=0):
+    if index.is_trained:
+        return
+    n = len(vectors)
+    take = min(n, params["train_sample"])
+    sample = vectors if take == n else vectors[np.random.default_rng(seed).choice(n, take, replace=False)]
+    index.train(np.ascontiguousarray(sample, dtype="float32"))
+
+def new_ann_index(sample, **overrides):
+    """Empty, trained index that takes explicit ids; sample: (m, d) vectors used for training. Returns (index, params)."""
+    import faiss
+    params = {**DEFAULT_PARAMS, **{k: v for k, v in overrides.items() if v is not None}}
+    index = make_index(sample.shape[1], params, len(sample))
+    train_index(index, sample, params)
+    index = with_ids(index, params)
+    apply_search_defaults(index, params)
+    return index, params
+
+def with_ids(index, params):
+    """
+    The index wrapped (or set up) to take explicit int64 ids. IndexIDMap2.remove_ids assumes
+    the inner index renumbers its rows the way IndexFlat does; IVF does not, so an id-mapped
+    IVF index hands out colliding labels after a removal. IVF stores the ids natively instead.
+    """
+    import faiss
+    if params["type"] in IVF_TYPES:
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    return faiss.IndexIDMap2(index)
+
+def needs_training(index_type):
+    return index_type in IVF_TYPES
+
+def build_ann_index(vectors, ids=None, **overrides):
+    """
+    vectors: (n, d) float32, already L2-normalized. ids: optional int64 vector ids.
+    Returns (index, params).
+    """
+    params = {**DEFAULT_PARAMS, **{k: v for k, v in overrides.items() if v is not None}}
+    index = make_index(vectors.shape[1], params, len(vectors))
+    train_index(index, vectors, params)
+    if ids is None:
+        index.add(vectors)
+    else:
+        index = with_ids(index, params)
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    apply_search_defaults(index, params)
+    return index, params
+
+def supports_remove(params, index=None):
+    # HNSW graphs cannot drop vectors, and IVF indices written inside an IndexIDMap2 (by older
+    # builds) cannot do so without corrupting the id map; both are rebuilt instead
+    if params["type"] == "hnsw":
+        return False
+    return not (params["type"] in IVF_TYPES and index is not None and hasattr(index, "id_map"))
+
+def rebuild_params(params):
+    """The stored build parameters as index_params overrides for a rebuild of the same index."""
+    return {k: params[k] for k in DEFAULT_PARAMS if k != "type" and params.get(k) is not None}
+
+def remove_ids(index, ids):
+    import faiss
+    if len(ids):
+        index.remove_ids(faiss.IDSelectorBatch(np.asarray(ids, dtype="int64")))
+
+def apply_search_defaults(index, params):
+    import faiss
+    if params["type"] in IVF_TYPES:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    elif params["type"] == "hnsw":
+        _unwrap(index).hnsw.efSearch = params["ef_search"]
+
+def enable_reconstruct(index, params):
+    # IVF lists need a direct map to reconstruct vectors by id (a hashtable map still allows remove_ids)
+    import faiss
+    if params["type"] in IVF_TYPES:
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+
+def _unwrap(index):
+    import faiss
+    while hasattr(index, "id_map"):  # unwrap IndexIDMap / IndexIDMap2
+        index = faiss.downcast_index(index.index)
+    return index
+
+def search_params(params, nprobe=None, ef_search=None, sel=None):
+    """
+    Per-query FAISS SearchParameters overriding the stored defaults, or None. sel (an
+    IDSelector over vector ids) restricts the search to those ids; the caller keeps it alive.
+    """
+    import faiss
+    if params["type"] in IVF_TYPES and (nprobe is not None or sel is not None):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=nprobe or params["nprobe"])
+    if params["type"] == "hnsw" and (ef_search is not None or sel is not None):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=ef_search or params["ef_search"])
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+def save_index(index, index_file, params):
+    import faiss
+    faiss.write_index(index, index_file)
+    with open(params_path(index_file), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+def load_index(index_file):
+    """Returns (index, params); indices written before params files existed are flat."""
+    import faiss
+    index = faiss.read_index(index_file)
+    params = dict(DEFAULT_PARAMS)
+    if os.path.exists(params_path(index_file)):
+        with open(params_path(index_file), "r", encoding="utf-8") as f:
+            params.update(json.load(f))
+    enable_reconstruct(index, params)
+    apply_search_defaults(index, params)
+    return index, params
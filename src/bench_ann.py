@@ -0,0 +1,75 @@
+# src/bench_ann.py
+"""
+Recall@k vs. query latency of each ANN index type against the exact flat baseline.
+Corpus vectors are read back from the built flat index when it exists, otherwise the
+data/processed chunks are encoded. Queries are sentence-sized slices of random chunks.
+Run from the repo root: python src/bench_ann.py --queries 200 --k 10
+"""
+import argparse, random, time
+import numpy as np
+import faiss
+from ann_index import build_ann_index, load_index
+from embed_index_gpu import EMB_MODEL, INDEX_FILE, collect_chunks
+from model_registry import get_embedder
+
+GRID = [
+    ("ivf_flat", "nprobe", [1, 4, 16, 64]),
+    ("ivf_pq", "nprobe", [1, 4, 16, 64]),
+    ("hnsw", "ef_search", [16, 32, 64, 128]),
+]
+
+def corpus_vectors(chunks):
+    try:
+        index, params = load_index(INDEX_FILE)
+        if params["type"] == "flat" and index.ntotal == len(chunks):
+            return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        pass
+    emb = get_embedder(EMB_MODEL).encode([c["text"] for c in chunks], convert_to_numpy=True, batch_size=32)
+    faiss.normalize_L2(emb)
+    return emb
+
+def query_vectors(chunks, n, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for c in rng.choices(chunks, k=n):
+        words = c["text"].split()
+        start = rng.randrange(max(1, len(words) - 20))
+        texts.append(" ".join(words[start:start + 20]))
+    q = get_embedder(EMB_MODEL).encode(texts, convert_to_numpy=True, batch_size=32)
+    faiss.normalize_L2(q)
+    return q
+
+def timed_search(index, q, k, **kw):
+    t0 = time.perf_counter()
+    for row in q:  # one query at a time, like dense_search
+        index.search(row[None, :], k, **kw)
+    ms = (time.perf_counter() - t0) * 1000 / len(q)
+    _, I = index.search(q, k, **kw)
+    return ms, I
+
+def recall(I, gt):
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(I.tolist(), gt.tolist())]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    chunks = collect_chunks()
+    xb = corpus_vectors(chunks)
+    xq = query_vectors(chunks, args.queries)
+    print(f"corpus {xb.shape[0]} x {xb.shape[1]}, {len(xq)} queries, k={args.k}")
+
+    flat, _ = build_ann_index(xb, type="flat")
+    ms, gt = timed_search(flat, xq, args.k)
+    print(f"{'flat':<10} {'-':<14} recall@{args.k} 1.000  {ms:7.3f} ms/query")
+    for kind, knob, values in GRID:
+        t0 = time.perf_counter()
+        index, params = build_ann_index(xb, type=kind)
+        build_s = time.perf_counter() - t0
+        for v in values:
+            sp = faiss.SearchParametersIVF(nprobe=v) if knob == "nprobe" else faiss.SearchParametersHNSW(efSearch=v)
+            ms, I = timed_search(index, xq, args.k, params=sp)
+            print(f"{kind:<10} {knob + '=' + str(v):<14} recall@{args.k} {recall(I, gt):.3f}  {ms:7.3f} ms/query  (build {build_s:.1f}s)")
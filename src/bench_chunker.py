@@ -0,0 +1,66 @@
+# src/bench_chunker.py
+"""
+Fraction of chunk tokens lost to truncation at encode time, for the old 500-word chunks
+vs. the token-aware chunker, over the data/processed documents:
+  embedder       tokens past --emb_limit (all-mpnet-base-v2 max_seq_length 384)
+  cross-encoder  tokens past --ce_limit minus a --query_tokens query
+Also reports chunk counts, mean / max tokens per chunk and chunking time.
+Run from the repo root: python src/bench_chunker.py --docs 50
+"""
+import argparse, time
+from pathlib import Path
+from utils import load_json
+from chunker import MAX_TOKENS, OVERLAP, chunk_document, get_tokenizer
+
+PROC = "./data/processed"
+
+def word_chunks(text, chunk_size=500):
+    # the previous preprocess.chunk_text
+    words = text.split()
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+def source_docs(n):
+    docs = []
+    for f in sorted(Path(PROC).glob("*.json"))[:n]:
+        j = load_json(str(f))
+        chunks = j.get("chunks") or []
+        if "text" in j:
+            text = j["text"]
+        else:  # legacy {filename, chunks: [str]}
+            text = " ".join(c if isinstance(c, str) else c["text"] for c in chunks)
+        docs.append((j.get("id") or f.stem, text))
+    return docs
+
+def report(name, texts, seconds, tokenizer, emb_limit, ce_limit):
+    lens = [len(ids) + tokenizer.num_special_tokens_to_add()
+            for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]] if texts else [0]
+    total = max(1, sum(lens))
+    lost_emb = sum(max(0, n - emb_limit) for n in lens) / total
+    lost_ce = sum(max(0, n - ce_limit) for n in lens) / total
+    print(f"{name:<14} {len(texts):>7} {sum(lens) / max(1, len(texts)):>8.1f} {max(lens):>6} "
+          f"{lost_emb:>10.1%} {lost_ce:>10.1%} {seconds:>8.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--max_tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=OVERLAP)
+    parser.add_argument("--emb_limit", type=int, default=384)
+    parser.add_argument("--ce_limit", type=int, default=512)
+    parser.add_argument("--query_tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer()
+    docs = source_docs(args.docs)
+    ce_limit = args.ce_limit - args.query_tokens
+    print(f"{len(docs)} documents")
+    print(f"{'chunker':<14} {'chunks':>7} {'mean tok':>8} {'max':>6} {'lost(emb)':>10} {'lost(ce)':>10} {'time':>9}")
+
+    t0 = time.perf_counter()
+    old = [c for _, text in docs for c in word_chunks(text)]
+    report("500 words", old, time.perf_counter() - t0, tokenizer, args.emb_limit, ce_limit)
+
+    t0 = time.perf_counter()
+    new = [c["text"] for doc_id, text in docs
+           for c in chunk_document(doc_id, text, tokenizer=tokenizer, max_tokens=args.max_tokens, overlap=args.overlap)]
+    report("token-aware", new, time.perf_counter() - t0, tokenizer, args.emb_limit, ce_limit)
@@ -0,0 +1,33 @@
+# src/bench_crf.py
+"""
+Per-claim cost of finding CRF perturbation neighbours: kNN graph lookups vs. batched dense
+search (the path used when indices/neighbors/ is missing). The verifier is a constant
+mock so only neighbour retrieval is timed. Evidence lists are the retrieved top-4 for
+queries that are 12-word slices of indexed chunks.
+Run from the repo root after embed_index_gpu.py: python src/bench_crf.py --claims 200
+"""
+import argparse, time
+from pipeline import PipelineContext
+from retriever_gpu import retrieve_batch
+from bench_lexical import known_items
+from crf import fragility_batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--claims", type=int, default=200)
+    parser.add_argument("--n_perturb", type=int, default=5)
+    args = parser.parse_args()
+
+    with_graph = PipelineContext()
+    without_graph = PipelineContext(neighbors_dir="./indices/_no_neighbors")
+    if with_graph.neighbors is None:
+        raise SystemExit("no neighbour graph, run embed_index_gpu.py first")
+    claims = [q for q, _ in known_items(with_graph.meta, args.claims)]
+    evidence = [c[:4] for c in retrieve_batch(claims, ctx=with_graph)]
+    mock = lambda pairs: [0.5] * len(pairs)
+    for name, ctx in (("graph", with_graph), ("dense search", without_graph)):
+        fragility_batch(claims[:2], evidence[:2], mock, n_perturb=args.n_perturb, ctx=ctx)  # warm up
+        t0 = time.perf_counter()
+        fragility_batch(claims, evidence, mock, n_perturb=args.n_perturb, ctx=ctx)
+        dt = time.perf_counter() - t0
+        print(f"{name:<13} {dt * 1000 / len(claims):8.2f} ms/claim  ({len(claims)} claims, {args.n_perturb} perturbations)")
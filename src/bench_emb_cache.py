@@ -0,0 +1,39 @@
+# src/bench_emb_cache.py
+"""
+Encoding time for --chunks processed chunks without the embedding cache, with a cold
+cache (encode + store) and with a warm cache (every text already stored), plus the
+largest difference between cached and freshly encoded vectors (nonzero with --dtype float16).
+Uses a throwaway cache directory. Run from the repo root: python src/bench_emb_cache.py --chunks 2000
+"""
+import argparse, itertools, tempfile, time
+import numpy as np
+from embed_index_gpu import EMB_MODEL, iter_chunks
+from embedding_cache import EmbeddingCache, model_revision
+from model_registry import get_embedder
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dtype", default="float32", choices=["float16", "float32"])
+    args = parser.parse_args()
+
+    texts = [c["text"] for c in itertools.islice(iter_chunks(), args.chunks)]
+    model = get_embedder(EMB_MODEL)
+    encode = lambda ts: model.encode(ts, convert_to_numpy=True, batch_size=16)
+    encode(texts[:16])  # load / warm up outside the timings
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(EMB_MODEL, model_revision(model), dtype=args.dtype, path=tmp)
+        t0 = time.perf_counter()
+        ref = encode(texts)
+        t_none = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cache.encode(texts, encode)
+        t_cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        warm = cache.encode(texts, encode)
+        t_warm = time.perf_counter() - t0
+        print(f"{len(texts)} chunks, {args.dtype} cache ({cache.stats()['mb']:.1f} MB)")
+        for name, t in (("no cache", t_none), ("cold cache", t_cold), ("warm cache", t_warm)):
+            print(f"{name:<11} {t:8.2f}s  {len(texts) / t:10.0f} chunks/s")
+        print(f"max |cached - fresh| {np.abs(warm - ref).max():.2e}")
+        cache.close()
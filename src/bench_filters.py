@@ -0,0 +1,61 @@
+# src/bench_filters.py
+"""
+Latency and quality of period-scoped retrieval. Queries are known items (a 12-word slice
+of a random indexed chunk) scoped to the chunk's fiscal year, or to its document for
+--scope doc (a question about one specific circular):
+  unfiltered    dense top-8 over the whole corpus
+  post-filter   dense top-40, then drop hits outside the scope (the alternative to pushing filters down)
+  pre-filter    dense top-8 with the filter applied before the search (rows_matching + exact / IDSelector)
+precision@8 is the share of returned hits inside the scope, recall@8 whether the source chunk is returned.
+Query embeddings are computed once up front, so timings cover the search and the filter.
+Run from the repo root after embed_index_gpu.py: python src/bench_filters.py --queries 200 --scope fiscal_year
+"""
+import argparse, time
+import numpy as np
+from pipeline import get_context
+from retriever_gpu import RERANK_K, TOP_K, _encode, dense_search_batch
+from bench_lexical import known_items
+
+def evaluate(results, items, scopes, ctx):
+    prec = [np.mean([ctx.meta.attrs(h["row"]).get(key) == want for h in hits[:RERANK_K]]) if hits else 0.0
+            for hits, (key, want) in zip(results, scopes)]
+    rec = [any(h["row"] == row for h in hits[:RERANK_K]) for hits, (_, row) in zip(results, items)]
+    return float(np.mean(prec)), float(np.mean(rec))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scope", default="fiscal_year", help="fiscal_year, year, doc_type, issuer or doc")
+    args = parser.parse_args()
+
+    ctx = get_context()
+    key = "doc_id" if args.scope == "doc" else args.scope
+    items = [(q, row) for q, row in known_items(ctx.meta, args.queries * 2) if ctx.meta.attrs(row).get(key) is not None]
+    items = items[:args.queries]
+    if not items:
+        raise SystemExit(f"no indexed chunks with a {key} attribute, re-run embed_index_gpu.py")
+    scopes = [(key, ctx.meta.attrs(row)[key]) for _, row in items]
+    filters = [{k: v} for k, v in scopes]
+    queries = [q for q, _ in items]
+    q_emb = _encode(queries, ctx)
+    sizes = [len(ctx.meta.rows_matching(f)) for f in filters[:20]]
+    print(f"{len(items)} queries scoped by {key}; mean scope {np.mean(sizes):.0f} of {int(np.sum(ctx.meta.alive))} live rows")
+
+    def post_filter():
+        res = dense_search_batch(queries, k=TOP_K, ctx=ctx, q_emb=q_emb)
+        return [[h for h in hits if ctx.meta.attrs(h["row"]).get(k) == v] for hits, (k, v) in zip(res, scopes)]
+
+    methods = {
+        "unfiltered": lambda: dense_search_batch(queries, k=RERANK_K, ctx=ctx, q_emb=q_emb),
+        "post-filter": post_filter,
+        "pre-filter": lambda: dense_search_batch(queries, k=RERANK_K, ctx=ctx, q_emb=q_emb, filters=filters),
+    }
+    print(f"{'method':<12} {'ms/query':>9} {'precision@8':>12} {'recall@8':>9} {'hits/query':>11}")
+    for name, fn in methods.items():
+        fn()  # warm up
+        t0 = time.perf_counter()
+        results = fn()
+        dt = (time.perf_counter() - t0) * 1000 / len(queries)
+        p, r = evaluate(results, items, scopes, ctx)
+        n = np.mean([min(len(h), RERANK_K) for h in results])
+        print(f"{name:<12} {dt:>9.2f} {p:>12.3f} {r:>9.3f} {n:>11.1f}")
@@ -0,0 +1,69 @@
+# src/bench_generation.py
+"""
+Generated tokens/s and time-to-first-token of generate_answers at batch sizes 1..16,
+for the same --prompts prompts (questions x processed-chunk evidence). TTFT is the time
+from the generate call until the first decoded token of its batch; --stream also times
+stream_answer for a single prompt. --precision picks the generator build (8bit on CUDA,
+int8 / onnx / fp32 on CPU; default: what generate_answers would use on this host).
+Run from the repo root: python src/bench_generation.py --prompts 16 --max_new_tokens 64
+"""
+import argparse, time
+import numpy as np
+from transformers.generation.streamers import BaseStreamer
+from bench_registry import QUESTIONS, sample_evidence
+from generator_gpu import generate_answers, generator_precision, load_generator, stream_answer
+
+class FirstTokenTimer(BaseStreamer):
+    """Records when generate emits its first new token (the first put() carries the decoder start ids)."""
+    def __init__(self):
+        self.puts = 0
+        self.first = []
+
+    def put(self, value):
+        self.puts += 1
+        if self.puts == 2:
+            self.first.append(time.perf_counter())
+
+    def end(self):
+        self.puts = 0
+
+def run(prompts, evidence, batch_size, max_new_tokens, precision):
+    tokenizer, _ = load_generator(precision=precision)
+    timer = FirstTokenTimer()
+    starts, n_tokens = [], 0
+    t0 = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        qs = prompts[i:i + batch_size]
+        starts.append(time.perf_counter())
+        answers = generate_answers(qs, [evidence] * len(qs), max_new_tokens=max_new_tokens, max_batch=batch_size,
+                                   max_tokens=10**9, precision=precision, streamer=timer)
+        n_tokens += sum(len(ids) for ids in tokenizer(answers, add_special_tokens=False)["input_ids"])
+    wall = time.perf_counter() - t0
+    ttft = [f - s for s, f in zip(starts, timer.first)]
+    return n_tokens / wall, float(np.mean(ttft)) if ttft else float("nan"), wall / len(prompts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=16)
+    parser.add_argument("--max_new_tokens", type=int, default=64)
+    parser.add_argument("--precision", help="8bit, int8, onnx or fp32")
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args()
+
+    precision = args.precision or generator_precision()
+    evidence = sample_evidence()
+    prompts = [QUESTIONS[i % len(QUESTIONS)] + f" (#{i})" for i in range(args.prompts)]
+    generate_answers(prompts[:1], [evidence], max_new_tokens=4, precision=precision)  # load + warm up
+    print(f"generator precision {precision}, {args.prompts} prompts, max_new_tokens {args.max_new_tokens}")
+    print(f"{'batch':>5} {'tokens/s':>10} {'TTFT ms':>9} {'s/prompt':>9}")
+    for bs in (1, 2, 4, 8, 16):
+        tps, ttft, per = run(prompts, evidence, bs, args.max_new_tokens, precision)
+        print(f"{bs:>5} {tps:>10.1f} {ttft * 1000:>9.1f} {per:>9.3f}")
+    if args.stream:
+        t0 = time.perf_counter()
+        first, pieces = None, 0
+        for piece in stream_answer(prompts[0], evidence, [], max_new_tokens=args.max_new_tokens, precision=precision):
+            first = first or time.perf_counter()
+            pieces += 1
+        total = time.perf_counter() - t0
+        print(f"stream_answer: first text after {((first or t0 + total) - t0) * 1000:.1f} ms, {pieces} pieces in {total:.2f}s")
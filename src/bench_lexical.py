@@ -0,0 +1,54 @@
+# src/bench_lexical.py
+"""
+Latency and recall@8 of the lexical paths on known-item queries (a 12-word slice of a
+random indexed chunk; the relevant row is that chunk):
+  dense+fuzz     dense top-40 reranked with fuzz.partial_ratio (the old path)
+  dense+bm25     dense top-40 reranked with vectorized BM25
+  hybrid-rrf     dense top-40 U BM25 top-40, reciprocal-rank fusion
+  hybrid-weight  same union, weighted cosine + normalized BM25
+Timings exclude the shared dense search for the dense+ rows; hybrid rows include their own.
+Run from the repo root after embed_index_gpu.py: python src/bench_lexical.py --queries 200
+"""
+import argparse, random, time
+from pipeline import get_context
+from retriever_gpu import RERANK_K, dense_search, hybrid_rerank, hybrid_search, lexical_score
+
+def known_items(store, n, seed=0):
+    rng = random.Random(seed)
+    live = [i for i in range(len(store)) if store.alive[i]]
+    items = []
+    for row in rng.sample(live, min(n, len(live))):
+        words = store.text(row).split()
+        start = rng.randrange(max(1, len(words) - 12))
+        items.append((" ".join(words[start:start + 12]), row))
+    return items
+
+def fuzz_rerank(query, cands):
+    for c in cands:
+        c["combined"] = 0.6 * c["score"] + 0.4 * lexical_score(query, c["text"])
+    return sorted(cands, key=lambda c: c["combined"], reverse=True)[:RERANK_K]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    ctx = get_context()
+    items = known_items(ctx.meta, args.queries)
+    dense_search(items[0][0], ctx=ctx)  # load embedder + index outside the timings
+    methods = {
+        "dense+fuzz": lambda q, d: fuzz_rerank(q, d),
+        "dense+bm25": lambda q, d: hybrid_rerank(q, d, ctx=ctx),
+        "hybrid-rrf": lambda q, d: hybrid_search(q, ctx=ctx)[:RERANK_K],
+        "hybrid-weight": lambda q, d: hybrid_search(q, ctx=ctx, fusion="weighted")[:RERANK_K],
+    }
+    print(f"{len(items)} known-item queries, recall@{RERANK_K}")
+    for name, fn in methods.items():
+        found, total = 0, 0.0
+        for q, row in items:
+            dense = dense_search(q, ctx=ctx)
+            t0 = time.perf_counter()
+            top = fn(q, dense)
+            total += time.perf_counter() - t0
+            found += any(h["row"] == row for h in top)
+        print(f"{name:<14} recall {found / len(items):.3f}  {total * 1000 / len(items):8.2f} ms/query")
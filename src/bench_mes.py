@@ -0,0 +1,52 @@
+# src/bench_mes.py
+"""
+Compare MES strategies with a mock verifier as the candidate set grows. The mock
+entails the claim iff a hidden set of required chunks is present (partial sets get a
+partial score, so per-chunk importance carries signal), and can simulate
+per-call and per-pair model cost so batching shows up in wall time. calls are the subsets
+the sequential algorithm scores (comparable across strategies); pairs are those actually sent
+to the verifier, which batched greedy inflates by scoring a whole pass at once.
+Run from the repo root: python src/bench_mes.py --sizes 4,8,16,32,64 --required 2
+"""
+import argparse, random, time
+from mes import STRATEGIES, minimal_evidence_set
+
+def mock_verifier(required, call_ms, pair_ms):
+    def score(texts):
+        found = len(required & set(texts))
+        return 0.95 if found == len(required) else 0.10 + 0.5 * found / len(required)
+
+    def predict(claim, texts):
+        time.sleep((call_ms + pair_ms) / 1000)
+        return score(texts)
+
+    def predict_batch(pairs):
+        time.sleep((call_ms + pair_ms * len(pairs)) / 1000)
+        return [score(texts) for _, texts in pairs]
+    return predict, predict_batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="4,8,16,32,64")
+    parser.add_argument("--required", type=int, default=2)
+    parser.add_argument("--call_ms", type=float, default=5.0, help="simulated fixed cost per verifier invocation")
+    parser.add_argument("--pair_ms", type=float, default=1.0, help="simulated cost per scored pair")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'n':>4} {'strategy':<16} {'calls':>7} {'pairs':>7} {'batches':>8} {'wall_s':>8}  mes")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        candidates = [{"chunk_id": f"c{i}", "text": f"chunk {i}"} for i in range(n)]
+        required = {c["text"] for c in rng.sample(candidates, min(args.required, n))}
+        predict, predict_batch = mock_verifier(required, args.call_ms, args.pair_ms)
+        for strategy in STRATEGIES:
+            for batched in ([False, True] if strategy in ("greedy", "importance") else [False]):
+                stats = {}
+                t0 = time.perf_counter()
+                S, _ = minimal_evidence_set("claim", candidates, predict, verifier_predict_batch=predict_batch if batched else None,
+                                            strategy=strategy, stats=stats)
+                wall = time.perf_counter() - t0
+                assert {c["text"] for c in S} == required, (strategy, S)
+                name = strategy + ("+batch" if batched else "")
+                print(f"{n:>4} {name:<16} {stats['verifier_calls']:>7} {stats['verifier_pairs']:>7} {stats['verifier_batches']:>8} {wall:>8.3f}  {[c['chunk_id'] for c in S]}")
@@ -0,0 +1,53 @@
+# src/bench_meta_store.py
+"""
+Load time, RSS growth and random-access latency of the memory-mapped meta store vs. the
+old indented vectors_meta.json dict, on a synthetic corpus of --rows chunks.
+Run from the repo root: python src/bench_meta_store.py --rows 200000
+"""
+import argparse, json, os, random, tempfile, time
+from meta_store import MetaStore
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def synth_rows(n, seed=0):
+    rng = random.Random(seed)
+    words = ["tax", "notification", "section", "return", "GSTR-3B", "FY2024", "rate", "goods", "services", "council"]
+    for i in range(n):
+        doc = f"doc-{i // 40}"
+        yield i, {"doc_id": doc, "chunk_id": f"{doc}_{i % 40}", "text": " ".join(rng.choices(words, k=200)), "meta": {"page": i % 40}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    json_path = os.path.join(tmp, "vectors_meta.json")
+    rows = list(synth_rows(args.rows))
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({i: r for i, r in rows}, f, indent=2)
+    MetaStore.create(rows, os.path.join(tmp, "meta"))
+    del rows
+    probe = [random.randrange(args.rows) for _ in range(args.lookups)]
+
+    r0, t0 = rss_mb(), time.perf_counter()
+    store = MetaStore(os.path.join(tmp, "meta"))
+    load_s, r1 = time.perf_counter() - t0, rss_mb()
+    t0 = time.perf_counter()
+    for i in probe:
+        store.get(i)
+    get_us = (time.perf_counter() - t0) * 1e6 / len(probe)
+    print(f"meta store: load {load_s * 1000:8.1f} ms  rss +{r1 - r0:7.1f} MB  get {get_us:6.1f} us")
+
+    r0, t0 = rss_mb(), time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+    load_s, r1 = time.perf_counter() - t0, rss_mb()
+    t0 = time.perf_counter()
+    for i in probe:
+        mapping.get(str(i)) or mapping.get(i)
+    get_us = (time.perf_counter() - t0) * 1e6 / len(probe)
+    print(f"json dict:  load {load_s * 1000:8.1f} ms  rss +{r1 - r0:7.1f} MB  get {get_us:6.1f} us")
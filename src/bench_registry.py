@@ -0,0 +1,59 @@
+# src/bench_registry.py
+"""
+Per-query latency of generate_answer with a cold registry (models reloaded for every
+query, the old behaviour) vs. a warm registry (models loaded once up front).
+Run from the repo root: python src/bench_registry.py --n 5
+"""
+import argparse, statistics, time
+from pathlib import Path
+from utils import load_json
+from model_registry import registry
+from generator_gpu import GEN_MODEL, generate_answer
+
+PROC = "./data/processed"
+QUESTIONS = [
+    "What is the extended due date for filing GSTR-3B?",
+    "Which districts are covered by the notification?",
+    "What is the rate of tax notified in the circular?",
+    "Who issued the notification and under which section?",
+]
+
+def sample_evidence(n=4):
+    ev = []
+    for f in sorted(Path(PROC).glob("*.json")):
+        j = load_json(str(f))
+        for i, c in enumerate(j.get("chunks", [])):
+            text = c if isinstance(c, str) else c.get("text", "")
+            ev.append({"doc_id": j.get("id", f.stem), "chunk_id": f"{f.stem}_{i}", "meta": {"text": text}})
+            if len(ev) >= n:
+                return ev
+    return ev
+
+def run(n, model_path, use_8bit, cold):
+    evidence = sample_evidence()
+    lat = []
+    for i in range(n):
+        if cold:
+            registry.clear()
+        t0 = time.perf_counter()
+        generate_answer(QUESTIONS[i % len(QUESTIONS)], evidence, [], model_path=model_path, use_8bit=use_8bit)
+        lat.append(time.perf_counter() - t0)
+    return lat
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=5)
+    parser.add_argument("--model_path", default=GEN_MODEL)
+    parser.add_argument("--use_8bit", action="store_true")
+    args = parser.parse_args()
+
+    cold = run(args.n, args.model_path, args.use_8bit, cold=True)
+    registry.clear()
+    t0 = time.perf_counter()
+    registry.warmup([("generator", args.model_path, "8bit" if args.use_8bit else "fp32")])
+    print(f"warmup: {time.perf_counter() - t0:.2f}s")
+    warm = run(args.n, args.model_path, args.use_8bit, cold=False)
+    for name, lat in [("cold", cold), ("warm", warm)]:
+        print(f"{name}: mean {statistics.mean(lat):.2f}s  median {statistics.median(lat):.2f}s  over {len(lat)} queries")
+    for r in registry.memory_report():
+        print(f"{r['kind']:<14} {r['path']:<40} {r['precision']:<5} {r['mb']:8.1f} MB  load {r['load_s']:.2f}s")
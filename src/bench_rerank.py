@@ -0,0 +1,105 @@
+# src/bench_rerank.py
+"""
+Rerank latency and NDCG@8 of the reranking cascade (rerank_cascade) against the current
+single-stage path, where the full-precision cross-encoder scores all TOP_K candidates with
+batch_size=16. Queries are bench_registry.QUESTIONS plus --n pseudo-queries (the opening
+words of random indexed chunks); candidates come from candidates_batch, and every
+configuration reranks the same candidates one query at a time, as a request would.
+
+Relevance: with --qrels (JSONL {"question", "relevant": [chunk_id, ..]}) binary gains from
+those labels; otherwise graded gains from the single-stage fp32 cross-encoder scores, so
+NDCG@8 measures how closely a configuration reproduces the current ranking. Also prints
+the quantization_report of each quantized build, and the cross-encoder pairs scored and
+early exits per query.
+Run from the repo root: python src/bench_rerank.py --n 60 --precisions fp32 int8 onnx-int8
+"""
+import argparse, json, math, random, time
+import numpy as np
+from bench_registry import QUESTIONS
+from pipeline import get_context
+from rerank_cascade import CE_BATCH, PRUNE_N, RERANKER_PATH, RerankCascade, quantization_report
+from retriever_gpu import RERANK_K, candidates_batch, hybrid_rerank_batch
+from model_registry import get_reranker
+
+def pseudo_queries(n, ctx, seed=0):
+    rng = random.Random(seed)
+    store = ctx.meta
+    out = []
+    for _ in range(n * 4):
+        row = store.get(rng.randrange(len(store)))
+        words = (row or {}).get("text", "").split()
+        if len(words) >= 20:
+            out.append(" ".join(words[:12]))
+        if len(out) == n:
+            break
+    return out
+
+def ndcg(ranked, gains, k=RERANK_K):
+    dcg = sum(gains.get(c, 0.0) / math.log2(i + 2) for i, c in enumerate(ranked[:k]))
+    ideal = sum(g / math.log2(i + 2) for i, g in enumerate(sorted(gains.values(), reverse=True)[:k]))
+    return dcg / ideal if ideal > 0 else 0.0
+
+def run(name, rerank, queries, cand_lists, gains):
+    lat, scores = [], []
+    for q, cands, g in zip(queries, cand_lists, gains):
+        cands = [dict(c) for c in cands]  # rerankers write scores into the hits
+        t0 = time.perf_counter()
+        top = rerank(q, cands)
+        lat.append(time.perf_counter() - t0)
+        scores.append(ndcg([c["chunk_id"] for c in top], g))
+    a = np.asarray(lat) * 1000
+    return {"config": name, "p50_ms": float(np.percentile(a, 50)), "p99_ms": float(np.percentile(a, 99)),
+            "mean_ms": float(a.mean()), "ndcg@8": float(np.mean(scores))}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=60, help="pseudo-queries on top of the fixed questions")
+    parser.add_argument("--path", default=RERANKER_PATH)
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "int8"])
+    parser.add_argument("--prune", nargs="+", type=int, default=[24, PRUNE_N, 12])
+    parser.add_argument("--qrels", help="JSONL with question / relevant chunk ids")
+    args = parser.parse_args()
+
+    precisions = ["fp32"] + [p for p in args.precisions if p != "fp32"]  # fp32 single-stage is the baseline
+    ctx = get_context()
+    if args.qrels:
+        with open(args.qrels, "r", encoding="utf-8") as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+        queries = [x["question"] for x in labels]
+    else:
+        queries = QUESTIONS + pseudo_queries(args.n, ctx)
+    cand_lists = candidates_batch(queries, ctx=ctx)
+    full = get_reranker(args.path, "fp32")
+    for p in precisions:
+        get_reranker(args.path, p).predict([(queries[0], "warm up")])
+    if args.qrels:
+        gains = [{c: 1.0 for c in x["relevant"]} for x in labels]
+    else:
+        gains = []
+        for q, cands in zip(queries, cand_lists):
+            s = full.predict([(q, c.get("meta", {}).get("text", "")) for c in cands], batch_size=CE_BATCH)
+            gains.append({c["chunk_id"]: float(v) for c, v in zip(cands, s)})
+    print(f"{len(queries)} queries, {np.mean([len(c) for c in cand_lists]):.0f} candidates each")
+
+    for p in precisions[1:]:
+        print(json.dumps(quantization_report(queries, cand_lists, p, path=args.path)))
+
+    rows = []
+    for p in precisions:
+        scorer = get_reranker(args.path, p)
+        single = lambda q, cands: hybrid_rerank_batch([q], [cands], cross_encoder=scorer, ctx=ctx, batch_size=CE_BATCH)[0]
+        rows.append(run(f"single {p}", single, queries, cand_lists, gains))
+        rows[-1]["pairs/q"] = float(np.mean([len(c) for c in cand_lists]))
+        for n in args.prune:
+            for early in (False, True):
+                cascade = RerankCascade(scorer=scorer, prune_n=n, early_exit=early)
+                row = run(f"cascade {n}{' exit' if early else ''} {p}", lambda q, c: cascade.rerank(q, c, ctx=ctx),
+                          queries, cand_lists, gains)
+                row["pairs/q"] = cascade.pairs / len(queries)
+                row["exits"] = cascade.exits
+                rows.append(row)
+    base = rows[0]["mean_ms"]
+    print(f"{'config':<26} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8} {'NDCG@8':>7} {'pairs/q':>8} {'exits':>6}")
+    for r in rows:
+        print(f"{r['config']:<26} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {base / r['mean_ms']:>7.1f}x {r['ndcg@8']:>7.3f} "
+              f"{r.get('pairs/q', float('nan')):>8.1f} {r.get('exits', ''):>6}")
@@ -0,0 +1,43 @@
+# src/bench_retrieval_batch.py
+"""
+Queries/second of retrieve() called once per query vs. retrieve_batch() at several batch
+sizes, optionally with a cross-encoder. Queries are 12-word slices of indexed chunks.
+Run from the repo root after embed_index_gpu.py: python src/bench_retrieval_batch.py --queries 256
+"""
+import argparse, random, time
+from pipeline import PipelineContext
+from retriever_gpu import retrieve, retrieve_batch
+
+def sample_queries(store, n, seed=0):
+    rng = random.Random(seed)
+    live = [i for i in range(len(store)) if store.alive[i]]
+    out = []
+    for row in rng.choices(live, k=n):
+        words = store.text(row).split()
+        start = rng.randrange(max(1, len(words) - 12))
+        out.append(" ".join(words[start:start + 12]))
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch_sizes", default="8,32,128")
+    parser.add_argument("--cross_encoder", help="path or hub id of a CrossEncoder, e.g. ./models/reranker")
+    args = parser.parse_args()
+
+    ctx = PipelineContext(cross_encoder_path=args.cross_encoder)
+    queries = sample_queries(ctx.meta, args.queries)
+    ce = ctx.cross_encoder
+    retrieve(queries[0], cross_encoder=ce, ctx=ctx)  # warm models and index
+
+    t0 = time.perf_counter()
+    for q in queries:
+        retrieve(q, cross_encoder=ce, ctx=ctx)
+    base = len(queries) / (time.perf_counter() - t0)
+    print(f"{'per-query':<12} {base:8.1f} q/s")
+    for bs in [int(b) for b in args.batch_sizes.split(",")]:
+        t0 = time.perf_counter()
+        for i in range(0, len(queries), bs):
+            retrieve_batch(queries[i:i + bs], cross_encoder=ce, ctx=ctx)
+        rate = len(queries) / (time.perf_counter() - t0)
+        print(f"{'batch=' + str(bs):<12} {rate:8.1f} q/s  ({rate / base:.1f}x)")
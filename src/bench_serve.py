@@ -0,0 +1,82 @@
+# src/bench_serve.py
+"""
+Load generator for serve.RAGService. Requests arrive open-loop (Poisson, --qps) for
+--duration seconds; reports achieved QPS, p50/p99 latency to evidence, answer and the
+complete response, deadline errors and the mean batch size per stage.
+--fake replaces the models with sleeps (fixed + per-item cost per batch, see FAKE_COST_MS)
+so the serving layer can be load-tested on any machine; --max_batch 1 shows the
+unbatched baseline.
+Run from the repo root: python src/bench_serve.py --fake --qps 50 --duration 20
+"""
+import argparse, asyncio, random, time
+import numpy as np
+from serve import RAGService, MAX_BATCH, MAX_WAIT_MS
+
+# stage -> (ms per batch, ms per item), roughly a GPU host with flan-t5-large
+FAKE_COST_MS = {"search": (4, 0.5), "rerank": (6, 2), "generate": (250, 40), "verify": (8, 1.5)}
+QUESTIONS = [
+    "What is the extended due date for filing GSTR-3B?",
+    "Which districts are covered by the notification?",
+    "What is the rate of tax notified in the circular?",
+    "Who issued the notification and under which section?",
+]
+
+def _sleeper(stage, make_result):
+    fixed, per_item = FAKE_COST_MS[stage]
+
+    def fn(items):
+        time.sleep((fixed + per_item * len(items)) / 1000)
+        return [make_result(x) for x in items]
+    return fn
+
+def fake_stage_fns(n_claims=2):
+    cands = lambda item: [{"doc_id": "doc", "chunk_id": f"doc_{i}", "score": 1.0 - i / 40, "meta": {"text": f"chunk {i}"}}
+                       for i in range(40)]
+    rng = random.Random(0)
+    return {
+        "search": _sleeper("search", cands),
+        "rerank": _sleeper("rerank", lambda item: item[1][:8]),
+        "generate": _sleeper("generate", lambda item: ". ".join(f"Claim {i} [0]" for i in range(n_claims))),
+        "verify": _sleeper("verify", lambda pair: rng.random()),
+        "claims": lambda answer: [{"text": s, "citations": []} for s in answer.split(". ")],
+    }
+
+async def one(service, question, timeout_s, results):
+    t0 = time.perf_counter()
+    marks = {}
+    async for ev in service.ask(question, timeout_s):
+        marks.setdefault(ev["type"], time.perf_counter() - t0)
+    results.append(marks)
+
+async def main(args):
+    fns = fake_stage_fns() if args.fake else None
+    results = []
+    async with RAGService(stage_fns=fns, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms) as service:
+        rng = random.Random(1)
+        tasks = []
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < args.duration:
+            tasks.append(asyncio.create_task(one(service, rng.choice(QUESTIONS), args.timeout_s, results)))
+            await asyncio.sleep(rng.expovariate(args.qps))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - t0
+        stats = service.stats()
+    done = [r for r in results if "done" in r]
+    print(f"{len(results)} requests in {wall:.1f}s: {len(done) / wall:.1f} QPS completed, "
+          f"{sum('error' in r for r in results)} deadline errors")
+    for key in ("evidence", "answer", "done"):
+        lat = np.array([r[key] for r in results if key in r]) * 1000
+        if len(lat):
+            print(f"  {key:<9} p50 {np.percentile(lat, 50):8.1f} ms   p99 {np.percentile(lat, 99):8.1f} ms")
+    for name, st in stats.items():
+        print(f"  {name:<9} {st['batches']:>6} batches, mean batch {st['mean_batch']:.2f}, {st['expired']} expired")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--timeout_s", type=float, default=10)
+    parser.add_argument("--max_batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max_wait_ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--fake", action="store_true", help="simulate the models with sleeps")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,51 @@
+# src/bench_startup.py
+"""
+Import time and peak RSS of each pipeline module, each measured in a fresh interpreter.
+Pass --against <git ref> to measure that revision's src/ as well (e.g. --against HEAD~1).
+Run from the repo root: python src/bench_startup.py --against e505d5c
+"""
+import argparse, os, subprocess, sys, tarfile, tempfile, io, json
+
+MODULES = ["retriever_gpu", "verifier_api", "embed_index_gpu", "claim_extractor", "crf", "evaluate"]
+
+PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+try:
+    import {mod}
+    err = None
+except BaseException as e:
+    err = type(e).__name__ + ": " + str(e)[:80]
+dt = time.perf_counter() - t0
+print(json.dumps({{"s": dt, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "err": err}}))
+"""
+
+def measure(src_dir, mod):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(src_dir))
+    out = subprocess.run([sys.executable, "-c", PROBE.format(mod=mod)], env=env, capture_output=True, text=True)
+    try:
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {"s": float("nan"), "rss_mb": float("nan"), "err": out.stderr.strip().splitlines()[-1:]}
+
+def checkout_src(ref, dest):
+    blob = subprocess.run(["git", "archive", ref, "src"], capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(blob)) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, "src")
+
+def report(label, src_dir):
+    print(f"== {label}")
+    for mod in MODULES:
+        r = measure(src_dir, mod)
+        note = f"  ({r['err']})" if r["err"] else ""
+        print(f"{mod:<18} {r['s']:7.2f}s  {r['rss_mb']:8.1f} MB{note}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--against", help="git ref to compare with, e.g. the baseline commit")
+    args = parser.parse_args()
+    report("working tree", os.path.dirname(os.path.abspath(__file__)))
+    if args.against:
+        with tempfile.TemporaryDirectory() as tmp:
+            report(args.against, checkout_src(args.against, tmp))
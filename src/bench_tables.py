@@ -0,0 +1,43 @@
+# src/bench_tables.py
+"""
+Table-store (SQL probe) load and probe cost. Loads data/processed into a fresh store, then
+reloads it (the incremental no-op path), then probes with known-item questions built
+from a random numeric cell's row and column labels; hit@k counts probes whose top-k
+returns that cell.
+Run from the repo root after ingest.py: python src/bench_tables.py --probes 500
+"""
+import argparse, os, random, shutil, tempfile, time
+import numpy as np
+from table_store import PROC, SQL_K, TableStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--proc", default=PROC)
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--k", type=int, default=SQL_K)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        store = TableStore(os.path.join(tmp, "tables.sqlite"))
+        for name in ("load", "reload"):
+            t0 = time.perf_counter()
+            stats = store.load_processed(args.proc)
+            print(f"{name:<7} {time.perf_counter() - t0:8.2f}s  {stats}")
+        cells = store._db.execute("SELECT table_id, row_label, col_label, raw FROM cells "
+                                  "WHERE value IS NOT NULL AND row_label != '' AND col_label != ''").fetchall()
+        print(f"{len(store)} tables, {len(cells)} labelled numeric cells")
+        if not cells:
+            raise SystemExit("no tables with labelled numeric cells in " + args.proc)
+        rng = random.Random(0)
+        lat, hits = [], 0
+        for tid, row, col, raw in rng.sample(cells, min(args.probes, len(cells))):
+            t0 = time.perf_counter()
+            found = store.probe(f"What is the {row} for {col}?", k=args.k)
+            lat.append(time.perf_counter() - t0)
+            hits += any((h["table_id"], h["row"], h["col"], h["raw"]) == (tid, row, col, raw) for h in found)
+        lat = np.array(lat) * 1000
+        print(f"probe   p50 {np.percentile(lat, 50):.2f} ms  p99 {np.percentile(lat, 99):.2f} ms  "
+              f"hit@{args.k} {hits / len(lat):.3f}  ({len(lat)} probes)")
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,44 @@
+# src/bench_tracing.py
+"""
+Cost of the tracing layer per traced call: disabled (the default), metrics only, and
+metrics plus the JSONL trace file; plus the cost of a nested span() block. The per-call
+numbers are what a pipeline stage pays on top of its own work (a verifier forward or a
+generate call takes milliseconds, so anything in the microseconds is noise).
+Run from the repo root: python src/bench_tracing.py --n 200000
+"""
+import argparse, os, tempfile, time
+import tracing
+
+@tracing.traced("bench.stage", batch=0)
+def stage(items):
+    return len(items)
+
+def per_call_ns(fn, n):
+    items = [0] * 8
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(items)
+    return (time.perf_counter() - t0) / n * 1e9
+
+def nested(items):
+    with tracing.span("bench.outer", batch=len(items)):
+        return stage(items)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "trace.jsonl")
+    base = per_call_ns(stage.__wrapped__, args.n)
+    print(f"{'setup':<22} {'traced call ns':>15} {'overhead ns':>12} {'nested ns':>10}")
+    for name, setup in (("disabled", tracing.disable), ("metrics only", lambda: tracing.enable(None)),
+                        ("metrics + jsonl", lambda: tracing.enable(path, append=False))):
+        setup()
+        ns = per_call_ns(stage, args.n)
+        nest = per_call_ns(nested, args.n // 2)
+        print(f"{name:<22} {ns:>15.0f} {ns - base:>12.0f} {nest:>10.0f}")
+    tracing.disable()
+    print(f"untraced call {base:.0f} ns; trace file {os.path.getsize(path) / 1e6:.1f} MB")
+    os.remove(path)
+    os.rmdir(tmp)
@@ -0,0 +1,90 @@
+# src/bench_train_data.py
+"""
+Training throughput of the fine-tuning data pipelines on a synthetic (claim, evidence)
+JSONL written to a temp dir (claims and evidence are slices of data/processed chunks, so
+lengths vary like real pairs). One epoch of forward + backward + AdamW step per setup:
+  max_length    padding="max_length" (256), fixed batches of --batch_size (the old setup)
+  dynamic       same batches, padded per batch by DataCollatorWithPadding
+  bucketed      length-bucketed token-budget batches (train_data.TokenBudgetBatchSampler)
+tokens/s counts real (non-pad) tokens; pad% is the share of padded positions. Also times
+pretokenize cold vs. from its on-disk cache.
+Run from the repo root: python src/bench_train_data.py --n 1024 --model cross-encoder/ms-marco-MiniLM-L-6-v2
+"""
+import argparse, json, os, random, shutil, tempfile, time
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from bench_verifier import make_pairs
+from train_data import MAX_BATCH, MAX_BATCH_TOKENS, MAX_LENGTH, TokenBudgetBatchSampler, collator, model_inputs, pretokenize
+
+def write_jsonl(path, n, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for claim, evidence in make_pairs(n, seed):
+            f.write(json.dumps({"claim": claim, "evidence": " ".join(evidence), "label": rng.randrange(3)}) + "\n")
+
+def run_epoch(model, batches, device):
+    opt = torch.optim.AdamW(model.parameters(), lr=2e-5)
+    model.train()
+    real = padded = 0
+    t0 = time.perf_counter()
+    for batch in batches:
+        batch = {k: v.to(device) for k, v in batch.items()}
+        loss = model(**batch).loss
+        loss.backward()
+        opt.step()
+        opt.zero_grad()
+        real += int(batch["attention_mask"].sum())
+        padded += batch["attention_mask"].numel()
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return time.perf_counter() - t0, real, padded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1024, help="synthetic training pairs")
+    parser.add_argument("--model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--max_batch_tokens", type=int, default=MAX_BATCH_TOKENS)
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "pairs.jsonl")
+        write_jsonl(path, args.n)
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        for name in ("cold", "cached"):
+            t0 = time.perf_counter()
+            ds = pretokenize(path, tokenizer, "claim", "evidence", cache_dir=os.path.join(tmp, "cache"))
+            print(f"pretokenize {name:<7} {time.perf_counter() - t0:.2f}s")
+        lengths = ds["length"]
+        print(f"{len(ds)} pairs, mean length {sum(lengths) / len(lengths):.0f} tokens, max_length {MAX_LENGTH}, "
+              f"device {device}")
+        inputs = model_inputs(ds)
+        pad = collator(tokenizer)
+        order = list(range(len(inputs)))
+        random.Random(0).shuffle(order)
+        fixed = [order[i:i + args.batch_size] for i in range(0, len(order), args.batch_size)]
+
+        def max_length_batches():
+            for b in fixed:
+                rows = [inputs[i] for i in b]
+                # the old preprocessing: every pair padded to max_length
+                yield tokenizer.pad(rows, padding="max_length", max_length=MAX_LENGTH, return_tensors="pt")
+
+        setups = {
+            "max_length": max_length_batches,
+            "dynamic": lambda: (pad([inputs[i] for i in b]) for b in fixed),
+            "bucketed": lambda: (pad([inputs[i] for i in b]) for b in
+                                 TokenBudgetBatchSampler(lengths, args.max_batch_tokens, MAX_BATCH)),
+        }
+        print(f"{'setup':<11} {'epoch s':>8} {'tokens/s':>10} {'pad %':>6} {'steps':>6}")
+        for name, batches in setups.items():
+            torch.manual_seed(0)
+            model = AutoModelForSequenceClassification.from_pretrained(args.model, num_labels=3,
+                                                                       ignore_mismatched_sizes=True).to(device)
+            steps = len(fixed) if name != "bucketed" else len(TokenBudgetBatchSampler(lengths, args.max_batch_tokens, MAX_BATCH))
+            dt, real, padded = run_epoch(model, batches(), device)
+            print(f"{name:<11} {dt:>8.2f} {real / dt:>10.0f} {100 * (1 - real / padded):>6.1f} {steps:>6}")
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,48 @@
+# src/bench_verifier.py
+"""
+Verifier throughput (pairs/second): one pair per forward pass vs. verifier_predict_batch
+at several batch sizes. Evidence comes from data/processed chunks.
+Run from the repo root: python src/bench_verifier.py --n 128
+"""
+import argparse, random, time
+from pathlib import Path
+from utils import load_json
+from verifier_api import verifier_predict, verifier_predict_batch
+
+PROC = "./data/processed"
+
+def make_pairs(n, seed=0):
+    texts = []
+    for f in sorted(Path(PROC).glob("*.json")):
+        for c in load_json(str(f)).get("chunks", []):
+            texts.append(c if isinstance(c, str) else c.get("text", ""))
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        ev = rng.sample(texts, k=rng.randint(1, 4))
+        # claim: a sentence-sized slice of one evidence chunk, so lengths vary like real claims
+        words = ev[0].split()
+        start = rng.randrange(max(1, len(words) - 30))
+        claim = " ".join(words[start:start + rng.randint(8, 30)])
+        pairs.append((claim, [" ".join(t.split()[:rng.randint(20, 200)]) for t in ev]))
+    return pairs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=128)
+    parser.add_argument("--batch_sizes", default="1,4,8,16,32,64")
+    parser.add_argument("--max_tokens", type=int, default=16384)
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.n)
+    verifier_predict(*pairs[0])  # load the model outside the timed region
+    t0 = time.perf_counter()
+    for claim, ev in pairs:
+        verifier_predict(claim, ev)
+    base = len(pairs) / (time.perf_counter() - t0)
+    print(f"{'sequential':<12} {base:8.1f} pairs/s")
+    for bs in [int(b) for b in args.batch_sizes.split(",")]:
+        t0 = time.perf_counter()
+        verifier_predict_batch(pairs, max_batch=bs, max_tokens=args.max_tokens)
+        rate = len(pairs) / (time.perf_counter() - t0)
+        print(f"{'batch=' + str(bs):<12} {rate:8.1f} pairs/s  ({rate / base:.1f}x)")
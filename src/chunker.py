@@ -0,0 +1,188 @@
+# src/chunker.py
+"""
+Token-aware chunking of processed documents into the schema embed_index_gpu reads:
+{id, chunks: [{chunk_id, text, meta}]}.
+
+Lengths are counted with the embedder's own tokenizer, so no chunk exceeds MAX_TOKENS
+(all-mpnet-base-v2 truncates at 384 tokens; the reranker's cross-encoder also has to fit
+the query next to the chunk). Chunks are packed from whole sentences, and a paragraph that
+fits in a chunk of its own is never split across two; a boundary inside a paragraph
+repeats up to OVERLAP tokens of trailing sentences in the next chunk. Sentences longer
+than a chunk are cut at word boundaries. Tables are chunked separately by whole rows
+with the header row repeated.
+
+Text chunks are exact slices of the document text: meta.start / meta.end are character
+offsets into it (and meta.page the page, when page_starts is known). Chunk ids are
+derived from the chunk content, so editing one part of a document keeps the ids (and
+index vectors, see embed_index_gpu --incremental) of the other chunks.
+"""
+import bisect, csv, io, re
+from functools import lru_cache
+from utils import content_hash
+
+TOKENIZER_MODEL = "sentence-transformers/all-mpnet-base-v2"  # pipeline.EMB_MODEL
+MAX_TOKENS = 256
+OVERLAP = 32
+
+_PARA_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENT_END_RE = re.compile(r"[.!?;][\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_ABBREV = {"no", "nos", "rs", "inc", "ltd", "co", "corp", "mr", "mrs", "ms", "dr", "viz", "vs", "sr", "jr", "st",
+           "govt", "dept", "sec", "secs", "art", "cl", "para", "fig", "vol", "e.g", "i.e", "etc", "approx", "u.s"}
+
+@lru_cache(maxsize=4)
+def get_tokenizer(name=TOKENIZER_MODEL):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+def _spans(text, regex, start, end):
+    """Split text[start:end] at regex matches; returns stripped (start, end) spans."""
+    out, pos = [], start
+    for m in regex.finditer(text, start, end):
+        out.append((pos, m.end()))
+        pos = m.end()
+    out.append((pos, end))
+    spans = []
+    for s, e in out:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            spans.append((s, e))
+    return spans
+
+def _sentences(text, start, end):
+    spans = []
+    for s, e in _spans(text, _SENT_END_RE, start, end):
+        word = re.search(r"([\w.]+)\W*$", text[spans[-1][0]:spans[-1][1]]) if spans else None
+        if word and word.group(1).rstrip(".").lower() in _ABBREV:
+            spans[-1] = (spans[-1][0], e)  # "No. 12", "Rs. 500": not a sentence end
+        else:
+            spans.append((s, e))
+    return spans
+
+def _split_long(text, s, e, offsets, budget):
+    """Cut an over-long sentence into <= budget-token pieces, at word starts where possible."""
+    pieces, i = [], 0
+    while i < len(offsets):
+        j = min(i + budget, len(offsets))
+        if j < len(offsets):
+            k = j
+            while k > i + 1 and offsets[k][0] == offsets[k - 1][1]:  # k continues the previous word
+                k -= 1
+            j = k if k > i + 1 else j
+        pieces.append((s + offsets[i][0], s + offsets[j - 1][1], j - i))
+        i = j
+    return pieces
+
+def _units(text, tokenizer, budget):
+    """(start, end, n_tokens, paragraph) per sentence, over-long sentences already split."""
+    sents = []
+    for p, (ps, pe) in enumerate(_spans(text, _PARA_RE, 0, len(text))):
+        sents += [(s, e, p) for s, e in _sentences(text, ps, pe)]
+    if not sents:
+        return []
+    enc = tokenizer([text[s:e] for s, e, _ in sents], add_special_tokens=False, return_offsets_mapping=True)
+    units = []
+    for (s, e, p), ids, offsets in zip(sents, enc["input_ids"], enc["offset_mapping"]):
+        if len(ids) <= budget:
+            units.append((s, e, len(ids), p))
+        else:
+            units += [(a, b, n, p) for a, b, n in _split_long(text, s, e, offsets, budget)]
+    return units
+
+def _pack(units, budget, overlap):
+    """Greedy packing of sentence units into lists of units."""
+    para_tokens = {}
+    for u in units:
+        para_tokens[u[3]] = para_tokens.get(u[3], 0) + u[2]
+    chunks, cur, n = [], [], 0
+    for u in units:
+        new_para = bool(cur) and u[3] != cur[-1][3]
+        if cur and (n + u[2] > budget or (new_para and n + para_tokens[u[3]] > budget >= para_tokens[u[3]])):
+            chunks.append(cur)
+            cur, n = [], 0
+            if not new_para:
+                # boundary inside a paragraph: carry trailing sentences over as context
+                for prev in reversed(chunks[-1]):
+                    if n + prev[2] > overlap or n + prev[2] + u[2] > budget or len(cur) + 1 == len(chunks[-1]):
+                        break
+                    cur.insert(0, prev)
+                    n += prev[2]
+        cur.append(u)
+        n += u[2]
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def _chunk_id(doc_id, text, seen):
+    cid = f"{doc_id}_{content_hash(text)[:12]}"
+    seen[cid] = seen.get(cid, 0) + 1
+    return cid if seen[cid] == 1 else f"{cid}_{seen[cid] - 1}"
+
+def chunk_text(doc_id, text, tokenizer=None, max_tokens=MAX_TOKENS, overlap=OVERLAP, page_starts=None, seen=None):
+    """Chunk prose. page_starts: character offset where each page (1-based) begins in text."""
+    tokenizer = tokenizer or get_tokenizer()
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    seen = {} if seen is None else seen
+    out = []
+    for group in _pack(_units(text or "", tokenizer, budget), budget, overlap):
+        s, e = group[0][0], group[-1][1]
+        meta = {"type": "text", "start": s, "end": e, "n_tokens": sum(u[2] for u in group)}
+        if page_starts:
+            meta["page"] = bisect.bisect_right(page_starts, s)
+        out.append({"chunk_id": _chunk_id(doc_id, text[s:e], seen), "text": text[s:e], "meta": meta})
+    return out
+
+def _csv(rows):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+def chunk_table(doc_id, table, tokenizer=None, max_tokens=MAX_TOKENS, seen=None):
+    """Chunk one {table_id, page, csv} table by whole rows; every chunk starts with the header row."""
+    tokenizer = tokenizer or get_tokenizer()
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    seen = {} if seen is None else seen
+    rows = [r for r in csv.reader(io.StringIO(table.get("csv", ""))) if any(c.strip() for c in r)]
+    if not rows:
+        return []
+    lens = [len(ids) for ids in tokenizer([_csv([r]) for r in rows], add_special_tokens=False)["input_ids"]]
+    if len(rows) == 1:
+        header, body, n0 = [], [0], 0
+    else:
+        header, body, n0 = [rows[0]], list(range(1, len(rows))), lens[0]
+    out, i = [], 0
+    while i < len(body):
+        j, n = i, n0
+        while j < len(body) and (j == i or n + lens[body[j]] <= budget):
+            n += lens[body[j]]
+            j += 1
+        text = _csv(header + [rows[r] for r in body[i:j]])
+        meta = {"type": "table", "table_id": table.get("table_id"), "page": table.get("page"),
+                "row_start": body[i], "row_end": body[j - 1] + 1, "n_tokens": n}
+        out.append({"chunk_id": _chunk_id(doc_id, text, seen), "text": text, "meta": meta})
+        i = j
+    return out
+
+def chunk_document(doc_id, text, tables=(), tokenizer=None, max_tokens=MAX_TOKENS, overlap=OVERLAP, page_starts=None):
+    tokenizer = tokenizer or get_tokenizer()
+    seen = {}
+    chunks = chunk_text(doc_id, text, tokenizer, max_tokens, overlap, page_starts, seen)
+    for t in tables or ():
+        chunks += chunk_table(doc_id, t, tokenizer, max_tokens, seen)
+    return chunks
+
+def doc_chunks(doc, doc_id=None, tokenizer=None):
+    """
+    Chunks of a processed JSON document in the current schema. Older files are re-chunked:
+    {filename, chunks: [str]} from the word-count preprocess, or ingest output without chunks.
+    """
+    doc_id = doc.get("id") or doc_id
+    chunks = doc.get("chunks")
+    if chunks and isinstance(chunks[0], dict):
+        return chunks
+    if chunks:
+        return chunk_document(doc_id, " ".join(chunks), tokenizer=tokenizer)
+    return chunk_document(doc_id, doc.get("text", ""), doc.get("tables", []), tokenizer=tokenizer,
+                          page_starts=doc.get("page_starts"))
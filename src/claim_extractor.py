@@ -1,15 +1,25 @@
 # src/claim_extractor.py
 import re
-from nltk.tokenize import sent_tokenize
-import nltk
-nltk.download('punkt', quiet=True)
+from tracing import current, traced
 
 CITATION_RE = re.compile(r"\[(SQL-\d+|\d+)\]")
+_punkt_ready = False
 
+def _sent_tokenize(text):
+    # nltk and the punkt download are deferred to the first call
+    global _punkt_ready
+    import nltk
+    if not _punkt_ready:
+        nltk.download('punkt', quiet=True)
+        _punkt_ready = True
+    return nltk.tokenize.sent_tokenize(text)
+
+@traced("claims")
 def extract_claims(answer_text):
-    sents = sent_tokenize(answer_text)
+    sents = _sent_tokenize(answer_text)
     claims = []
     for s in sents:
         cids = CITATION_RE.findall(s)
         claims.append({"text": s.strip(), "citations": cids})
+    current().set(claims=len(claims))
     return claims
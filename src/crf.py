@@ -4,31 +4,83 @@ Compute fragility by perturbing retrieval results:
 - swap a top evidence with a near neighbor,
 - re-run generator (or eval proxy) and see if claim flips.
 For speed: compute reranker score differences or verifier prob differences.
+
+Neighbors come from the precomputed kNN graph (neighbor_graph, built by embed_index_gpu),
+so a perturbation is an O(1) lookup; candidates outside the graph fall back to one batched
+dense search. Perturbations are drawn from a seeded RNG per claim, so scores are
+reproducible and do not depend on which other claims share the batch.
 """
-from copy import deepcopy
-from retriever_gpu import dense_search, hybrid_rerank
+import random
+from retriever_gpu import dense_search_batch, hybrid_rerank, hits_for_rows, row_vectors
+from pipeline import get_context
+from tracing import span, traced
+
+FLIP_DELTA = 0.2  # change in entailment probability that counts as a flip
+NEIGHBOR_POOL = 10
+
+@traced("fragility.perturb", batch=0)
+def perturbations(top_candidates, n_perturb=5, ctx=None, rng=None):
+    """n_perturb evidence lists, each a copy of top_candidates with one entry swapped for a near neighbor."""
+    ctx = ctx or get_context()
+    rng = rng or random.Random(0)
+    base = list(top_candidates)
+    if not base:
+        return []
+    replace = [rng.randrange(len(base)) for _ in range(n_perturb)]
+    in_set = {c.get("chunk_id") for c in base}
+    graph = ctx.neighbors
+    pools, fallback = [], []
+    for i in replace:
+        rows, sims = graph.neighbors(base[i].get("row")) if graph is not None else ([], [])
+        pools.append(hits_for_rows(rows[:NEIGHBOR_POOL], sims[:NEIGHBOR_POOL], ctx=ctx))
+        if not pools[-1]:
+            fallback.append(len(pools) - 1)
+    if fallback:
+        # candidates without graph entries: one batched search, with stored vectors when indexed
+        rows = [base[replace[p]].get("row") for p in fallback]
+        q_emb = row_vectors(ctx, rows) if all(r is not None for r in rows) else None
+        found = dense_search_batch([base[replace[p]].get("meta", {}).get("text", "") for p in fallback],
+                                   k=NEIGHBOR_POOL, ctx=ctx, q_emb=q_emb)
+        for p, hits in zip(fallback, found):
+            pools[p] = hits
+    perturbed = []
+    for i, pool in zip(replace, pools):
+        options = [h for h in pool if h["chunk_id"] not in in_set]
+        pert = list(base)  # shallow copy: only the swapped slot changes
+        if options:
+            pert[i] = rng.choice(options)
+        perturbed.append(pert)
+    return perturbed
+
+@traced("fragility", batch=0)
+def fragility_batch(claims, candidate_lists, verifier_predict_batch, n_perturb=5, ctx=None, seed=0):
+    """
+    Fragility of every claim against its evidence list, with a single verifier call for
+    all base and perturbed evidence sets. Returns one fraction of flipped perturbations per claim.
+    """
+    ctx = ctx or get_context()
+    pairs, spans = [], []
+    for claim, cands in zip(claims, candidate_lists):
+        sets = [list(cands)] + perturbations(cands, n_perturb, ctx=ctx, rng=random.Random(f"{seed}:{claim}"))
+        spans.append((len(pairs), len(sets)))
+        pairs += [(claim, [c.get("meta", {}).get("text", "") for c in ev]) for ev in sets]
+    with span("fragility.verify", batch=len(pairs)):
+        probs = verifier_predict_batch(pairs) if pairs else []
+    scores = []
+    for start, n in spans:
+        base_prob = probs[start]
+        flips = sum(1 for p in probs[start + 1:start + n] if abs(p - base_prob) > FLIP_DELTA)
+        scores.append(flips / n_perturb if n_perturb else 0.0)
+    return scores
 
-def fragility_score(query, top_candidates, retriever_func, verifier_predict, n_perturb=5):
+def fragility_score(query, top_candidates, retriever_func, verifier_predict, n_perturb=5, verifier_predict_batch=None,
+                    ctx=None, seed=0):
     """
     For each perturbation, replace one top candidate with a near neighbor and
     check effect on verifier(claim, evidence). Return fraction of perturbations that cause >delta change.
+    If verifier_predict_batch is given, the base and all perturbed sets are scored in one call.
     """
-    base_evidence = [c for c in top_candidates]
-    base_prob = verifier_predict(query["claim"], [c.get("meta",{}).get("text","") for c in base_evidence])
-    flips = 0
-    for i in range(n_perturb):
-        # pick an index to replace
-        import random
-        replace_idx = random.randrange(len(base_evidence))
-        # get a dense neighbor by querying with the chosen chunk text
-        neighbor_pool = dense_search(base_evidence[replace_idx].get("meta", {}).get("text",""), k=10)
-        # pick a random neighbor not equal to original
-        for neigh in neighbor_pool:
-            if neigh["chunk_id"] != base_evidence[replace_idx]["chunk_id"]:
-                break
-        pert = deepcopy(base_evidence)
-        pert[replace_idx] = neigh
-        p = verifier_predict(query["claim"], [c.get("meta",{}).get("text","") for c in pert])
-        if abs(p - base_prob) > 0.2:  # threshold for 'flip'
-            flips += 1
-    return flips / n_perturb
+    if verifier_predict_batch is None:
+        verifier_predict_batch = lambda pairs: [verifier_predict(claim, texts) for claim, texts in pairs]
+    return fragility_batch([query["claim"]], [top_candidates], verifier_predict_batch, n_perturb=n_perturb,
+                           ctx=ctx, seed=seed)[0]
@@ -0,0 +1,136 @@
+# src/doc_attrs.py
+"""
+Structured document attributes for filtered retrieval, tagged at ingest and copied to
+every chunk of the document:
+  issuer        CBIC, RBI, SEBI, MCA, IBBI, IEPFA, court, ... (header patterns)
+  doc_type      notification, circular, order, notice, advertisement, rules, table, document
+  number        "03/2025" from "Notification No. 03/2025-Central Tax"
+  date          ISO date of issue ("dated the 5th January, 2024", a YYYYMMDD in the file name,
+                else the first date utils.extract_dates finds in the header)
+  year          calendar year of date
+  fiscal_year   year the Indian financial year (April-March) of date ends in: 2024-01-05 -> 2024;
+                for undated documents, the first one the header names (FY 2023-24 -> 2024)
+Filters are dicts over these keys (plus doc_id): a scalar must equal the attribute, a
+list/tuple/set must contain it, {"gte"/"gt"/"lte"/"lt": v} is a range, a callable is a predicate.
+"""
+import operator, re
+from datetime import date as _date
+from utils import extract_dates
+
+HEADER_CHARS = 1500
+FY_START_MONTH = 4
+ISSUERS = [
+    ("CBIC", r"central board of (?:indirect taxes|excise)|\bcbic\b"),
+    ("RBI", r"reserve bank of india|\brbi\b|rbi\.org\.in"),
+    ("SEBI", r"securities and exchange board|\bsebi\b"),
+    ("IEPFA", r"investor education and protection fund|\biepfa?\b"),
+    ("IBBI", r"insolvency and bankruptcy board|\bibbi\b"),
+    ("MCA", r"ministry of corporate affairs|\bmca\b"),
+    ("court", r"high court|supreme court|\bnclt\b|national company law|tribunal"),
+    ("Ministry of Finance", r"ministry of finance"),
+]
+DOC_TYPES = [
+    ("notification", r"\bnotification\b|-ct-|^ct-|^cst?-|^ce\d"),
+    ("circular", r"\bcircular\s+no\b|^cir|^circular-no"),
+    ("rules", r"\brules\b|\bamendment\b"),
+    ("order", r"\border\s+no\b|\border\b"),
+    ("advertisement", r"vacancy|advertis|recruitment|empanelment"),
+    ("notice", r"\bnotice\b|e-?auction"),
+]
+_MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december"
+_ISSUE_DATE_RE = re.compile(rf"(\d{{1,2}})(?:st|nd|rd|th)?\s+({_MONTHS}),?\s+(\d{{4}})", re.I)
+_NAME_DATE_RE = re.compile(r"(20\d{2})(\d{2})(\d{2})")
+_NUMBER_RE = re.compile(r"\bno\.?\s*(\d{1,4}(?:/\d{1,4})?/(?:19|20)\d{2})", re.I)
+_RANGE_OPS = {"gte": operator.ge, "gt": operator.gt, "lte": operator.le, "lt": operator.lt}
+_FY_RE = re.compile(r"\b(?:fy|f\.y\.|financial year|fiscal year)\s*'?(\d{2,4})(?:\s*[-–/]\s*(\d{2,4}))?", re.I)
+
+def _full_year(y, ref=None):
+    y = int(y)
+    if y < 100:
+        y += 100 * ((ref or 2000) // 100)
+    return y
+
+def fiscal_year_of(iso_date, start_month=FY_START_MONTH):
+    y, m = int(iso_date[:4]), int(iso_date[5:7])
+    return y + 1 if start_month > 1 and m >= start_month else y
+
+def _issue_date(doc_id, header):
+    m = _ISSUE_DATE_RE.search(header)
+    if m:
+        try:
+            month = _MONTHS.split("|").index(m.group(2).lower()) + 1
+            return _date(int(m.group(3)), month, int(m.group(1))).isoformat()
+        except ValueError:
+            pass
+    m = _NAME_DATE_RE.search(doc_id)
+    if m:
+        try:
+            return _date(*map(int, m.groups())).isoformat()
+        except ValueError:
+            pass
+    d = extract_dates(header)
+    return d[:10] if d else None
+
+def _fy_mention(text):
+    m = _FY_RE.search(text or "")
+    if not m:
+        return None
+    start, end = m.group(1), m.group(2)
+    # "FY2023" / "FY23" / "2022-23" all name the year the financial year ends in
+    fy = _full_year(end, _full_year(start)) if end else _full_year(start)
+    return fy if 1990 <= fy <= 2100 else None
+
+def doc_attributes(doc_id, text, title=None, tables=()):
+    """Attributes of one document from its id / title and the first HEADER_CHARS of its text."""
+    header = (text or "")[:HEADER_CHARS]
+    name = f"{doc_id} {title or ''}".lower()
+    low = header.lower()
+    attrs = {"issuer": next((n for n, p in ISSUERS if re.search(p, low)), None)}
+    # the type named earliest in the header (a circular may cite notifications), else from the file name
+    found = [(m.start(), t) for t, p in DOC_TYPES for m in [re.search(p, low[:400])] if m]
+    doc_type = min(found)[1] if found else next((t for t, p in DOC_TYPES if re.search(p, name)), None)
+    if doc_type is None:
+        doc_type = "table" if tables and not header.strip() else "document"
+    attrs["doc_type"] = doc_type
+    m = _NUMBER_RE.search(header)
+    attrs["number"] = m.group(1) if m else None
+    attrs["date"] = _issue_date(doc_id, header)
+    attrs["year"] = int(attrs["date"][:4]) if attrs["date"] else None
+    attrs["fiscal_year"] = fiscal_year_of(attrs["date"]) if attrs["date"] else _fy_mention(header)
+    return attrs
+
+def matches(attrs, filters):
+    for key, want in (filters or {}).items():
+        have = attrs.get(key)
+        if want is None:
+            continue
+        if callable(want):
+            ok = want(have)
+        elif isinstance(want, dict):
+            ok = have is not None and all(_RANGE_OPS[op](have, v) for op, v in want.items())
+        elif isinstance(want, (list, tuple, set, frozenset)):
+            ok = have in want
+        else:
+            ok = have == want
+        if not ok:
+            return False
+    return True
+
+def query_filters(question, doc_ids=()):
+    """
+    Filters implied by a question: a fiscal year it names (FY2023, financial year 2022-23),
+    a notification / circular number (No. 03/2025), or one of doc_ids mentioned verbatim.
+    """
+    filters = {}
+    q = question or ""
+    fy = _fy_mention(q)
+    if fy:
+        filters["fiscal_year"] = fy
+    m = _NUMBER_RE.search(q)
+    if m:
+        filters["number"] = m.group(1)
+    low = q.lower()
+    named = [d for d in doc_ids if d.lower() in low]
+    if named:
+        filters["doc_id"] = named
+    return filters
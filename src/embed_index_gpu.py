@@ -1,50 +1,299 @@
 # src/embed_index_gpu.py
 """
 Encode chunks via sentence-transformers and build FAISS index.
-Save index to indices/faiss_index.faiss and mapping vectors_meta.json
+Save index to indices/faiss_index.faiss and chunk metadata + text to the meta store (indices/meta/)
+plus a BM25 inverted index over the same rows (indices/bm25/) for hybrid retrieval
 Run on Colab (GPU) for speed; can run locally too.
+
+Builds stream: chunks are read lazily from data/processed, embedded in fixed-size
+batches and appended straight to the index and meta store, so peak memory does not grow
+with the corpus. Reading, encoding and index insertion overlap in a small producer /
+consumer pipeline, and periodic checkpoints let --resume continue a killed build of the
+same index type and parameters. Trained index types (IVF) first make a text-only pass over
+the chunks to draw a seeded random training sample of the whole corpus (reservoir sampling),
+encode and train on it, then stream the inserts; the sample's vectors are embedding-cache hits
+when the second pass reaches them.
+
+Vectors are stored under stable ids (ann_index.with_ids). index_manifest.json records the
+content hash and vector id of every indexed chunk, so --incremental only embeds new or
+changed chunks and removes the vectors of deleted ones instead of re-encoding the corpus.
+Chunks carry their document's attributes (doc_attrs), stored per document in the meta
+store for filtered retrieval. Full builds finish by building the chunk-neighbour graph
+(indices/neighbors/) that crf uses for perturbations; incremental updates patch it.
 """
-import os, json
+import os, json, itertools, random
 from pathlib import Path
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
-import torch
-from utils import load_json, save_json
+from utils import load_json, save_json, content_hash, batched, prefetch
+from model_registry import get_embedder
+from meta_store import MetaStore
+from chunker import doc_chunks
+from doc_attrs import doc_attributes
+from embedding_cache import cached_encode
+from neighbor_graph import NEIGHBORS_K
 
 PROC = "./data/processed"
 INDICES = "./indices"
-os.makedirs(INDICES, exist_ok=True)
-META_FILE = os.path.join(INDICES, "vectors_meta.json")
+META_DIR = os.path.join(INDICES, "meta")
+BM25_DIR = os.path.join(INDICES, "bm25")
 INDEX_FILE = os.path.join(INDICES, "faiss_index.faiss")
+MANIFEST_FILE = os.path.join(INDICES, "index_manifest.json")
+NEIGHBORS_DIR = os.path.join(INDICES, "neighbors")
+CHECKPOINT_FILE = os.path.join(INDICES, "build_checkpoint.json")
+PARTIAL_INDEX_FILE = INDEX_FILE + ".partial"
+BATCH_SIZE = 256        # chunks per embedding batch
+CHECKPOINT_EVERY = 20   # batches between the first checkpoints
+CHECKPOINT_GROWTH = 4   # later ones are spaced by 1/CHECKPOINT_GROWTH of the chunks indexed so far
+TRAIN_SEED = 0
 
 EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = SentenceTransformer(EMB_MODEL, device=device)
 
-def collect_chunks():
-    chunks = []
-    for f in Path(PROC).glob("*.json"):
+def iter_chunks(proc=PROC):
+    # sorted so an interrupted build can skip exactly the chunks it already indexed
+    for f in sorted(Path(proc).glob("*.json")):
         j = load_json(str(f))
-        for c in j.get("chunks", []):
-            chunks.append({"doc_id": j["id"], "chunk_id": c["chunk_id"], "text": c["text"], "meta": c.get("meta", {})})
-    return chunks
+        doc_id = j.get("id") or f.stem
+        # files written before the token-aware chunker are re-chunked / tagged on the fly
+        chunks = doc_chunks(j, doc_id)
+        attrs = j.get("attrs") or doc_attributes(doc_id, j.get("text") or " ".join(c["text"] for c in chunks),
+                                                 j.get("title"), j.get("tables", ()))
+        for c in chunks:
+            yield {"doc_id": doc_id, "chunk_id": c["chunk_id"], "text": c["text"], "meta": c.get("meta", {}),
+                   "attrs": attrs}
+
+def collect_chunks():
+    return list(iter_chunks())
 
-def build_index(chunks):
-    texts = [c["text"] for c in chunks]
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True, batch_size=16)
+def embed_texts(texts, show_progress_bar=True):
+    import faiss
+    # unchanged texts come from the embedding cache instead of being re-encoded
+    embeddings = cached_encode(EMB_MODEL, get_embedder(EMB_MODEL), texts, show_progress_bar=show_progress_bar, batch_size=16)
     faiss.normalize_L2(embeddings)
-    dim = embeddings.shape[1]
-    print("Embedding dim", dim)
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
-    faiss.write_index(index, INDEX_FILE)
-    print("Saved index to", INDEX_FILE)
-    mapping = {i: {"doc_id": chunks[i]["doc_id"], "chunk_id": chunks[i]["chunk_id"], "meta": chunks[i]["meta"]} for i in range(len(chunks))}
-    save_json(mapping, META_FILE)
-    print("Saved mapping to", META_FILE)
+    return embeddings
+
+def _doc_versions(chunks):
+    """doc_id -> {"hash": version hash, "chunks": {chunk_id: {"hash": ...}}} for the given chunks."""
+    docs = {}
+    for c in chunks:
+        d = docs.setdefault(c["doc_id"], {"chunks": {}})
+        d["chunks"][c["chunk_id"]] = {"hash": content_hash(c["text"])}
+    for d in docs.values():
+        d["hash"] = content_hash("".join(ch["hash"] for ch in d["chunks"].values()))
+    return docs
+
+def build_lexical(store):
+    # BM25 over the meta store's live rows
+    from lexical_index import build_bm25
+    rows = ((i, store.text(i)) for i in range(len(store)) if store.alive[i])
+    build_bm25(rows, BM25_DIR)
+    print("Saved BM25 index to", BM25_DIR)
+
+def update_lexical(store, added, removed):
+    # only the changed chunks are tokenized; (row, text) pairs as lexical_index.update_bm25 takes them
+    from lexical_index import LexicalIndex, update_bm25
+    if not LexicalIndex.exists(BM25_DIR):
+        return build_lexical(store)
+    update_bm25(added, removed, BM25_DIR)
+    print(f"Updated BM25 index in {BM25_DIR}: {len(added)} rows added, {len(removed)} removed")
+
+def build_neighbors(index, params, store, k):
+    from ann_index import enable_reconstruct
+    from neighbor_graph import build_neighbor_graph
+    if k:
+        enable_reconstruct(index, params)
+        build_neighbor_graph(index, store, k=k, path=NEIGHBORS_DIR)
+
+def update_neighbors(index, params, store, removed, added, k):
+    from ann_index import enable_reconstruct
+    from neighbor_graph import update_neighbor_graph
+    if k:
+        enable_reconstruct(index, params)
+        update_neighbor_graph(index, store, removed, added, k=k, path=NEIGHBORS_DIR)
+
+def _checkpoint(index, params, next_id, docs):
+    import faiss
+    faiss.write_index(index, PARTIAL_INDEX_FILE)
+    save_json({"emb_model": EMB_MODEL, "params": params, "next_id": next_id, "docs": docs}, CHECKPOINT_FILE)
+
+def _next_checkpoint(n_chunks, every):
+    # every checkpoint rewrites the whole partial index, so fixed spacing makes checkpoint I/O
+    # quadratic in the corpus; spacing proportional to the index keeps it linear
+    return n_chunks + max(every, n_chunks // CHECKPOINT_GROWTH)
+
+def _check_resumable(state, index_type, index_params):
+    """Raise ValueError unless the checkpoint was written by a build with the requested model, type and params."""
+    stored = state["params"]
+    wanted = {"type": index_type, **{k: v for k, v in index_params.items() if v is not None}}
+    diff = {k: (stored.get(k), v) for k, v in wanted.items() if stored.get(k) != v}
+    if state["emb_model"] != EMB_MODEL:
+        diff["emb_model"] = (state["emb_model"], EMB_MODEL)
+    if diff:
+        raise ValueError(f"{CHECKPOINT_FILE} was written by a different build (checkpoint vs requested: {diff}); "
+                         "rerun without --resume")
+
+def reservoir_sample(items, k, seed=TRAIN_SEED):
+    """Uniform random sample of k items of a stream of unknown length (Algorithm R), in stream order."""
+    rng = random.Random(seed)
+    sample = []
+    for i, x in enumerate(items):
+        if i < k:
+            sample.append((i, x))
+        else:
+            j = rng.randrange(i + 1)
+            if j < k:
+                sample[j] = (i, x)
+    return [x for _, x in sorted(sample, key=lambda t: t[0])]
+
+def build_index(chunks, index_type="flat", batch_size=BATCH_SIZE, checkpoint_every=CHECKPOINT_EVERY, resume=False,
+                overlap=True, neighbors_k=NEIGHBORS_K, **index_params):
+    """
+    chunks: chunk dicts as a list, or a function returning a fresh iterator (iter_chunks) so a
+            trained index type can read the corpus twice; a one-shot iterator is materialized then.
+    index_type: one of ann_index.INDEX_TYPES; index_params override ann_index.DEFAULT_PARAMS.
+    resume: continue from build_checkpoint.json; chunks must yield in the same order as before, and
+            index_type / index_params must match the checkpointed build (ValueError otherwise).
+    checkpoint_every: batches before the first checkpoint; later ones are spaced further apart.
+    overlap: read, encode and insert in separate threads instead of one after the other.
+    neighbors_k: neighbours per chunk in the kNN graph (0 skips it).
+    """
+    import faiss
+    from ann_index import DEFAULT_PARAMS, needs_training, new_ann_index, save_index
+    os.makedirs(INDICES, exist_ok=True)
+    state = load_json(CHECKPOINT_FILE) if resume and os.path.exists(CHECKPOINT_FILE) else None
+    if state is not None:
+        _check_resumable(state, index_type, index_params)
+        index, params, next_id, docs = faiss.read_index(PARTIAL_INDEX_FILE), state["params"], state["next_id"], state["docs"]
+        store = MetaStore(META_DIR)
+        store.truncate(next_id)
+        print("Resuming build after", next_id, "chunks")
+    else:
+        index, params, next_id, docs = None, None, 0, {}
+        store = MetaStore.create([], META_DIR)
+    if callable(chunks):
+        read = chunks
+    else:
+        chunks = chunks if isinstance(chunks, (list, tuple)) else list(chunks)
+        read = lambda: iter(chunks)
+    if index is None and needs_training(index_type):
+        # trained on a random sample of the whole corpus, not its first chunks (files are in document order)
+        train_n = index_params.get("train_sample") or DEFAULT_PARAMS["train_sample"]
+        sample = reservoir_sample((c["text"] for c in read()), train_n)
+        if sample:
+            index, params = new_ann_index(embed_texts(sample, show_progress_bar=False), type=index_type, **index_params)
+            print("Trained", index_type, "on", len(sample), "sampled chunks")
+
+    batches = batched(itertools.islice(read(), next_id, None), batch_size)
+    if overlap:
+        batches = prefetch(batches)
+    encoded = ((b, embed_texts([c["text"] for c in b], show_progress_bar=False)) for b in batches)
+    if overlap:
+        encoded = prefetch(encoded)
+
+    checkpoint_at = _next_checkpoint(next_id, checkpoint_every * batch_size)
+    for b, e in encoded:
+        if index is None:
+            index, params = new_ann_index(e, type=index_type, **index_params)
+            print("Embedding dim", e.shape[1])
+        ids = np.arange(next_id, next_id + len(b), dtype="int64")
+        index.add_with_ids(e, ids)
+        store.append(list(zip(ids.tolist(), b)))
+        for c, vid in zip(b, ids.tolist()):
+            d = docs.setdefault(c["doc_id"], {"chunks": {}})
+            d["chunks"][c["chunk_id"]] = {"hash": content_hash(c["text"]), "id": vid}
+        next_id += len(b)
+        if next_id >= checkpoint_at:
+            _checkpoint(index, params, next_id, docs)
+            checkpoint_at = _next_checkpoint(next_id, checkpoint_every * batch_size)
+            print("Checkpoint:", next_id, "chunks indexed")
+    if index is None:
+        print("No chunks to index")
+        return
+    for d in docs.values():
+        d["hash"] = content_hash("".join(ch["hash"] for ch in d["chunks"].values()))
+    save_index(index, INDEX_FILE, params)
+    print("Saved", params["type"], "index with", index.ntotal, "vectors to", INDEX_FILE)
+    print("Saved chunk metadata to", META_DIR)
+    build_lexical(store)
+    build_neighbors(index, params, store, neighbors_k)
+    save_json({"emb_model": EMB_MODEL, "next_id": next_id, "docs": docs}, MANIFEST_FILE)
+    for f in (CHECKPOINT_FILE, PARTIAL_INDEX_FILE):
+        if os.path.exists(f):
+            os.remove(f)
+
+def update_index(chunks, neighbors_k=NEIGHBORS_K):
+    """Embed only new/changed chunks, drop vectors of changed/removed ones, append to the meta store."""
+    from ann_index import load_index, rebuild_params, remove_ids, save_index, supports_remove
+    if not (os.path.exists(MANIFEST_FILE) and os.path.exists(INDEX_FILE)):
+        print("No index manifest found, running a full build")
+        return build_index(chunks, neighbors_k=neighbors_k)
+    manifest = load_json(MANIFEST_FILE)
+    index, params = load_index(INDEX_FILE)
+    if manifest.get("emb_model") != EMB_MODEL:
+        print("Embedding model changed, running a full build")
+        return build_index(chunks, index_type=params["type"], neighbors_k=neighbors_k, **rebuild_params(params))
+
+    docs = _doc_versions(chunks)
+    stale = []
+    for doc_id, old in manifest["docs"].items():
+        new = docs.get(doc_id)
+        if new is None:
+            stale += [ch["id"] for ch in old["chunks"].values()]
+        elif new["hash"] == old["hash"]:
+            new["chunks"] = old["chunks"]
+        else:
+            for chunk_id, ch in old["chunks"].items():
+                cur = new["chunks"].get(chunk_id)
+                if cur is not None and cur["hash"] == ch["hash"]:
+                    cur["id"] = ch["id"]
+                else:
+                    stale.append(ch["id"])
+    fresh = [c for c in chunks if "id" not in docs[c["doc_id"]]["chunks"][c["chunk_id"]]]
+    if stale and not supports_remove(params, index):
+        print(f"{params['type']} index cannot remove vectors, running a full build")
+        return build_index(chunks, index_type=params["type"], neighbors_k=neighbors_k, **rebuild_params(params))
+
+    store = MetaStore(META_DIR)
+    removed = [(i, store.text(i)) for i in stale if 0 <= i < len(store) and store.alive[i]]
+    remove_ids(index, stale)
+    store.delete(stale)
+    store.set_doc_attrs({c["doc_id"]: c["attrs"] for c in chunks if "attrs" in c})
+    next_id = manifest["next_id"]
+    if fresh:
+        ids = np.arange(next_id, next_id + len(fresh), dtype="int64")
+        index.add_with_ids(embed_texts([c["text"] for c in fresh]), ids)
+        for c, vid in zip(fresh, ids.tolist()):
+            docs[c["doc_id"]]["chunks"][c["chunk_id"]]["id"] = vid
+        store.append(list(zip(ids.tolist(), fresh)))
+        next_id += len(fresh)
+    save_index(index, INDEX_FILE, params)
+    update_lexical(store, [(vid, store.text(vid)) for vid in range(manifest["next_id"], next_id)], removed)
+    update_neighbors(index, params, store, stale, range(manifest["next_id"], next_id), neighbors_k)
+    save_json({"emb_model": EMB_MODEL, "next_id": next_id, "docs": docs}, MANIFEST_FILE)
+    print(f"Incremental update: {len(fresh)} chunks embedded, {len(stale)} vectors removed, {index.ntotal} indexed")
 
 if __name__ == "__main__":
-    chunks = collect_chunks()
-    print("Found", len(chunks), "chunks")
-    build_index(chunks)
+    import argparse
+    from ann_index import INDEX_TYPES
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="only embed new/changed chunks (see index_manifest.json)")
+    parser.add_argument("--index_type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--pq_m", type=int)
+    parser.add_argument("--hnsw_m", type=int)
+    parser.add_argument("--nprobe", type=int, help="default IVF nprobe stored with the index")
+    parser.add_argument("--ef_search", type=int, help="default HNSW efSearch stored with the index")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="chunks per embedding batch")
+    parser.add_argument("--checkpoint_every", type=int, default=CHECKPOINT_EVERY, help="batches before the first checkpoint; spacing grows with the index")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted build from its checkpoint")
+    parser.add_argument("--neighbors_k", type=int, default=NEIGHBORS_K, help="kNN graph neighbours per chunk (0: skip)")
+    parser.add_argument("--no_overlap", action="store_true", help="read, encode and insert sequentially")
+    args = parser.parse_args()
+    if args.incremental:
+        chunks = collect_chunks()
+        print("Found", len(chunks), "chunks")
+        update_index(chunks, neighbors_k=args.neighbors_k)
+    else:
+        build_index(iter_chunks, index_type=args.index_type, batch_size=args.batch_size,
+                    checkpoint_every=args.checkpoint_every, resume=args.resume, overlap=not args.no_overlap,
+                    neighbors_k=args.neighbors_k,
+                    nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m, nprobe=args.nprobe, ef_search=args.ef_search)
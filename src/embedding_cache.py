@@ -0,0 +1,235 @@
+# src/embedding_cache.py
+"""
+Persistent embedding cache shared by index builds (embed_index_gpu) and query encoding
+(retriever_gpu). Vectors are keyed by a hash of the normalized text inside a namespace
+for (model name, model revision, dtype), so changing the model or its weights never
+reuses stale vectors.
+
+Layout of indices/emb_cache/<namespace>/:
+  index.sqlite    key -> (shard, row), per-shard row count and last use, vector dim
+  shard_NNNNN.bin raw float16/float32 rows of `dim` values, read through np.memmap
+Shards are append-only; the row counts in index.sqlite are authoritative, so a crash
+mid-write only leaves unreferenced bytes that the next append cuts off. When the cache
+grows past max_mb the least-recently-used whole shards are dropped (RAG_EMB_CACHE_MB,
+0 disables the cache); the shard being appended to is never dropped. Lookups record shard
+use in memory and write it to index.sqlite at most every LAST_USED_FLUSH_S seconds (and
+before any eviction), so cache hits on the query path do not commit to SQLite. Misses
+encoded with buffer=True (query encoding) are kept in memory and written PENDING_ROWS at a
+time, so a cache miss on the query path does not write a shard or commit either.
+Vectors are stored as float32 by default; float16 halves the size at about 1e-3 error.
+"""
+import atexit, hashlib, os, re, sqlite3, threading, time, unicodedata
+import numpy as np
+
+EMB_CACHE_DIR = "./indices/emb_cache"
+SHARD_ROWS = 65536
+MAX_MB = 2048
+LAST_USED_FLUSH_S = 60
+PENDING_ROWS = 256  # buffered query-path misses written per put_many
+
+def _norm(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip()
+
+def text_key(text):
+    return hashlib.sha1(_norm(text).encode("utf-8")).digest()
+
+def model_revision(model):
+    """Hub commit hash of a SentenceTransformer's weights, "local" if unknown."""
+    try:
+        return model[0].auto_model.config._commit_hash or "local"
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return "local"
+
+class EmbeddingCache:
+    def __init__(self, model_name, revision="local", dtype="float32", path=EMB_CACHE_DIR, max_mb=MAX_MB):
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_mb * 2**20
+        ns = hashlib.sha1(f"{model_name}@{revision}:{self.dtype.name}".encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(path, ns)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, "index.sqlite"), check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, shard INTEGER, row INTEGER);"
+            "CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY, rows INTEGER, last_used REAL);"
+            "CREATE TABLE IF NOT EXISTS info (k TEXT PRIMARY KEY, v TEXT);")
+        self._db.executemany("INSERT OR IGNORE INTO info VALUES (?, ?)",
+                             [("model", model_name), ("revision", revision), ("dtype", self.dtype.name)])
+        self._db.commit()
+        row = self._db.execute("SELECT v FROM info WHERE k = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self._maps = {}  # shard -> memmap of its committed rows
+        self._used = {}  # shard -> last use not yet written to index.sqlite
+        self._pending = {}  # key -> vector encoded with buffer=True, not yet written
+        self._flushed = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def _shard_file(self, shard):
+        return os.path.join(self.path, f"shard_{shard:05d}.bin")
+
+    def _rows(self, shard, needed):
+        m = self._maps.get(shard)
+        if m is None or len(m) < needed:
+            n = self._db.execute("SELECT rows FROM shards WHERE shard = ?", (shard,)).fetchone()[0]
+            m = np.memmap(self._shard_file(shard), dtype=self.dtype, mode="r", shape=(n, self.dim))
+            self._maps[shard] = m
+        return m
+
+    def get_many(self, keys):
+        """{key: float32 vector} for the keys present in the cache."""
+        found = {}
+        if self.dim is None:
+            return found
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            found.update((k, (s, r)) for k, s, r in self._db.execute(
+                f"SELECT key, shard, row FROM entries WHERE key IN ({','.join('?' * len(part))})", part))
+        out = {}
+        for shard in {s for s, _ in found.values()}:
+            rows = {k: r for k, (s, r) in found.items() if s == shard}
+            m = self._rows(shard, max(rows.values()) + 1)
+            for k, r in rows.items():
+                out[k] = np.asarray(m[r], dtype=np.float32)
+        if found:
+            now = time.time()
+            self._used.update((s, now) for s, _ in found.values())
+            if now - self._flushed >= LAST_USED_FLUSH_S:
+                self._flush_used()
+                self._db.commit()
+        return out
+
+    def _flush_used(self):
+        if self._used:
+            self._db.executemany("UPDATE shards SET last_used = MAX(last_used, ?) WHERE shard = ?",
+                                 [(t, s) for s, t in self._used.items()])
+            self._used.clear()
+        self._flushed = time.time()
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors)
+        if not len(keys):
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._db.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (str(self.dim),))
+        pos = 0
+        while pos < len(keys):
+            shard, n = self._db.execute("SELECT shard, rows FROM shards ORDER BY shard DESC LIMIT 1").fetchone() or (-1, SHARD_ROWS)
+            if n >= SHARD_ROWS:
+                shard, n = shard + 1, 0
+                self._db.execute("INSERT INTO shards VALUES (?, 0, ?)", (shard, time.time()))
+            take = min(len(keys) - pos, SHARD_ROWS - n)
+            with open(self._shard_file(shard), "ab") as f:
+                f.truncate(n * self.dim * self.dtype.itemsize)
+                f.write(np.ascontiguousarray(vectors[pos:pos + take], dtype=self.dtype).tobytes())
+            self._db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)",
+                                 [(k, shard, n + i) for i, k in enumerate(keys[pos:pos + take])])
+            self._db.execute("UPDATE shards SET rows = ?, last_used = ? WHERE shard = ?", (n + take, time.time(), shard))
+            pos += take
+        self._flush_used()
+        self._db.commit()
+        self._evict()
+
+    def nbytes(self):
+        rows = self._db.execute("SELECT COALESCE(SUM(rows), 0) FROM shards").fetchone()[0]
+        return rows * (self.dim or 0) * self.dtype.itemsize
+
+    def _evict(self):
+        while self.nbytes() > self.max_bytes:
+            # the newest shard is the one put_many appends to; it stays even if it alone exceeds max_bytes
+            row = self._db.execute("SELECT shard FROM shards WHERE shard < (SELECT MAX(shard) FROM shards) "
+                                   "ORDER BY last_used, shard LIMIT 1").fetchone()
+            if row is None:
+                break
+            shard = row[0]
+            self._db.execute("DELETE FROM entries WHERE shard = ?", (shard,))
+            self._db.execute("DELETE FROM shards WHERE shard = ?", (shard,))
+            self._db.commit()
+            self._maps.pop(shard, None)
+            if os.path.exists(self._shard_file(shard)):
+                os.remove(self._shard_file(shard))
+
+    def flush(self):
+        """Write the buffered misses."""
+        with self._lock:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            keys = list(self._pending)
+            self.put_many(keys, np.stack([self._pending[k] for k in keys]))
+            self._pending.clear()
+
+    def encode(self, texts, encode_fn, buffer=False):
+        """
+        float32 (n, dim) embeddings of texts; only texts not cached go through encode_fn
+        (deduplicated). buffer=True holds the misses in memory until PENDING_ROWS accumulate.
+        """
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            uniq = list(set(keys))
+            cached = {k: self._pending[k] for k in uniq if k in self._pending}
+            cached.update(self.get_many([k for k in uniq if k not in cached]))
+        todo = {}
+        for k, t in zip(keys, texts):
+            if k not in cached and k not in todo:
+                todo[k] = t
+        self.hits += len(keys) - sum(k not in cached for k in keys)
+        self.misses += len(todo)
+        if todo:
+            fresh = np.asarray(encode_fn(list(todo.values())), dtype=np.float32)
+            # round-trip through the storage dtype so hits and misses return identical vectors
+            fresh = fresh.astype(self.dtype).astype(np.float32)
+            with self._lock:
+                if buffer:
+                    self._pending.update(zip(todo, fresh))
+                    if len(self._pending) >= PENDING_ROWS:
+                        self._flush_pending()
+                else:
+                    self.put_many(list(todo), fresh)
+            cached.update(zip(todo, fresh))
+        if not keys:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack([cached[k] for k in keys])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "mb": self.nbytes() / 2**20}
+
+    def close(self):
+        with self._lock:
+            self._flush_pending()
+            self._flush_used()
+            self._db.commit()
+            self._maps.clear()
+            self._db.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name, model=None, path=EMB_CACHE_DIR):
+    """Process-wide cache for a model (None when RAG_EMB_CACHE_MB=0)."""
+    max_mb = int(os.environ.get("RAG_EMB_CACHE_MB") or MAX_MB)
+    if max_mb <= 0:
+        return None
+    revision = model_revision(model) if model is not None else "local"
+    key = (model_name, revision, path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model_name, revision, path=path, max_mb=max_mb)
+        return _caches[key]
+
+@atexit.register
+def _flush_caches():
+    """Write the buffered query-path misses of the process-wide caches at exit."""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.flush()
+
+def cached_encode(model_name, model, texts, buffer=False, **encode_kwargs):
+    """model.encode(texts, convert_to_numpy=True, **encode_kwargs) through the model's cache (see EmbeddingCache.encode)."""
+    fn = lambda ts: model.encode(ts, convert_to_numpy=True, **encode_kwargs)
+    cache = get_embedding_cache(model_name, model)
+    return fn(texts) if cache is None else cache.encode(texts, fn, buffer=buffer)
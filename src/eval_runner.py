@@ -0,0 +1,268 @@
+# src/eval_runner.py
+"""
+Evaluation harness for regression runs over a QA JSONL file, one item per line:
+{"id", "question", "gold_answers": [..], "gold_claim_labels": [{"claim", "label"}, ..], "filters": {..}}
+(label: "supported"/"entailed"/true vs anything else; both gold fields are optional, as are the
+document-attribute filters applied to retrieval, see doc_attrs).
+
+Items flow through the stages in batches: retrieve (one batched search plus the table-store
+probe), generate (batched generate_answers), verify (claim extraction, MES and one
+fragility batch per item batch). Every stage runs in its own thread behind a bounded queue, so batch k+1 is retrieved while batch k is
+generating. Finished items are appended to the output JSONL after each batch, and
+--resume skips the ids already there, so an interrupted run continues where it stopped.
+
+With --trace, the pipeline's spans (see tracing) go to a JSONL file and the summary also
+ranks the hottest stages by self time; --profile (sample by default) profiles every stage
+batch into results/profiles/. The stages run concurrently, so --profile cprofile only gets
+the batches that do not overlap another stage's; the rest are reported as profiles_skipped.
+
+The summary reports per-stage latency percentiles (the wall time of the batch an item was
+in), end-to-end latency, throughput, answer exact match / token F1 / numeric match against
+gold_answers, the hallucination rate (claims the verifier does not support), and claim
+verification accuracy against gold_claim_labels.
+Run from the repo root: python src/eval_runner.py --qa data/qa.jsonl --out results/eval.jsonl --resume --trace results/trace.jsonl
+"""
+import json, os, re, string, time
+from collections import Counter
+from functools import partial
+import numpy as np
+import tracing
+from utils import batched, prefetch, parse_number, save_json
+
+BATCH_SIZE = 8
+SUPPORT_P = 0.5           # p_entail at or above which a claim counts as supported
+CLAIM_MATCH_F1 = 0.5      # token F1 needed to align a generated claim with a gold claim
+STAGES = ("retrieve", "generate", "verify")
+_STRIP = set(string.punctuation) - {".", "%"}
+
+# metrics ------------------------------------------------------------------------------
+
+def normalize_answer(text):
+    text = (text or "").lower()
+    text = "".join(ch for ch in text if ch not in _STRIP)
+    text = re.sub(r"\b(a|an|the)\b", " ", text)
+    return " ".join(text.replace(". ", " ").rstrip(".").split())
+
+def token_f1(pred, gold):
+    p, g = normalize_answer(pred).split(), normalize_answer(gold).split()
+    common = sum((Counter(p) & Counter(g)).values())
+    if not p or not g or not common:
+        return float(p == g)
+    prec, rec = common / len(p), common / len(g)
+    return 2 * prec * rec / (prec + rec)
+
+def _numbers(text):
+    vals = [parse_number(m) for m in re.findall(r"\(?-?[$₹]?\d[\d,]*(?:\.\d+)?%?\)?", text or "")]
+    return [v for v in vals if v is not None]
+
+def numeric_match(pred, gold, rel_tol=0.01):
+    """True if every number in the gold answer appears in the prediction (within rel_tol)."""
+    gold_nums = _numbers(gold)
+    pred_nums = _numbers(pred)
+    return bool(gold_nums) and all(any(abs(p - g) <= rel_tol * max(abs(g), 1e-9) for p in pred_nums) for g in gold_nums)
+
+def _gold_supported(label):
+    return label is True or str(label).lower() in ("supported", "entailed", "entailment", "true", "1")
+
+def claim_label_matches(verifications, gold_claim_labels):
+    """(gold_supported, predicted_supported) for each gold claim aligned with a generated claim."""
+    pairs = []
+    for g in gold_claim_labels or []:
+        best, best_f1 = None, CLAIM_MATCH_F1
+        for v in verifications:
+            f1 = token_f1(v["claim"], g["claim"])
+            if f1 >= best_f1:
+                best, best_f1 = v, f1
+        if best is not None:
+            pairs.append((_gold_supported(g["label"]), best["p_entail"] >= SUPPORT_P))
+    return pairs
+
+def _pct(values):
+    if not values:
+        return {}
+    a = np.asarray(values) * 1000
+    return {"p50_ms": float(np.percentile(a, 50)), "p90_ms": float(np.percentile(a, 90)),
+            "p99_ms": float(np.percentile(a, 99)), "mean_ms": float(a.mean())}
+
+def summarize(records, wall_seconds=None):
+    s = {"items": len(records)}
+    s["latency"] = {st: _pct([r["timings"][st] for r in records if st in r.get("timings", {})]) for st in STAGES}
+    s["latency"]["end_to_end"] = _pct([r["latency"] for r in records if "latency" in r])
+    if wall_seconds:
+        s["throughput_items_per_s"] = len(records) / wall_seconds
+    gold = [r for r in records if r.get("gold_answers")]
+    if gold:
+        s["answer_em"] = float(np.mean([max(normalize_answer(r["answer"]) == normalize_answer(g) for g in r["gold_answers"])
+                                        for r in gold]))
+        s["answer_f1"] = float(np.mean([max(token_f1(r["answer"], g) for g in r["gold_answers"]) for r in gold]))
+        s["answer_numeric"] = float(np.mean([any(numeric_match(r["answer"], g) for g in r["gold_answers"]) for r in gold]))
+    claims = [v for r in records for v in r["verifications"]]
+    s["claims"] = len(claims)
+    if claims:
+        s["hallucination_rate"] = float(np.mean([v["p_entail"] < SUPPORT_P for v in claims]))
+        s["mes_size"] = float(np.mean([len(v["mes"]) for v in claims]))
+        frag = [v["fragility"] for v in claims if "fragility" in v]
+        if frag:
+            s["fragility"] = float(np.mean(frag))
+    pairs = [p for r in records for p in claim_label_matches(r["verifications"], r.get("gold_claim_labels"))]
+    if pairs:
+        # positives are hallucinations: gold-unsupported claims, flagged when the verifier does not support them
+        tp = sum(1 for g, p in pairs if not g and not p)
+        fp = sum(1 for g, p in pairs if g and not p)
+        fn = sum(1 for g, p in pairs if not g and p)
+        s["claim_label_accuracy"] = sum(g == p for g, p in pairs) / len(pairs)
+        s["hallucination_precision"] = tp / (tp + fp) if tp + fp else 0.0
+        s["hallucination_recall"] = tp / (tp + fn) if tp + fn else 0.0
+        s["gold_claims_matched"] = len(pairs)
+    return s
+
+# stages -------------------------------------------------------------------------------
+
+def _retrieve(batch, ctx, cross_encoder):
+    from retriever_gpu import retrieve_batch
+    from table_store import sql_hits
+    qs = [r["question"] for r in batch]
+    cands_lists = retrieve_batch(qs, cross_encoder=cross_encoder, ctx=ctx, filters=[r.get("filters") for r in batch])
+    for r, cands, sql in zip(batch, cands_lists, sql_hits(qs, ctx=ctx)):
+        r["_evidence"] = cands[:4]
+        r["_sql_hits"] = sql
+
+def _generate(batch):
+    from generator_gpu import generate_answers
+    answers = generate_answers([r["question"] for r in batch], [r["_evidence"] for r in batch],
+                               [r["_sql_hits"] for r in batch])
+    for r, ans in zip(batch, answers):
+        r["answer"] = ans
+
+def _verify(batch, verifier, mes_strategy, n_perturb, ctx):
+    from evaluate import verify_answers
+    verifications = verify_answers([r["answer"] for r in batch], [r["_evidence"] for r in batch], verifier,
+                                   mes_strategy=mes_strategy, n_perturb=n_perturb, ctx=ctx)
+    for r, v in zip(batch, verifications):
+        r["verifications"] = v
+
+def _timed(name, fn, batches, profile=None):
+    for batch in batches:
+        t0 = time.perf_counter()
+        with tracing.profile(f"{name}-{batch[0]['id']}", profile), tracing.span(f"eval.{name}", batch=len(batch)):
+            fn(batch)
+        dt = time.perf_counter() - t0
+        for r in batch:
+            r["timings"][name] = dt
+        yield batch
+
+# runner -------------------------------------------------------------------------------
+
+def load_qa(path):
+    with open(path, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    for i, item in enumerate(items):
+        item.setdefault("id", str(i))
+    return items
+
+def load_results(path):
+    """Records already written to path; a torn last line (killed mid-write) is dropped from the file."""
+    if not os.path.exists(path):
+        return []
+    records, good_bytes = [], 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            good_bytes += len(line)
+    with open(path, "ab") as f:
+        f.truncate(good_bytes)
+    return records
+
+def run(qa_path, out_path, batch_size=BATCH_SIZE, resume=False, ctx=None, cross_encoder=None,
+        mes_strategy="greedy", n_perturb=5, depth=2, limit=None, trace=None, profile=None):
+    from pipeline import get_context
+    from verifier_api import verifier_predict_batch
+    from verifier_cache import CachedVerifier, get_default_cache
+    ctx = ctx or get_context()
+    if trace:
+        tracing.enable(trace, append=resume)
+    items = load_qa(qa_path)[:limit]
+    done = load_results(out_path) if resume else []
+    done_ids = {str(r["id"]) for r in done}
+    todo = [it for it in items if str(it["id"]) not in done_ids]
+    print(f"{len(items)} items, {len(done)} already done, {len(todo)} to run")
+    verifier = CachedVerifier(partial(verifier_predict_batch, ctx=ctx), cache=get_default_cache(), tag=ctx.verifier_path)
+    stages = {
+        "retrieve": partial(_retrieve, ctx=ctx, cross_encoder=cross_encoder),
+        "generate": _generate,
+        "verify": partial(_verify, verifier=verifier, mes_strategy=mes_strategy, n_perturb=n_perturb, ctx=ctx),
+    }
+
+    def start(batches):
+        for batch in batches:
+            t0 = time.perf_counter()
+            records = [{"id": it["id"], "question": it["question"], "gold_answers": it.get("gold_answers", []),
+                        "gold_claim_labels": it.get("gold_claim_labels", []), "timings": {}, "_t0": t0} for it in batch]
+            for r, it in zip(records, batch):
+                if it.get("filters"):
+                    r["filters"] = it["filters"]
+            yield records
+
+    stream = start(batched(todo, batch_size))
+    skipped_before = tracing.profiles_skipped()
+    for name in STAGES:
+        stream = prefetch(_timed(name, stages[name], stream, profile), depth)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fresh = []
+    t_run = time.perf_counter()
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as f:
+        for batch in stream:
+            now = time.perf_counter()
+            for r in batch:
+                r["latency"] = now - r.pop("_t0")
+                r["evidence"] = [c["chunk_id"] for c in r.pop("_evidence")]
+                r["sql_hits"] = r.pop("_sql_hits")
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            fresh += batch
+            print(f"{len(done) + len(fresh)}/{len(items)} items")
+    wall = time.perf_counter() - t_run
+    summary = {"run": summarize(fresh, wall) if fresh else {}, "all": summarize(done + fresh),
+               "verifier_cache": verifier.cache.stats()}
+    if profile == "cprofile":
+        summary["profiles_skipped"] = tracing.profiles_skipped() - skipped_before
+        if summary["profiles_skipped"]:
+            print(f"cProfile skipped {summary['profiles_skipped']} stage batches that overlapped another; "
+                  "--profile sample covers them all")
+    if trace:
+        tracing.disable()
+        summary["stages"] = tracing.summarize(tracing.load_trace(trace))
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+    from mes import STRATEGIES
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qa", required=True, help="QA JSONL with question / gold_answers / gold_claim_labels")
+    parser.add_argument("--out", default="./results/eval.jsonl")
+    parser.add_argument("--summary", help="write the summary JSON here (default: <out>.summary.json)")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--resume", action="store_true", help="skip items already in --out")
+    parser.add_argument("--mes_strategy", default="greedy", choices=STRATEGIES)
+    parser.add_argument("--n_perturb", type=int, default=5, help="fragility perturbations per claim (0: skip)")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--trace", help="write stage spans to this JSONL (appended to with --resume)")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=["cprofile", "sample"],
+                        help="profile every stage batch (default sample; cprofile skips batches that overlap another)")
+    parser.add_argument("--cascade", action="store_true", help="rerank with the models/reranker cascade (rerank_cascade)")
+    args = parser.parse_args()
+    cross_encoder = None
+    if args.cascade:
+        from rerank_cascade import RerankCascade
+        cross_encoder = RerankCascade()
+    summary = run(args.qa, args.out, batch_size=args.batch_size, resume=args.resume, mes_strategy=args.mes_strategy,
+                  n_perturb=args.n_perturb, limit=args.limit, trace=args.trace, profile=args.profile,
+                  cross_encoder=cross_encoder)
+    save_json(summary, args.summary or os.path.splitext(args.out)[0] + ".summary.json")
+    print(json.dumps({k: v for k, v in summary.items() if k != "stages"}, indent=2))
+    if "stages" in summary:
+        print(tracing.format_summary(summary["stages"], top=15))
@@ -1,31 +1,66 @@
 # src/evaluate.py
 """
 Skeleton evaluation: run pipeline on sample QA items and compute basic metrics.
-Items format: [{"id":..,"question":..,"gold_answers":[..], "gold_claim_labels":[...]}]
+Items format: [{"id":..,"question":..,"gold_answers":[..], "gold_claim_labels":[...], "filters": {..}}]
+(filters, optional: document-attribute filters for retrieval, see doc_attrs)
 """
 import json
-from retriever_gpu import retrieve
-from generator_gpu import generate_answer
+from functools import partial
+from retriever_gpu import retrieve_batch
+from generator_gpu import generate_answers
 from claim_extractor import extract_claims
 from mes import minimal_evidence_set
-from verifier_api import verifier_predict
+from crf import fragility_batch
+from table_store import sql_hits
+from verifier_api import verifier_predict_batch
+from verifier_cache import CachedVerifier, get_default_cache
+from pipeline import get_context
 
-def run_item(item, cross_encoder=None):
-    q = item["question"]
-    candidates = retrieve(q, cross_encoder=cross_encoder)
-    evidence = candidates[:4]
-    # if you have SQL probe implement and add here
-    sql_hits = []
-    ans = generate_answer(q, evidence, sql_hits)
-    claims = extract_claims(ans)
-    verifications = []
-    for c in claims:
-        # compute MES
-        S, p = minimal_evidence_set(c["text"], evidence, verifier_predict, threshold=0.85)
-        verifications.append({"claim": c["text"], "mes": [s["chunk_id"] for s in S], "p_entail": p})
-    return {"question": q, "answer": ans, "verifications": verifications}
+def verify_answers(answers, evidence_lists, verifier, mes_strategy="greedy", n_perturb=5, ctx=None):
+    """
+    Claims of each answer with their MES and p_entail against that answer's evidence; the
+    fragility of every claim is then scored with one verifier batch (n_perturb=0 skips it).
+    verifier: a CachedVerifier (predict / predict_batch). Returns one list of verifications per answer.
+    """
+    out, pending = [], []  # pending: (verification, evidence) awaiting fragility
+    for ans, evidence in zip(answers, evidence_lists):
+        verifications = []
+        for c in extract_claims(ans):
+            S, p = minimal_evidence_set(c["text"], evidence, verifier.predict, threshold=0.85,
+                                        verifier_predict_batch=verifier.predict_batch, strategy=mes_strategy)
+            verifications.append({"claim": c["text"], "citations": c["citations"], "mes": [s["chunk_id"] for s in S],
+                                  "p_entail": p})
+            pending.append((verifications[-1], evidence))
+        out.append(verifications)
+    if n_perturb and pending:
+        scores = fragility_batch([v["claim"] for v, _ in pending], [ev for _, ev in pending], verifier.predict_batch,
+                                 n_perturb=n_perturb, ctx=ctx)
+        for (v, _), f in zip(pending, scores):
+            v["fragility"] = f
+    return out
+
+def run_items(items, cross_encoder=None, ctx=None, mes_strategy="greedy", fragility=True, n_perturb=5):
+    """
+    Retrieval and generation for all items run batched (one embedder call, one FAISS search,
+    length-grouped generate calls), with table-store hits as [SQL-j] evidence; fragility of every claim is scored with one verifier batch
+    after all answers are verified.
+    """
+    qs = [item["question"] for item in items]
+    all_candidates = retrieve_batch(qs, cross_encoder=cross_encoder, ctx=ctx, filters=[item.get("filters") for item in items])
+    verifier = CachedVerifier(partial(verifier_predict_batch, ctx=ctx), cache=get_default_cache(),
+                              tag=(ctx or get_context()).verifier_path)
+    evidence_lists = [candidates[:4] for candidates in all_candidates]
+    sql_hits_lists = sql_hits(qs, ctx=ctx)
+    answers = generate_answers(qs, evidence_lists, sql_hits_lists)
+    verifications = verify_answers(answers, evidence_lists, verifier, mes_strategy, n_perturb if fragility else 0, ctx)
+    return [{"question": q, "answer": ans, "sql_hits": sql, "verifications": v}
+            for q, sql, ans, v in zip(qs, sql_hits_lists, answers, verifications)]
+
+def run_item(item, cross_encoder=None, ctx=None, mes_strategy="greedy", fragility=True):
+    return run_items([item], cross_encoder=cross_encoder, ctx=ctx, mes_strategy=mes_strategy, fragility=fragility)[0]
 
 if __name__ == "__main__":
     items = [{"id":"1", "question":"What was Apple net income in FY2023?"}]
-    for it in items:
-        print(json.dumps(run_item(it), indent=2))
+    for res in run_items(items):
+        print(json.dumps(res, indent=2))
+    print("verifier cache:", get_default_cache().stats())
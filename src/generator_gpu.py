@@ -1,37 +1,109 @@
 # src/generator_gpu.py
+"""
+Answer generation with the seq2seq generator. generate_answers batches many prompts:
+prompts are tokenized once, sorted by length and padded per batch only to the longest
+member, and each batch is one model.generate call (the encoder output and decoder KV
+cache are reused across decoding steps). stream_answer yields text as it is decoded.
+On hosts without CUDA, use_8bit loads the model with int8 dynamic quantization (or an
+ONNX Runtime export with RAG_GEN_CPU_PRECISION=onnx) instead of bitsandbytes.
+"""
+import os, threading
 import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from model_registry import get_generator
+from tracing import span, traced
+from utils import length_batches
 
 GEN_MODEL = "google/flan-t5-large"   # choose a model that fits Colab GPU (8bit recommended)
 device = "cuda" if torch.cuda.is_available() else "cpu"
+CPU_PRECISION = os.environ.get("RAG_GEN_CPU_PRECISION", "int8")  # "int8", "onnx" or "fp32"
+MAX_GEN_BATCH = 8
+MAX_GEN_BATCH_TOKENS = 8192  # padded prompt tokens per generate call
 
-def load_generator(model_path=None, use_8bit=True):
-    if model_path:
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_path, device_map="auto", load_in_8bit=use_8bit)
-    else:
-        tokenizer = AutoTokenizer.from_pretrained(GEN_MODEL)
-        model = AutoModelForSeq2SeqLM.from_pretrained(GEN_MODEL, device_map="auto", load_in_8bit=use_8bit)
-    return tokenizer, model
+def generator_precision(use_8bit=True):
+    if not use_8bit:
+        return "fp32"
+    return "8bit" if device == "cuda" else CPU_PRECISION
 
-def build_prompt(query, evidence_snips, sql_hits):
+def load_generator(model_path=None, use_8bit=True, precision=None):
+    # loaded once per (path, precision) and shared through the model registry
+    return get_generator(model_path or GEN_MODEL, precision or generator_precision(use_8bit))
+
+def build_prompt(query, evidence_snips, sql_hits, tokenizer=None, max_tokens=None):
+    # chunks are token-bounded by the chunker, so snippets go in whole. Given a tokenizer, the
+    # lowest-ranked snippets that would overflow max_tokens are left out (instead of the
+    # tokenizer truncating the question off the end of the prompt).
     evid = []
     for i,s in enumerate(evidence_snips):
-        text = s.get("meta", {}).get("text", "") or ""
-        evid.append(f"[{i}] {s.get('doc_id')} | {text[:400].replace('\\n',' ')}")
-    for i,s in enumerate(sql_hits):
-        evid.append(f"[SQL-{i}] {s['table_id']} | {s['col']}={s['raw']}")
+        text = (s.get("meta", {}).get("text", "") or "").replace("\n", " ")
+        evid.append(f"[{i}] {s.get('doc_id')} | {text}")
+    sql = [f"[SQL-{i}] {s['table_id']} | " + (f"{s['row']} | " if s.get("row") else "") + f"{s['col']}={s['raw']}"
+           for i,s in enumerate(sql_hits)]
+    head = ("You are a careful financial assistant. Use ONLY the evidence below. "
+            "Cite inline with [i]/[SQL-j]. If conflicting or missing, say 'INSUFFICIENT EVIDENCE'.\n\n")
+    tail = f"\n\nQuestion: {query}\n\nAnswer:"
+    if tokenizer is not None and max_tokens and evid:
+        lens = [len(ids) + 2 for ids in tokenizer(evid + sql, add_special_tokens=False)["input_ids"]]
+        budget = max_tokens - len(tokenizer(head + "EVIDENCE:\n" + tail)["input_ids"]) - sum(lens[len(evid):])
+        kept = []
+        for e, n in zip(evid, lens):
+            if n <= budget:
+                kept.append(e)
+                budget -= n
+        evid = kept
+    evid += sql
     ev_block = "\n\n".join(evid) if evid else "(no evidence found)"
-    prompt = (
-        "You are a careful financial assistant. Use ONLY the evidence below. "
-        "Cite inline with [i]/[SQL-j]. If conflicting or missing, say 'INSUFFICIENT EVIDENCE'.\n\n"
-        f"EVIDENCE:\n{ev_block}\n\nQuestion: {query}\n\nAnswer:"
-    )
-    return prompt
-
-def generate_answer(query, evidence_snips, sql_hits, model_path=None, max_new_tokens=180):
-    tokenizer, model = load_generator(model_path=model_path)
-    prompt = build_prompt(query, evidence_snips, sql_hits)
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1024).to(model.device)
-    out = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
-    return tokenizer.decode(out[0], skip_special_tokens=True)
+    return head + f"EVIDENCE:\n{ev_block}" + tail
+
+def _model_device(model):
+    return getattr(model, "device", None) or torch.device("cpu")
+
+@traced("generate", batch=0)
+def generate_answers(queries, evidence_lists, sql_hits_lists=None, model_path=None, max_new_tokens=180, use_8bit=True,
+                     max_input_tokens=1024, max_batch=MAX_GEN_BATCH, max_tokens=MAX_GEN_BATCH_TOKENS, precision=None,
+                     streamer=None):
+    """One answer per query; prompts of similar length share a generate call."""
+    if not queries:
+        return []
+    tokenizer, model = load_generator(model_path=model_path, use_8bit=use_8bit, precision=precision)
+    sql_hits_lists = sql_hits_lists or [[] for _ in queries]
+    prompts = [build_prompt(q, ev, sql, tokenizer=tokenizer, max_tokens=max_input_tokens)
+               for q, ev, sql in zip(queries, evidence_lists, sql_hits_lists)]
+    enc = tokenizer(prompts, truncation=True, max_length=max_input_tokens)
+    answers = [None] * len(prompts)
+    with torch.inference_mode():
+        for batch in length_batches([len(ids) for ids in enc["input_ids"]], max_batch, max_tokens):
+            feats = [{"input_ids": enc["input_ids"][i], "attention_mask": enc["attention_mask"][i]} for i in batch]
+            inputs = tokenizer.pad(feats, return_tensors="pt").to(_model_device(model))
+            with span("generate.model", batch=len(batch), input_tokens=int(inputs["input_ids"].shape[1])):
+                out = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, use_cache=True,
+                                     streamer=streamer)
+            for i, text in zip(batch, tokenizer.batch_decode(out, skip_special_tokens=True)):
+                answers[i] = text
+    return answers
+
+def generate_answer(query, evidence_snips, sql_hits, model_path=None, max_new_tokens=180, use_8bit=True, max_input_tokens=1024):
+    return generate_answers([query], [evidence_snips], [sql_hits], model_path=model_path, max_new_tokens=max_new_tokens,
+                            use_8bit=use_8bit, max_input_tokens=max_input_tokens)[0]
+
+def stream_answer(query, evidence_snips, sql_hits, model_path=None, max_new_tokens=180, use_8bit=True, max_input_tokens=1024,
+                  precision=None):
+    """Yield the answer text piece by piece while it is generated (generate runs in a background thread)."""
+    from transformers import TextIteratorStreamer
+    tokenizer, _ = load_generator(model_path=model_path, use_8bit=use_8bit, precision=precision)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def run():
+        try:
+            generate_answers([query], [evidence_snips], [sql_hits], model_path=model_path, max_new_tokens=max_new_tokens,
+                             use_8bit=use_8bit, max_input_tokens=max_input_tokens, precision=precision, streamer=streamer)
+        except BaseException as e:
+            errors.append(e)
+            streamer.end()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for text in streamer:
+        yield text
+    thread.join()
+    if errors:
+        raise errors[0]
@@ -1,62 +1,114 @@
 # src/ingest.py
 """
 Ingest PDFs, HTML, CSV to data/processed/*.json with fields:
-{id, title, text, tables: [{table_id, page, csv}], source}
+{id, title, text, tables: [{table_id, page, csv}], source, n_pages, page_starts, chunks, attrs}
+chunks are token-bounded text and table chunks (see chunker); page_starts holds the
+character offset of each page in text; attrs are the document attributes used to filter
+retrieval (issuer, doc_type, number, date, fiscal_year; see doc_attrs).
+Documents are processed in a process pool and skipped when unchanged since the last
+run (see ingest_engine / data/ingest_manifest.json). From the command line their tables are
+then loaded into the SQL probe store (table_store, --table_db), which only re-reads documents
+whose tables changed and drops those no longer in proc; run() does so only when given table_db.
 """
 import os
 from pathlib import Path
-import pdfplumber
-import camelot
-import pandas as pd
 from utils import save_json
+from ingest_engine import run_parallel
+from chunker import chunk_document
+from table_store import TableStore, TABLE_DB
+from doc_attrs import doc_attributes
 
 RAW = "./data/raw"
 PROC = "./data/processed"
-os.makedirs(PROC, exist_ok=True)
+MANIFEST = "./data/ingest_manifest.json"
+CAMELOT_PAGE_BATCH = 20  # pages per camelot.read_pdf call
+
+def _camelot_tables(path, n_pages, batch=CAMELOT_PAGE_BATCH):
+    """
+    Tables per page from one Camelot call per page batch (instead of one per page, which
+    re-parses the whole PDF every time). Returns ({page: [df, ...]}, pages whose batch failed).
+    """
+    import camelot
+    tables, failed = {}, set()
+    for start in range(1, n_pages + 1, batch):
+        end = min(n_pages, start + batch - 1)
+        try:
+            for t in camelot.read_pdf(path, pages=f"{start}-{end}"):
+                tables.setdefault(int(t.page), []).append(t.df)
+        except Exception:
+            failed.update(range(start, end + 1))
+    return tables, failed
 
 def process_pdf(path):
+    import pdfplumber
+    import pandas as pd
     docid = Path(path).stem
     out = {"id": docid, "title": docid, "text": "", "tables": [], "source": path}
     with pdfplumber.open(path) as pdf:
+        # try Camelot for table extraction (works with good PDFs)
+        cam_tables, failed = _camelot_tables(path, len(pdf.pages))
         pages_text = []
         for i, page in enumerate(pdf.pages):
             txt = page.extract_text() or ""
             pages_text.append(txt)
-            # try Camelot for table extraction (works with good PDFs)
+            if i + 1 not in failed:
+                for t_idx, df in enumerate(cam_tables.get(i + 1, [])):
+                    out["tables"].append({"table_id": f"{docid}_p{i+1}_t{t_idx}", "page": i+1, "csv": df.to_csv(index=False)})
+                continue
+            # fallback: pdfplumber simple table extraction
             try:
-                tables = camelot.read_pdf(path, pages=str(i+1))
-                for t_idx, t in enumerate(tables):
-                    csv = t.df.to_csv(index=False)
-                    out["tables"].append({"table_id": f"{docid}_p{i+1}_t{t_idx}", "page": i+1, "csv": csv})
+                p_tables = page.extract_tables()
+                for t_idx, t in enumerate(p_tables):
+                    df = pd.DataFrame(t)
+                    out["tables"].append({"table_id": f"{docid}_p{i+1}_pt{t_idx}", "page": i+1, "csv": df.to_csv(index=False)})
             except Exception:
-                # fallback: pdfplumber simple table extraction
-                try:
-                    p_tables = page.extract_tables()
-                    for t_idx, t in enumerate(p_tables):
-                        df = pd.DataFrame(t)
-                        out["tables"].append({"table_id": f"{docid}_p{i+1}_pt{t_idx}", "page": i+1, "csv": df.to_csv(index=False)})
-                except Exception:
-                    pass
+                pass
     out["text"] = "\n\n".join(pages_text)
+    out["n_pages"] = len(pages_text)
+    out["page_starts"] = [0]
+    for t in pages_text[:-1]:
+        out["page_starts"].append(out["page_starts"][-1] + len(t) + 2)
     return out
 
-def run():
-    p = Path(RAW)
-    for f in p.glob("*"):
-        if f.suffix.lower() in [".pdf", ".html", ".htm", ".txt", ".csv"]:
-            print("Processing", f)
-            try:
-                if f.suffix.lower() == ".csv":
-                    # wrap CSV into a 'doc' with no text and one table
-                    import pandas as pd
-                    df = pd.read_csv(f)
-                    docid = f.stem
-                    out = {"id": docid, "title": docid, "text": "", "tables": [{"table_id": f"{docid}_csv_0", "page": 0, "csv": df.to_csv(index=False)}], "source": str(f)}
-                else:
-                    out = process_pdf(str(f))
-                save_json(out, os.path.join(PROC, f"{out['id']}.json"))
-            except Exception as e:
-                print("Failed ingest", f, e)
+def ingest_file(path, proc=PROC):
+    """Worker: ingest one file and write its processed JSON. Returns {"out", "pages"}."""
+    f = Path(path)
+    if f.suffix.lower() == ".csv":
+        # wrap CSV into a 'doc' with no text and one table
+        import pandas as pd
+        df = pd.read_csv(f)
+        docid = f.stem
+        out = {"id": docid, "title": docid, "text": "", "tables": [{"table_id": f"{docid}_csv_0", "page": 0, "csv": df.to_csv(index=False)}], "source": str(f)}
+        pages = 1
+    else:
+        out = process_pdf(str(f))
+        pages = out["n_pages"]
+    out["chunks"] = chunk_document(out["id"], out["text"], out["tables"], page_starts=out.get("page_starts"))
+    out["attrs"] = doc_attributes(out["id"], out["text"], out["title"], out["tables"])
+    out_path = os.path.join(proc, f"{out['id']}.json")
+    save_json(out, out_path)
+    return {"out": out_path, "pages": pages}
+
+def run(raw=RAW, proc=PROC, workers=None, force=False, manifest=MANIFEST, table_db=None):
+    from functools import partial
+    os.makedirs(proc, exist_ok=True)
+    files = [f for f in sorted(Path(raw).glob("*")) if f.suffix.lower() in [".pdf", ".html", ".htm", ".txt", ".csv"]]
+    stats = run_parallel(files, partial(ingest_file, proc=proc), manifest, workers=workers, force=force)
+    print(f"Ingested {stats['done']} files ({stats['pages']} pages) in {stats['seconds']:.1f}s, "
+          f"skipped {stats['skipped']} unchanged, {stats['failed']} failed")
+    if table_db:
+        store = TableStore(table_db)
+        tstats = store.load_processed(proc)
+        print(f"Table store: {tstats['loaded']} documents loaded, {tstats['unchanged']} unchanged, "
+              f"{tstats['removed']} removed, {len(store)} tables")
+        store.close()
+    return stats
 
 if __name__ == "__main__":
-    run()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="re-ingest files even if unchanged")
+    parser.add_argument("--table_db", default=TABLE_DB, help="table store to refresh ('' to skip)")
+    args = parser.parse_args()
+    run(workers=args.workers, force=args.force, table_db=args.table_db)
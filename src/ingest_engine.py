@@ -0,0 +1,52 @@
+# src/ingest_engine.py
+"""
+Parallel, resumable file processing shared by ingest.py and preprocess.py.
+Files run in a process pool. A manifest records each finished file's size, mtime and
+sha256 and is saved after every completion, so unchanged files are skipped and a
+crashed run resumes where it stopped. A file whose mtime changed but whose content
+hash did not is also skipped.
+"""
+import os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import load_json, save_json, file_sha256
+
+def _unchanged(path, entry):
+    if entry is None:
+        return False
+    st = os.stat(path)
+    if entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+        return True
+    if entry["size"] == st.st_size and entry["sha256"] == file_sha256(path):
+        entry["mtime"] = st.st_mtime  # touched but identical; remember the new mtime
+        return True
+    return False
+
+def run_parallel(files, worker, manifest_path, workers=None, force=False):
+    """
+    files: paths to process; worker(path) -> dict (e.g. {"out":..., "pages":...}), must be picklable.
+    Returns {"done", "skipped", "failed", "pages", "seconds"}.
+    """
+    manifest = load_json(manifest_path) if os.path.exists(manifest_path) else {}
+    todo = [str(f) for f in files if force or not _unchanged(str(f), manifest.get(str(f)))]
+    stats = {"done": 0, "skipped": len(files) - len(todo), "failed": 0, "pages": 0}
+    if stats["skipped"]:
+        save_json(manifest, manifest_path)
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(worker, f): f for f in todo}
+        for fut in as_completed(futures):
+            f = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                print("Failed ingest", f, e)
+                stats["failed"] += 1
+                continue
+            st = os.stat(f)
+            manifest[f] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": file_sha256(f), **res}
+            save_json(manifest, manifest_path)
+            stats["done"] += 1
+            stats["pages"] += res.get("pages", 0)
+            print("Processed", f)
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
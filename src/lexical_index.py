@@ -0,0 +1,191 @@
+# src/lexical_index.py
+"""
+BM25 inverted index over the chunk texts, row-aligned with the FAISS index / meta store.
+
+Postings are stored CSR-style in NumPy arrays under indices/bm25/:
+  vocab.json        term list (term id = position), row count and BM25 parameters
+  df.npy            int32 live document frequency per term
+  dl.npy            float32 token count per row, 0 for rows without a live chunk
+  indptr.npy        int64 (V+1), postings of term t are [indptr[t], indptr[t+1])
+  rows.npy, tf.npy  int32 posting rows (FAISS vector ids), float32 term frequencies
+  delta/            indptr / rows / tf of the postings added since the last merge
+update_bm25 only tokenizes the changed chunks: new rows go to the delta segment, removed
+rows leave df and dl (their postings stay until the next merge and are masked by dl == 0),
+and the delta is folded into the main segment once it holds MERGE_FRACTION of its postings.
+idf and avgdl follow from df / dl when the index is opened, and scoring a query is a
+gather over the query terms' postings, the BM25 weight of each, and one np.bincount, so no
+Python loop runs per candidate. The tokenizer keeps tickers, line items and fiscal-year
+strings (gstr-3b, fy2023, 1234.5) as single tokens.
+"""
+import json, os, re, shutil
+from collections import Counter
+import numpy as np
+
+BM25_DIR = "./indices/bm25"
+K1 = 1.2
+B = 0.75
+MERGE_FRACTION = 0.25   # delta postings (relative to the main segment) that trigger a merge
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+def tokenize(text):
+    text = re.sub(r"(?<=\d),(?=\d)", "", (text or "").lower())  # 1,234 -> 1234
+    return _TOKEN_RE.findall(text)
+
+def _count(rows, vocab):
+    """Tokenize (row_id, text) pairs, extending vocab. Returns term ids, rows, tfs and {row: length}."""
+    t_ids, p_rows, tfs, lens = [], [], [], {}
+    for row, text in rows:
+        counts = Counter(tokenize(text))
+        lens[row] = sum(counts.values())
+        for term, tf in counts.items():
+            t_ids.append(vocab.setdefault(term, len(vocab)))
+            p_rows.append(row)
+            tfs.append(tf)
+    return np.asarray(t_ids, dtype=np.int64), np.asarray(p_rows, dtype=np.int32), np.asarray(tfs, dtype=np.float32), lens
+
+def _save(path, name, arr):
+    # replaced, not rewritten in place: a serving process may have the old file mapped
+    tmp = os.path.join(path, name + ".tmp.npy")
+    np.save(tmp, arr)
+    os.replace(tmp, os.path.join(path, name))
+
+def _write_segment(path, n_terms, t_ids, rows, tfs):
+    order = np.argsort(t_ids, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(t_ids, minlength=n_terms))]).astype(np.int64)
+    os.makedirs(path, exist_ok=True)
+    _save(path, "indptr.npy", indptr)
+    _save(path, "rows.npy", rows[order].astype(np.int32))
+    _save(path, "tf.npy", tfs[order].astype(np.float32))
+
+def _read_segment(path):
+    load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+    return load("indptr.npy"), load("rows.npy"), load("tf.npy")
+
+def _triples(segment):
+    indptr, rows, tfs = segment
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), np.asarray(rows), np.asarray(tfs)
+
+def _write_stats(path, terms, df, dl, k1, b):
+    _save(path, "df.npy", df.astype(np.int32))
+    _save(path, "dl.npy", dl.astype(np.float32))
+    tmp = os.path.join(path, "vocab.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"terms": list(terms), "n_rows": int(len(dl)), "k1": k1, "b": b}, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(path, "vocab.json"))
+
+def build_bm25(rows, path=BM25_DIR, k1=K1, b=B):
+    """rows: iterable of (row_id, text). Writes the index to path and returns it loaded."""
+    vocab = {}
+    t_ids, p_rows, tfs, lens = _count(rows, vocab)
+    dl = np.zeros((max(lens) + 1) if lens else 0, dtype=np.float32)
+    if lens:
+        dl[list(lens)] = list(lens.values())
+    os.makedirs(path, exist_ok=True)
+    shutil.rmtree(os.path.join(path, "delta"), ignore_errors=True)
+    _write_segment(path, len(vocab), t_ids, p_rows, tfs)
+    _write_stats(path, vocab, np.bincount(t_ids, minlength=len(vocab)), dl, k1, b)
+    return LexicalIndex(path)
+
+def update_bm25(added, removed=(), path=BM25_DIR, merge_fraction=MERGE_FRACTION):
+    """
+    added: iterable of (row_id, text) for new rows, ids past every row indexed so far.
+    removed: iterable of (row_id, text) of indexed rows to drop, with the text they were indexed with.
+    Only these texts are tokenized. Returns the updated index loaded.
+    """
+    with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+        v = json.load(f)
+    vocab = {t: i for i, t in enumerate(v["terms"])}
+    df = np.array(np.load(os.path.join(path, "df.npy")), dtype=np.int64)
+    dl = np.array(np.load(os.path.join(path, "dl.npy")))
+    for row, text in removed:
+        if 0 <= row < len(dl) and dl[row] > 0:
+            df[[vocab[t] for t in set(tokenize(text)) if t in vocab]] -= 1
+            dl[row] = 0
+    t_ids, p_rows, tfs, lens = _count(added, vocab)
+    if lens and min(lens) < len(dl):
+        raise ValueError(f"row {min(lens)} is already part of the BM25 index (size {len(dl)})")
+    if lens:
+        dl = np.concatenate([dl, np.zeros(max(lens) + 1 - len(dl), dtype=np.float32)])
+        dl[list(lens)] = list(lens.values())
+    df = np.concatenate([df, np.zeros(len(vocab) - len(df), dtype=np.int64)]) + np.bincount(t_ids, minlength=len(vocab))
+
+    delta_dir = os.path.join(path, "delta")
+    main = _read_segment(path)
+    if os.path.exists(os.path.join(delta_dir, "indptr.npy")):
+        old_t, old_r, old_f = _triples(_read_segment(delta_dir))
+        t_ids, p_rows, tfs = np.concatenate([old_t, t_ids]), np.concatenate([old_r, p_rows]), np.concatenate([old_f, tfs])
+    if len(p_rows) > merge_fraction * len(main[1]):
+        # merge: both segments' postings in one CSR, without the rows removed since the last merge
+        main_t, main_r, main_f = _triples(main)
+        t_ids, p_rows, tfs = np.concatenate([main_t, t_ids]), np.concatenate([main_r, p_rows]), np.concatenate([main_f, tfs])
+        keep = dl[p_rows] > 0
+        _write_segment(path, len(vocab), t_ids[keep], p_rows[keep], tfs[keep])
+        shutil.rmtree(delta_dir, ignore_errors=True)
+    else:
+        _write_segment(delta_dir, len(vocab), t_ids, p_rows, tfs)
+    _write_stats(path, vocab, df, dl, v.get("k1", K1), v.get("b", B))
+    return LexicalIndex(path)
+
+class LexicalIndex:
+    def __init__(self, path=BM25_DIR):
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            v = json.load(f)
+        self.vocab = {t: i for i, t in enumerate(v["terms"])}
+        self.n_rows = v["n_rows"]
+        self.k1, self.b = v.get("k1", K1), v.get("b", B)
+        self.dl = np.load(os.path.join(path, "dl.npy"), mmap_mode="r")
+        df = np.load(os.path.join(path, "df.npy"))
+        n_docs = max(1, int(np.count_nonzero(self.dl)))
+        self.avgdl = max(1.0, float(self.dl.sum()) / n_docs)
+        self.idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.segments = [_read_segment(path)]
+        if os.path.exists(os.path.join(path, "delta", "indptr.npy")):
+            self.segments.append(_read_segment(os.path.join(path, "delta")))
+
+    @staticmethod
+    def exists(path=BM25_DIR):
+        return os.path.exists(os.path.join(path, "vocab.json"))
+
+    def _postings(self, query):
+        tids = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        rows, tfs, idf = [], [], []
+        for indptr, seg_rows, seg_tf in self.segments:
+            for t in tids:
+                if t + 1 < len(indptr):
+                    lo, hi = indptr[t], indptr[t + 1]
+                    rows.append(seg_rows[lo:hi])
+                    tfs.append(seg_tf[lo:hi])
+                    idf.append(np.full(hi - lo, self.idf[t], dtype=np.float32))
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        rows, tf, idf = np.concatenate(rows), np.concatenate(tfs), np.concatenate(idf)
+        dl = self.dl[rows]
+        w = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl))
+        return rows, np.where(dl > 0, w, 0.0)  # postings of removed rows wait for the next merge
+
+    def scores(self, query):
+        """Dense BM25 score vector over all rows."""
+        rows, w = self._postings(query)
+        return np.bincount(rows, weights=w, minlength=self.n_rows)
+
+    def search(self, query, k, rows=None):
+        """Top-k (rows, scores) with a positive BM25 score, best first; only among rows if given."""
+        s = self.scores(query)
+        if rows is not None:
+            keep = np.zeros(len(s), dtype=bool)
+            keep[rows[rows < len(s)]] = True
+            s = np.where(keep, s, 0.0)
+        nz = np.flatnonzero(s)
+        if len(nz) > k:
+            nz = nz[np.argpartition(-s[nz], k)[:k]]
+        nz = nz[np.argsort(-s[nz])]
+        return nz, s[nz]
+
+    def score_rows(self, query, rows):
+        s = self.scores(query)
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.zeros(len(rows))
+        ok = (rows >= 0) & (rows < len(s))
+        out[ok] = s[rows[ok]]
+        return out
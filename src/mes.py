@@ -1,29 +1,148 @@
 # src/mes.py
-from copy import deepcopy
+"""
+Minimal evidence set (MES): the smallest subset of retrieved candidates that the
+verifier still says entails the claim. Search strategies:
+- greedy:      remove one candidate, restart the backwards scan after every success (O(n^2) calls)
+- deletion:    single backwards deletion pass (n calls)
+- quickxplain: binary-split elimination, O(k log(n/k)) calls for a k-chunk MES
+- importance:  score every chunk alone in one batch, binary-search the shortest entailing
+               prefix in importance order, then a deletion pass over that prefix
+Pass stats={} to get back verifier_calls (the subsets the sequential algorithm scores, so
+strategies compare on equal terms), verifier_pairs (pairs actually sent to the verifier:
+batched greedy also scores the trials after the first success of a pass) and
+verifier_batches (verifier invocations).
+"""
+from tracing import current, traced
 
-def minimal_evidence_set(claim, candidates, verifier_predict, threshold=0.85):
-    """
-    claim: string
-    candidates: list of {"id","text",...} (ranked by relevance)
-    verifier_predict: function(claim, list_of_texts) -> float (prob of entailment)
-    """
-    S = deepcopy(candidates)
-    if not S:
-        return [], 0.0
-    best_prob = verifier_predict(claim, [c["text"] for c in S])
-    if best_prob < threshold:
-        return [], best_prob
+STRATEGIES = ("greedy", "deletion", "quickxplain", "importance")
+
+def _text(c):
+    return c.get("text") or c.get("meta", {}).get("text", "") or ""
+
+class _Scorer:
+    def __init__(self, claim, candidates, verifier_predict, verifier_predict_batch):
+        self.claim = claim
+        self.texts = [_text(c) for c in candidates]
+        self.predict = verifier_predict
+        self.predict_batch = verifier_predict_batch
+        self.calls = 0    # subsets the sequential algorithm scores
+        self.pairs = 0    # (claim, evidence) pairs sent to the verifier
+        self.batches = 0  # verifier invocations
+
+    def score(self, idxs):
+        self.calls += 1
+        self.pairs += 1
+        self.batches += 1
+        return self.predict(self.claim, [self.texts[i] for i in idxs])
+
+    def score_many(self, subsets, count_calls=True):
+        """count_calls=False: the caller adds the calls the sequential algorithm would have made."""
+        if self.predict_batch is None:
+            return [self.score(s) for s in subsets]
+        if not subsets:
+            return []
+        self.calls += len(subsets) if count_calls else 0
+        self.pairs += len(subsets)
+        self.batches += 1
+        return self.predict_batch([(self.claim, [self.texts[i] for i in s]) for s in subsets])
+
+def _greedy(scorer, idxs, threshold):
+    S = idxs
     changed = True
     while changed:
         changed = False
         # try removing least-important (end) candidates first
-        for i in range(len(S)-1, -1, -1):
-            trial = S[:i] + S[i+1:]
-            if not trial:
-                continue
-            p = verifier_predict(claim, [c["text"] for c in trial])
+        trials = [S[:i] + S[i+1:] for i in range(len(S)-1, -1, -1)] if len(S) > 1 else []
+        probs = scorer.score_many(trials, count_calls=False) if scorer.predict_batch is not None else None
+        for j, trial in enumerate(trials):
+            p = probs[j] if probs is not None else scorer.score(trial)
+            if probs is not None:
+                scorer.calls += 1  # the sequential scan stops at the first success
             if p >= threshold:
                 S = trial
                 changed = True
                 break
-    return S, verifier_predict(claim, [c["text"] for c in S])
+    return S, scorer.score(S)
+
+def _deletion(scorer, idxs, threshold, p_full):
+    S, p_S = list(idxs), p_full
+    for i in reversed(idxs):
+        if len(S) == 1:
+            break
+        trial = [j for j in S if j != i]
+        p = scorer.score(trial)
+        if p >= threshold:
+            S, p_S = trial, p
+    return S, p_S
+
+def _quickxplain(scorer, idxs, threshold):
+    def entails(B):
+        return bool(B) and scorer.score(B) >= threshold
+
+    def qx(B, delta, C):
+        # minimal X within C such that B + X entails, given that B + C does
+        if delta and entails(B):
+            return []
+        if len(C) == 1:
+            return C
+        C1, C2 = C[:len(C) // 2], C[len(C) // 2:]
+        X2 = qx(B + C1, C1, C2)
+        X1 = qx(B + X2, X2, C1)
+        return X1 + X2
+
+    S = sorted(qx([], [], list(idxs)))
+    return S, scorer.score(S)
+
+def _importance(scorer, idxs, threshold, p_full):
+    singles = scorer.score_many([[i] for i in idxs])
+    order = [i for _, i in sorted(zip(singles, idxs), key=lambda x: -x[0])]
+    # entailment is assumed monotone in the prefix length, so binary-search the shortest one
+    lo, hi, p_hi = 1, len(order), p_full
+    while lo < hi:
+        mid = (lo + hi) // 2
+        p = scorer.score(order[:mid])
+        if p >= threshold:
+            hi, p_hi = mid, p
+        else:
+            lo = mid + 1
+    S, _ = _deletion(scorer, order[:hi], threshold, p_hi)
+    # the pass above scored S in importance order; score the set in the (relevance) order it is returned
+    S = sorted(S)
+    return S, scorer.score(S)
+
+@traced("mes", batch=1)
+def minimal_evidence_set(claim, candidates, verifier_predict, threshold=0.85, verifier_predict_batch=None,
+                         strategy="greedy", stats=None):
+    """
+    claim: string
+    candidates: list of {"id","text",...} (ranked by relevance)
+    verifier_predict: function(claim, list_of_texts) -> float (prob of entailment)
+    verifier_predict_batch: optional function([(claim, list_of_texts), ...]) -> [float];
+        when given, strategies that can score several subsets at once do so in one call
+    strategy: one of STRATEGIES
+    stats: optional dict, filled with {"verifier_calls", "verifier_pairs", "verifier_batches"}
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown MES strategy {strategy!r}, expected one of {STRATEGIES}")
+    if not candidates:
+        return [], 0.0
+    scorer = _Scorer(claim, candidates, verifier_predict, verifier_predict_batch)
+    idxs = list(range(len(candidates)))
+    best_prob = scorer.score(idxs)
+    if best_prob < threshold:
+        S, p = [], best_prob
+    elif strategy == "greedy":
+        S, p = _greedy(scorer, idxs, threshold)
+    elif strategy == "deletion":
+        S, p = _deletion(scorer, idxs, threshold, best_prob)
+    elif strategy == "quickxplain":
+        S, p = _quickxplain(scorer, idxs, threshold)
+    else:
+        S, p = _importance(scorer, idxs, threshold, best_prob)
+    current().set(strategy=strategy, size=len(S), verifier_calls=scorer.calls, verifier_pairs=scorer.pairs,
+                  verifier_batches=scorer.batches)
+    if stats is not None:
+        stats["verifier_calls"] = scorer.calls
+        stats["verifier_pairs"] = scorer.pairs
+        stats["verifier_batches"] = scorer.batches
+    return [candidates[i] for i in S], p
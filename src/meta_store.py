@@ -0,0 +1,184 @@
+# src/meta_store.py
+"""
+Columnar, memory-mapped chunk metadata keyed by FAISS vector id (row == id).
+
+Layout of indices/meta/ (raw little-endian arrays, all append-only):
+  docs.json                 distinct doc_ids (small); doc_code.i32 maps row -> position in it
+  doc_attrs.json            per-doc attributes (issuer, doc_type, date, fiscal_year, ...; see doc_attrs),
+                            aligned with docs.json; rows_matching(filters) selects rows through doc_code
+  alive.u8                  0 for removed ids / gaps left by incremental updates
+  <col>.off.i64, <col>.bin  offsets (n+1) + utf-8 blob for chunk_id, text, meta (json)
+
+Readers open everything with mmap, so loading costs milliseconds and rows are paged in
+on access. Appends only write to the end of each file, so streaming builds can append
+batch after batch at constant cost. alive.u8 is written last and defines the row count:
+a crash mid-append leaves the previous rows readable, and the next append (or
+truncate) cuts the partial tail from the other files.
+"""
+import json, os
+import numpy as np
+
+META_DIR = "./indices/meta"
+STR_COLS = ("chunk_id", "text", "meta")
+
+def _memmap(path, dtype, mode="r"):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode)
+
+def _append(path, arr, keep_items):
+    """Cut the file to keep_items elements, then append arr."""
+    with open(path, "ab") as f:
+        f.truncate(keep_items * arr.dtype.itemsize)
+        f.write(np.ascontiguousarray(arr).tobytes())
+
+class MetaStore:
+    def __init__(self, path=META_DIR):
+        self.path = path
+        self._open()
+
+    def _p(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        self.docs = []
+        if os.path.exists(self._p("docs.json")):
+            with open(self._p("docs.json"), "r", encoding="utf-8") as f:
+                self.docs = json.load(f)
+        attrs = []
+        if os.path.exists(self._p("doc_attrs.json")):
+            with open(self._p("doc_attrs.json"), "r", encoding="utf-8") as f:
+                attrs = json.load(f)
+        self.doc_attrs = attrs + [{}] * (len(self.docs) - len(attrs))
+        self.alive = _memmap(self._p("alive.u8"), np.uint8)
+        self.doc_code = _memmap(self._p("doc_code.i32"), np.int32)
+        self.offsets = {c: _memmap(self._p(f"{c}.off.i64"), np.int64) for c in STR_COLS}
+        self.blobs = {c: _memmap(self._p(f"{c}.bin"), np.uint8) for c in STR_COLS}
+
+    def __len__(self):
+        return len(self.alive)
+
+    def _bytes(self, col, row):
+        off = self.offsets[col]
+        return self.blobs[col][off[row]:off[row + 1]]
+
+    def text_bytes(self, row):
+        """Zero-copy view of a chunk's utf-8 text."""
+        return memoryview(self._bytes("text", row))
+
+    def text(self, row):
+        return self._bytes("text", row).tobytes().decode("utf-8")
+
+    def attrs(self, row):
+        return {"doc_id": self.docs[self.doc_code[row]], **self.doc_attrs[self.doc_code[row]]}
+
+    def rows_matching(self, filters):
+        """Live rows whose document attributes (and doc_id) satisfy filters, as sorted int64 ids."""
+        from doc_attrs import matches
+        codes = [i for i, (d, a) in enumerate(zip(self.docs, self.doc_attrs)) if matches({"doc_id": d, **a}, filters)]
+        mask = np.isin(self.doc_code[:len(self)], np.asarray(codes, dtype=np.int32)) & (self.alive[:] == 1)
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def get(self, row):
+        if row < 0 or row >= len(self.alive) or not self.alive[row]:
+            return None
+        return {
+            "doc_id": self.docs[self.doc_code[row]],
+            "chunk_id": self._bytes("chunk_id", row).tobytes().decode("utf-8"),
+            "text": self.text(row),
+            "meta": json.loads(self._bytes("meta", row).tobytes() or b"{}"),
+        }
+
+    # writes -----------------------------------------------------------------------------
+
+    @classmethod
+    def create(cls, rows, path=META_DIR):
+        """Write a fresh store. rows: list of (vector_id, {"doc_id","chunk_id","text","meta"})."""
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+        store = cls(path)
+        store.append(rows)
+        return store
+
+    def append(self, rows):
+        """
+        Append rows whose vector ids are >= len(self); skipped ids become dead rows. A chunk's
+        "attrs" (document attributes) are recorded for its doc_id.
+        """
+        if not rows:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        rows = sorted(rows, key=lambda r: r[0])
+        n_old = len(self)
+        if rows[0][0] < n_old:
+            raise ValueError(f"vector id {rows[0][0]} already present in the meta store (size {n_old})")
+        n_new = rows[-1][0] + 1
+        by_id = dict(rows)
+        docs = list(self.docs)
+        attrs = list(self.doc_attrs)
+        doc_pos = {d: i for i, d in enumerate(docs)}
+        codes = np.zeros(n_new - n_old, dtype=np.int32)
+        alive = np.zeros(n_new - n_old, dtype=np.uint8)
+        for vid, c in rows:
+            if c["doc_id"] not in doc_pos:
+                doc_pos[c["doc_id"]] = len(docs)
+                docs.append(c["doc_id"])
+                attrs.append({})
+            if c.get("attrs") is not None:
+                attrs[doc_pos[c["doc_id"]]] = c["attrs"]
+            codes[vid - n_old] = doc_pos[c["doc_id"]]
+            alive[vid - n_old] = 1
+        for col in STR_COLS:
+            off = self.offsets[col]
+            end = int(off[n_old]) if len(off) > n_old else 0
+            parts = []
+            for vid in range(n_old, n_new):
+                c = by_id.get(vid)
+                val = "" if c is None else (c.get(col) if col != "meta" else json.dumps(c.get("meta", {}), ensure_ascii=False))
+                parts.append((val or "").encode("utf-8"))
+            new_off = end + np.cumsum([len(b) for b in parts], dtype=np.int64)
+            if n_old == 0:
+                new_off = np.concatenate([[0], new_off]).astype(np.int64)
+            _append(self._p(f"{col}.bin"), np.frombuffer(b"".join(parts), dtype=np.uint8), end)
+            _append(self._p(f"{col}.off.i64"), new_off, n_old + 1 if n_old else 0)
+        if len(docs) != len(self.docs):
+            self._write_json("docs.json", docs)
+        if attrs != self.doc_attrs:
+            self._write_json("doc_attrs.json", attrs)
+        _append(self._p("doc_code.i32"), codes, n_old)
+        _append(self._p("alive.u8"), alive, n_old)
+        self._open()
+
+    def _write_json(self, name, obj):
+        tmp = self._p(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, self._p(name))
+
+    def set_doc_attrs(self, attrs_by_doc):
+        """Replace the attributes of known documents ({doc_id: attrs}); unknown doc_ids are ignored."""
+        attrs = list(self.doc_attrs)
+        for i, d in enumerate(self.docs):
+            if d in attrs_by_doc:
+                attrs[i] = attrs_by_doc[d]
+        if attrs != self.doc_attrs:
+            self._write_json("doc_attrs.json", attrs)
+            self.doc_attrs = attrs
+
+    def delete(self, ids):
+        ids = [i for i in ids if 0 <= i < len(self)]
+        if not ids:
+            return
+        alive = np.memmap(self._p("alive.u8"), dtype=np.uint8, mode="r+")
+        alive[ids] = 0
+        alive.flush()
+        del alive
+        self._open()
+
+    def truncate(self, n):
+        """Drop rows >= n (used when resuming an interrupted build from its checkpoint)."""
+        if n < len(self):
+            with open(self._p("alive.u8"), "ab") as f:
+                f.truncate(n)
+            self._open()
@@ -0,0 +1,201 @@
+# src/model_registry.py
+"""
+Process-wide registry of loaded models (generator, verifier, embedder, cross-encoder, reranker).
+Each model is loaded once per (kind, path, precision) and shared by every module.
+Least-recently-used models are evicted when the registry exceeds max_models or
+the memory budget (RAG_MAX_MODELS / RAG_MODEL_BUDGET_MB env vars).
+
+Eviction only frees a model once nothing else references it, so callers should fetch
+models from the registry per use (as PipelineContext and RerankCascade do) rather than
+keep them. The registry keeps a weak reference to every evicted model: while one is still
+referenced elsewhere it stays in memory_report / total_mb (evicted=True) and counts against
+the budget, and get() hands it back instead of loading a second copy.
+"""
+import gc, os, threading, time, weakref
+from collections import OrderedDict
+
+def _device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def _load_generator(path, precision):
+    """precision: "8bit" (bitsandbytes, GPU only), "int8" (torch dynamic quantization, CPU),
+    "onnx" (ONNX Runtime export via optimum, CPU) or "fp32"."""
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    if precision == "8bit":
+        model = AutoModelForSeq2SeqLM.from_pretrained(path, device_map="auto", load_in_8bit=True)
+    elif precision == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        return tokenizer, ORTModelForSeq2SeqLM.from_pretrained(path, export=True)
+    elif precision == "int8":
+        import torch
+        model = AutoModelForSeq2SeqLM.from_pretrained(path)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(path).to(_device())
+    model.eval()
+    return tokenizer, model
+
+def _load_verifier(path, precision):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForSequenceClassification.from_pretrained(path).to(_device())
+    model.eval()
+    return tokenizer, model
+
+def _load_embedder(path, precision):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(path, device=_device())
+
+def _load_cross_encoder(path, precision):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(path, device=_device())
+
+def _load_reranker(path, precision):
+    """precision: "fp32", "int8" (torch dynamic quantization), "onnx" or "onnx-int8" (see rerank_cascade)."""
+    from rerank_cascade import load_scorer
+    return load_scorer(path, precision)
+
+LOADERS = {
+    "generator": _load_generator,
+    "verifier": _load_verifier,
+    "embedder": _load_embedder,
+    "cross_encoder": _load_cross_encoder,
+    "reranker": _load_reranker,
+}
+
+def model_nbytes(obj):
+    """Bytes held by a model's parameters and buffers (tokenizers count as 0)."""
+    if isinstance(obj, (tuple, list)):
+        return sum(model_nbytes(o) for o in obj)
+    if hasattr(obj, "get_memory_footprint"):
+        return int(obj.get_memory_footprint())
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if hasattr(obj, "model"):  # CrossEncoder / CrossEncoderScorer wrap a HF model
+        return model_nbytes(obj.model)
+    return 0
+
+def _env_int(name):
+    v = os.environ.get(name)
+    return int(v) if v else None
+
+class ModelRegistry:
+    def __init__(self, max_models=None, memory_budget_mb=None):
+        self.max_models = max_models
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()  # key -> {"obj", "nbytes", "load_s"}
+        self._evicted = {}  # key -> {"refs": weakrefs to the object (or its tuple's parts), "tuple", "nbytes", "load_s"}
+        self._lock = threading.RLock()
+
+    def get(self, kind, path, precision="fp32"):
+        key = (kind, path, precision)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]["obj"]
+            obj = self._revive(key)
+            if obj is not None:
+                return obj
+            t0 = time.perf_counter()
+            obj = LOADERS[kind](path, precision)
+            self._models[key] = {"obj": obj, "nbytes": model_nbytes(obj), "load_s": time.perf_counter() - t0}
+            self._enforce_limits(keep=key)
+            return obj
+
+    def warmup(self, specs):
+        """specs: iterable of (kind, path) or (kind, path, precision)."""
+        for spec in specs:
+            self.get(*spec)
+
+    def memory_report(self):
+        """Registered models, then evicted ones still referenced elsewhere (their memory is not free)."""
+        with self._lock:
+            self._prune()
+            rows = [(k, v, False) for k, v in self._models.items()] + [(k, v, True) for k, v in self._evicted.items()]
+            return [{"kind": k[0], "path": k[1], "precision": k[2], "mb": v["nbytes"] / 2**20, "load_s": v["load_s"],
+                     "evicted": evicted} for k, v, evicted in rows]
+
+    def total_mb(self):
+        with self._lock:
+            self._prune()
+            return sum(v["nbytes"] for v in list(self._models.values()) + list(self._evicted.values())) / 2**20
+
+    def evict(self, kind, path, precision="fp32"):
+        with self._lock:
+            if self._drop((kind, path, precision)):
+                self._free()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._models):
+                self._drop(key)
+            self._free()
+
+    def _drop(self, key):
+        entry = self._models.pop(key, None)
+        if entry is None:
+            return False
+        parts = entry["obj"] if isinstance(entry["obj"], tuple) else (entry["obj"],)
+        try:
+            refs = [weakref.ref(o) for o in parts]
+        except TypeError:  # not weak-referenceable: cannot tell whether it is still in use
+            return True
+        self._evicted[key] = {"refs": refs, "tuple": isinstance(entry["obj"], tuple), "nbytes": entry["nbytes"],
+                              "load_s": entry["load_s"]}
+        return True
+
+    def _revive(self, key):
+        """An evicted model that is still alive elsewhere, re-registered instead of loaded again."""
+        entry = self._evicted.pop(key, None)
+        if entry is None:
+            return None
+        parts = [r() for r in entry["refs"]]
+        if any(p is None for p in parts):
+            return None
+        obj = tuple(parts) if entry["tuple"] else parts[0]
+        self._models[key] = {"obj": obj, "nbytes": entry["nbytes"], "load_s": entry["load_s"]}
+        self._enforce_limits(keep=key)
+        return obj
+
+    def _prune(self):
+        for key in [k for k, v in self._evicted.items() if any(r() is None for r in v["refs"])]:
+            del self._evicted[key]
+
+    def _enforce_limits(self, keep):
+        while len(self._models) > 1:
+            over_count = self.max_models is not None and len(self._models) > self.max_models
+            over_mem = self.memory_budget_mb is not None and self.total_mb() > self.memory_budget_mb
+            if not (over_count or over_mem):
+                break
+            self._drop(next(k for k in self._models if k != keep))
+            self._free()  # so total_mb sees whether the evicted model was actually released
+
+    def _free(self):
+        gc.collect()
+        self._prune()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+registry = ModelRegistry(max_models=_env_int("RAG_MAX_MODELS"), memory_budget_mb=_env_int("RAG_MODEL_BUDGET_MB"))
+
+def get_generator(path, precision="fp32"):
+    return registry.get("generator", path, precision)
+
+def get_verifier(path, precision="fp32"):
+    return registry.get("verifier", path, precision)
+
+def get_embedder(path, precision="fp32"):
+    return registry.get("embedder", path, precision)
+
+def get_cross_encoder(path, precision="fp32"):
+    return registry.get("cross_encoder", path, precision)
+
+def get_reranker(path, precision="fp32"):
+    return registry.get("reranker", path, precision)
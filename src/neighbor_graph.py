@@ -0,0 +1,143 @@
+# src/neighbor_graph.py
+"""
+Offline kNN graph over the indexed chunks, used by crf to find perturbation neighbours
+without embedding or searching at query time.
+
+indices/neighbors/ holds two arrays indexed by FAISS vector id (== meta store row):
+  ids.npy    int32 (n_rows, k) nearest other rows, best first, -1 padded
+  sims.npy   float16 (n_rows, k) their inner-product similarity
+Both are filled batch by batch through np.lib.format.open_memmap, so building never
+holds more than one batch of vectors, and are opened with mmap_mode="r" for lookups.
+Incremental index updates patch the graph (update_neighbor_graph) instead of searching
+every row again.
+"""
+import os
+import numpy as np
+
+NEIGHBORS_DIR = "./indices/neighbors"
+NEIGHBORS_K = 16
+SCAN_ROWS = 1 << 16  # rows of ids.npy checked per step for removed neighbours
+
+def _vectors(index, rows):
+    try:
+        return index.reconstruct_batch(np.asarray(rows, dtype="int64"))
+    except (AttributeError, RuntimeError):
+        return np.stack([index.reconstruct(int(r)) for r in rows])
+
+def _search_rows(index, rows, ids, sims, k, batch_size):
+    """Overwrite the neighbour lists of rows with a fresh search of their stored vectors."""
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        D, I = index.search(np.ascontiguousarray(_vectors(index, batch), dtype="float32"), k + 1)
+        for j, row in enumerate(batch):
+            keep = (I[j] != row) & (I[j] >= 0)
+            nb, sc = I[j][keep][:k], D[j][keep][:k]
+            ids[row] = -1
+            sims[row] = 0
+            ids[row, :len(nb)] = nb
+            sims[row, :len(nb)] = sc
+
+def build_neighbor_graph(index, store, k=NEIGHBORS_K, path=NEIGHBORS_DIR, batch_size=1024):
+    """Search every live row's stored vector against the index; needs an index that can reconstruct."""
+    os.makedirs(path, exist_ok=True)
+    n = len(store)
+    ids = np.lib.format.open_memmap(os.path.join(path, "ids.npy.tmp"), mode="w+", dtype=np.int32, shape=(n, k))
+    sims = np.lib.format.open_memmap(os.path.join(path, "sims.npy.tmp"), mode="w+", dtype=np.float16, shape=(n, k))
+    ids[:] = -1
+    sims[:] = 0
+    live = np.flatnonzero(np.asarray(store.alive))
+    _search_rows(index, live, ids, sims, k, batch_size)
+    ids.flush()
+    sims.flush()
+    del ids, sims
+    for name in ("ids.npy", "sims.npy"):
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+    print("Saved", k, "neighbours for", len(live), "chunks to", path)
+    return NeighborGraph(path)
+
+def _grow(path, n):
+    """Pad ids.npy / sims.npy to n rows (new rows empty); the old files are replaced, not resized."""
+    old_ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+    if len(old_ids) >= n:
+        return
+    old_sims = np.load(os.path.join(path, "sims.npy"), mmap_mode="r")
+    for name, old, fill in (("ids.npy", old_ids, -1), ("sims.npy", old_sims, 0)):
+        new = np.lib.format.open_memmap(os.path.join(path, name + ".tmp"), mode="w+", dtype=old.dtype,
+                                        shape=(n, old.shape[1]))
+        for start in range(0, len(old), SCAN_ROWS):
+            new[start:min(start + SCAN_ROWS, len(old))] = old[start:start + SCAN_ROWS]
+        new[len(old):] = fill
+        new.flush()
+        del new
+    del old_ids, old_sims
+    for name in ("ids.npy", "sims.npy"):
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+def _offer(ids, sims, row, nb, sim):
+    """Insert nb into row's best-first list if it beats the current last entry."""
+    cur = ids[row]
+    if nb in cur or (cur[-1] >= 0 and sim <= sims[row, -1]):
+        return
+    pos = int(np.flatnonzero((cur < 0) | (sims[row] < sim))[0])
+    ids[row, pos + 1:] = cur[pos:-1].copy()
+    sims[row, pos + 1:] = sims[row, pos:-1].copy()
+    ids[row, pos] = nb
+    sims[row, pos] = sim
+
+def update_neighbor_graph(index, store, removed, added, k=NEIGHBORS_K, path=NEIGHBORS_DIR, batch_size=1024):
+    """
+    Patch the graph after an incremental index update. Removed rows are cleared; added rows
+    and live rows that listed a removed row are searched again; every added row is offered
+    to the lists of its own neighbours (similarity is symmetric), so older rows pick up close
+    new chunks without a search. Builds the graph from scratch if there is none with k columns.
+    """
+    if not NeighborGraph.exists(path) or np.load(os.path.join(path, "ids.npy"), mmap_mode="r").shape[1] != k:
+        return build_neighbor_graph(index, store, k=k, path=path, batch_size=batch_size)
+    _grow(path, len(store))
+    ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r+")
+    sims = np.load(os.path.join(path, "sims.npy"), mmap_mode="r+")
+    alive = np.asarray(store.alive)
+    removed = np.unique(np.asarray(list(removed), dtype=np.int64))
+    removed = removed[(removed >= 0) & (removed < len(ids))]
+    ids[removed] = -1
+    sims[removed] = 0
+    stale = []
+    if len(removed):
+        for start in range(0, len(ids), SCAN_ROWS):
+            hit = np.isin(ids[start:start + SCAN_ROWS], removed).any(axis=1)
+            stale.append(start + np.flatnonzero(hit))
+    added = np.asarray(list(added), dtype=np.int64)
+    added = added[alive[added] == 1] if len(added) else added
+    rows = np.union1d(added, np.concatenate(stale) if stale else np.zeros(0, dtype=np.int64))
+    rows = rows[alive[rows] == 1]
+    _search_rows(index, rows, ids, sims, k, batch_size)
+    searched = set(rows.tolist())
+    for row in added.tolist():
+        for nb, sim in zip(ids[row].tolist(), sims[row].tolist()):
+            if nb >= 0 and nb not in searched:
+                _offer(ids, sims, nb, row, sim)
+    ids.flush()
+    sims.flush()
+    del ids, sims
+    print(f"Neighbour graph: {len(rows)} rows searched ({len(added)} added, {len(removed)} removed)")
+    return NeighborGraph(path)
+
+class NeighborGraph:
+    def __init__(self, path=NEIGHBORS_DIR):
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.sims = np.load(os.path.join(path, "sims.npy"), mmap_mode="r")
+
+    @staticmethod
+    def exists(path=NEIGHBORS_DIR):
+        return os.path.exists(os.path.join(path, "ids.npy"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def neighbors(self, row):
+        """(rows, sims) of a row's neighbours, best first; empty for rows outside the graph."""
+        if row is None or not 0 <= row < len(self.ids):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float16)
+        ids = self.ids[row]
+        keep = ids >= 0
+        return ids[keep], self.sims[row][keep]
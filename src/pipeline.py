@@ -0,0 +1,148 @@
+# src/pipeline.py
+"""
+Shared pipeline resources (embedder, FAISS index, chunk meta store, BM25 index, neighbour graph, table store,
+verifier), created lazily on first use instead of at import time. Build a PipelineContext to own them,
+pass it to retrieve / verifier_predict, and close() it to release them; functions
+called without a context use the process default from get_context().
+"""
+import threading
+from model_registry import registry as default_registry
+
+INDEX_FILE = "./indices/faiss_index.faiss"
+META_DIR = "./indices/meta"
+BM25_DIR = "./indices/bm25"
+NEIGHBORS_DIR = "./indices/neighbors"
+TABLE_DB = "./indices/tables.sqlite"
+EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"
+VERIFIER_PATH = "./models/verifier"
+
+class PipelineContext:
+    def __init__(self, index_file=INDEX_FILE, meta_dir=META_DIR, bm25_dir=BM25_DIR, emb_model=EMB_MODEL,
+                 verifier_path=VERIFIER_PATH, cross_encoder_path=None, registry=None, neighbors_dir=NEIGHBORS_DIR,
+                 table_db=TABLE_DB):
+        self.index_file = index_file
+        self.meta_dir = meta_dir
+        self.bm25_dir = bm25_dir
+        self.neighbors_dir = neighbors_dir
+        self.table_db = table_db
+        self.emb_model = emb_model
+        self.verifier_path = verifier_path
+        self.cross_encoder_path = cross_encoder_path
+        self.registry = registry or default_registry
+        self._index = None
+        self._index_params = None
+        self._meta = None
+        self._lexical = None
+        self._neighbors = None
+        self._tables = None
+        self._lock = threading.RLock()
+
+    @property
+    def embedder(self):
+        return self.registry.get("embedder", self.emb_model)
+
+    @property
+    def verifier(self):
+        """(tokenizer, model) for the NLI verifier."""
+        return self.registry.get("verifier", self.verifier_path)
+
+    @property
+    def cross_encoder(self):
+        if self.cross_encoder_path is None:
+            return None
+        return self.registry.get("cross_encoder", self.cross_encoder_path)
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                from ann_index import load_index
+                self._index, self._index_params = load_index(self.index_file)
+            return self._index
+
+    @property
+    def index_params(self):
+        """Build parameters stored next to the index (type, nprobe, ef_search, ...)."""
+        with self._lock:
+            self.index
+            return self._index_params
+
+    @property
+    def meta(self):
+        """MetaStore with doc_id / chunk_id / text / meta for each FAISS row."""
+        with self._lock:
+            if self._meta is None:
+                from meta_store import MetaStore
+                self._meta = MetaStore(self.meta_dir)
+            return self._meta
+
+    @property
+    def lexical(self):
+        """BM25 LexicalIndex, or None if embed_index_gpu has not built one."""
+        with self._lock:
+            if self._lexical is None:
+                from lexical_index import LexicalIndex
+                if LexicalIndex.exists(self.bm25_dir):
+                    self._lexical = LexicalIndex(self.bm25_dir)
+            return self._lexical
+
+    @property
+    def neighbors(self):
+        """kNN NeighborGraph over the indexed chunks, or None if embed_index_gpu has not built one."""
+        with self._lock:
+            if self._neighbors is None:
+                from neighbor_graph import NeighborGraph
+                if NeighborGraph.exists(self.neighbors_dir):
+                    self._neighbors = NeighborGraph(self.neighbors_dir)
+            return self._neighbors
+
+    @property
+    def tables(self):
+        """TableStore over the ingested tables (SQL probe), or None if table_store has not built one."""
+        with self._lock:
+            if self._tables is None:
+                from table_store import TableStore
+                if TableStore.exists(self.table_db):
+                    self._tables = TableStore(self.table_db)
+            return self._tables
+
+    def close(self, evict_models=False):
+        """
+        Drop the index, meta store, BM25, neighbour graph and table store. Models live in the
+        shared registry and may be in use by other contexts, so they are only evicted on request.
+        """
+        with self._lock:
+            self._index = None
+            self._index_params = None
+            self._meta = None
+            self._lexical = None
+            self._neighbors = None
+            if self._tables is not None:
+                self._tables.close()
+            self._tables = None
+        if evict_models:
+            self.registry.evict("embedder", self.emb_model)
+            self.registry.evict("verifier", self.verifier_path)
+            if self.cross_encoder_path is not None:
+                self.registry.evict("cross_encoder", self.cross_encoder_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_context():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = PipelineContext()
+        return _default
+
+def set_context(ctx):
+    global _default
+    with _default_lock:
+        _default = ctx
@@ -3,8 +3,9 @@
 Preprocess raw financial/legal documents:
 - Extracts text & tables from PDFs, DOCX, TXT, HTML
 - Cleans and normalizes text
-- Splits into chunks for embedding
-- Saves processed JSON files in data/processed/
+- Splits into token-bounded chunks for embedding (see chunker)
+- Saves processed JSON files in data/processed/ as {id, title, source, text, chunks, attrs}
+Files run in a process pool; unchanged files are skipped (see ingest_engine).
 """
 
 import os
@@ -13,16 +14,22 @@ import json
 import fitz  # PyMuPDF for PDF
 import docx
 from bs4 import BeautifulSoup
+from ingest_engine import run_parallel
+from chunker import chunk_document
+from doc_attrs import doc_attributes
 
 RAW_DATA_DIR = "data/raw/"
 PROCESSED_DATA_DIR = "data/processed/"
-CHUNK_SIZE = 500  # words per chunk
+MANIFEST = "data/preprocess_manifest.json"
 
 
 def clean_text(text: str) -> str:
-    """Clean and normalize extracted text."""
-    text = re.sub(r'\s+', ' ', text)  # collapse multiple spaces/newlines
+    """Clean and normalize extracted text; blank lines (paragraph breaks) are kept for the chunker."""
     text = re.sub(r'Page \d+ of \d+', '', text, flags=re.IGNORECASE)  # remove page numbers
+    text = re.sub(r'[^\S\n]+', ' ', text)  # collapse spaces/tabs
+    text = re.sub(r' ?\n ?', '\n', text)
+    text = re.sub(r'\n{2,}', '\n\n', text)  # paragraph breaks
+    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)  # line wraps inside a paragraph
     text = text.strip()
     return text
 
@@ -32,7 +39,7 @@ def extract_from_pdf(filepath: str) -> str:
     doc = fitz.open(filepath)
     text = ""
     for page in doc:
-        text += page.get_text("text") + "\n"
+        text += page.get_text("text") + "\n\n"
     return clean_text(text)
 
 
@@ -58,55 +65,60 @@ def extract_from_html(filepath: str) -> str:
     return clean_text(text)
 
 
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE):
-    """Split text into chunks of ~chunk_size words."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
-
-
-def preprocess_documents():
-    """Main function to preprocess all raw docs."""
+EXTRACTORS = {
+    ".pdf": extract_from_pdf,
+    ".docx": extract_from_docx,
+    ".txt": extract_from_txt,
+    ".html": extract_from_html,
+    ".htm": extract_from_html,
+}
+
+
+def preprocess_file(fpath: str) -> dict:
+    """Worker: extract, clean and chunk one file. Returns {"out", "pages"}."""
+    fname = os.path.basename(fpath)
+    ext = os.path.splitext(fname)[1].lower()
+    text = EXTRACTORS[ext](fpath)
+    doc_id = os.path.splitext(fname)[0]
+    chunks = chunk_document(doc_id, text)
+
+    # Save each file’s processed chunks into a JSON
+    out_file = os.path.join(PROCESSED_DATA_DIR, f"{doc_id}.json")
+    with open(out_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"id": doc_id, "title": doc_id, "source": fpath, "text": text, "chunks": chunks,
+                   "attrs": doc_attributes(doc_id, text)}, f, indent=2)
+    os.replace(out_file + ".tmp", out_file)
+    pages = 0
+    if ext == ".pdf":
+        with fitz.open(fpath) as doc:
+            pages = len(doc)
+    return {"out": out_file, "pages": pages}
+
+
+def preprocess_documents(workers=None, force=False):
+    """Main function to preprocess all raw docs (in parallel, skipping unchanged files)."""
     os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
-    processed = []
-
-    for fname in os.listdir(RAW_DATA_DIR):
+    files = []
+    for fname in sorted(os.listdir(RAW_DATA_DIR)):
         fpath = os.path.join(RAW_DATA_DIR, fname)
         if not os.path.isfile(fpath):
             continue
+        if os.path.splitext(fname)[1].lower() not in EXTRACTORS:
+            print(f"Skipping unsupported file: {fname}")
+            continue
+        files.append(fpath)
 
-        try:
-            if fname.lower().endswith(".pdf"):
-                text = extract_from_pdf(fpath)
-            elif fname.lower().endswith(".docx"):
-                text = extract_from_docx(fpath)
-            elif fname.lower().endswith(".txt"):
-                text = extract_from_txt(fpath)
-            elif fname.lower().endswith(".html") or fname.lower().endswith(".htm"):
-                text = extract_from_html(fpath)
-            else:
-                print(f"Skipping unsupported file: {fname}")
-                continue
-
-            chunks = chunk_text(text)
-
-            # Save each file’s processed chunks into a JSON
-            out_file = os.path.join(PROCESSED_DATA_DIR, f"{os.path.splitext(fname)[0]}.json")
-            with open(out_file, "w", encoding="utf-8") as f:
-                json.dump({"filename": fname, "chunks": chunks}, f, indent=2)
-
-            processed.append(out_file)
-            print(f"Processed {fname} -> {out_file}")
-
-        except Exception as e:
-            print(f"Error processing {fname}: {e}")
-
-    return processed
+    stats = run_parallel(files, preprocess_file, MANIFEST, workers=workers, force=force)
+    print(f"Processed {stats['done']} files in {stats['seconds']:.1f}s, "
+          f"skipped {stats['skipped']} unchanged, {stats['failed']} failed")
+    return stats
 
 
 if __name__ == "__main__":
-    processed_files = preprocess_documents()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="reprocess files even if unchanged")
+    args = parser.parse_args()
+    preprocess_documents(workers=args.workers, force=args.force)
     print("\nPreprocessing complete. Processed files saved in:", PROCESSED_DATA_DIR)
@@ -0,0 +1,260 @@
+# src/rerank_cascade.py
+"""
+Cascaded reranking for CPU hosts. Instead of running the cross-encoder over all TOP_K
+first-stage candidates:
+  1. cheap stage   the first stage's fused dense + BM25 order (hybrid_rerank_batch without a
+                   cross-encoder) keeps the best prune_n candidates
+  2. cross-encoder the fine-tuned models/reranker (LoRA adapters from reranker_finetune are
+                   merged) scores the survivors in cheap-rank order, first topn of them, then
+                   chunk more per round; a query exits early once a round adds nothing to its
+                   top-n and the round's best combined score trails the n-th by more than margin
+Every query of a batch advances in lockstep, so each round is one batched predict call.
+Scored candidates rank by the same 0.5 * dense + 0.5 * cross score as the single-stage path,
+ahead of any survivors left unscored.
+
+The cross-encoder can run as "fp32", "int8" (torch dynamic quantization), "onnx" (ONNX
+Runtime export, kept under models/reranker/onnx) or "onnx-int8" (that export dynamically
+quantized to int8); the default is int8 on CPU (RAG_RERANK_PRECISION overrides) and fp32
+on CUDA. Quantized scores are checked against fp32 with quantization_report; from the
+repo root: python src/rerank_cascade.py --precision onnx-int8 [--queries data/qa.jsonl]
+"""
+import os
+import numpy as np
+from model_registry import get_reranker
+from retriever_gpu import RERANK_K, hybrid_rerank_batch
+from tracing import span, traced
+from utils import length_batches
+
+RERANKER_PATH = "./models/reranker"
+PRUNE_N = 16
+CHUNK = 4
+EXIT_MARGIN = 0.1       # in combined-score units (cross scores are sigmoid probabilities)
+CE_BATCH = 16
+CE_BATCH_TOKENS = 4096  # padded tokens per forward pass
+MAX_LENGTH = 256
+PRECISIONS = ("fp32", "int8", "onnx", "onnx-int8")
+MAX_MEAN_ABS_DIFF = 0.02  # quantized vs fp32 score tolerance
+MIN_TOPK_OVERLAP = 0.9
+CHECK_QUERIES = [  # default queries for the quantization check
+    "What is the extended due date for filing GSTR-3B?",
+    "Which districts are covered by the notification?",
+    "What is the rate of tax notified in the circular?",
+    "Who issued the notification and under which section?",
+]
+
+def reranker_precision():
+    import torch
+    if torch.cuda.is_available():
+        return "fp32"
+    return os.environ.get("RAG_RERANK_PRECISION", "int8")
+
+# models -------------------------------------------------------------------------------
+
+class CrossEncoderScorer:
+    """(query, passage) pairs -> relevance in [0, 1], the sigmoid of the logit as CrossEncoder.predict returns it."""
+    def __init__(self, tokenizer, model, device=None, max_length=MAX_LENGTH):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.max_length = max_length
+
+    def predict(self, pairs, batch_size=CE_BATCH, max_tokens=CE_BATCH_TOKENS):
+        import torch
+        out = np.zeros(len(pairs), dtype="float32")
+        if not pairs:
+            return out
+        enc = self.tokenizer([q for q, _ in pairs], [p for _, p in pairs], truncation=True, max_length=self.max_length)
+        with torch.inference_mode():
+            for batch in length_batches([len(ids) for ids in enc["input_ids"]], batch_size, max_tokens):
+                inputs = self.tokenizer.pad([{k: enc[k][i] for k in enc.keys()} for i in batch], return_tensors="pt")
+                if self.device is not None:
+                    inputs = inputs.to(self.device)
+                logits = self.model(**inputs).logits.float()
+                probs = torch.sigmoid(logits[:, 0]) if logits.shape[-1] == 1 else torch.softmax(logits, -1)[:, -1]
+                out[batch] = probs.cpu().numpy()
+        return out
+
+def _is_adapter(path):
+    return os.path.exists(os.path.join(path, "adapter_config.json"))
+
+def _merged_model(path):
+    from transformers import AutoModelForSequenceClassification
+    if _is_adapter(path):
+        from peft import AutoPeftModelForSequenceClassification
+        return AutoPeftModelForSequenceClassification.from_pretrained(path).merge_and_unload()
+    return AutoModelForSequenceClassification.from_pretrained(path)
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    try:
+        with open("/proc/cpuinfo") as f:
+            vnni = "avx512_vnni" in f.read()
+    except OSError:
+        vnni = False
+    make = AutoQuantizationConfig.avx512_vnni if vnni else AutoQuantizationConfig.avx2
+    return make(is_static=False, per_channel=False)
+
+def export_onnx(path=RERANKER_PATH, quantize=False):
+    """ONNX Runtime export of the (merged) reranker at <path>/onnx, or its int8 version at <path>/onnx-int8; reused when present."""
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    out = os.path.join(path, "onnx")
+    if not os.path.exists(os.path.join(out, "model.onnx")):
+        src = path
+        if _is_adapter(path):
+            src = os.path.join(path, "merged")
+            _merged_model(path).save_pretrained(src)
+            tokenizer.save_pretrained(src)
+        ORTModelForSequenceClassification.from_pretrained(src, export=True).save_pretrained(out)
+        tokenizer.save_pretrained(out)
+    if not quantize:
+        return out
+    qout = out + "-int8"
+    if not os.path.exists(os.path.join(qout, "model_quantized.onnx")):
+        ORTQuantizer.from_pretrained(out).quantize(save_dir=qout, quantization_config=_quantization_config())
+        tokenizer.save_pretrained(qout)
+    return qout
+
+def load_scorer(path=RERANKER_PATH, precision="fp32"):
+    """A CrossEncoderScorer for the reranker at path in one of PRECISIONS (model_registry kind "reranker")."""
+    from transformers import AutoTokenizer
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown reranker precision {precision!r}, expected one of {PRECISIONS}")
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    if precision in ("onnx", "onnx-int8"):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        out = export_onnx(path, quantize=precision == "onnx-int8")
+        file_name = "model_quantized.onnx" if precision == "onnx-int8" else "model.onnx"
+        return CrossEncoderScorer(tokenizer, ORTModelForSequenceClassification.from_pretrained(out, file_name=file_name))
+    import torch
+    model = _merged_model(path).eval()
+    if precision == "int8":
+        return CrossEncoderScorer(tokenizer, torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8))
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return CrossEncoderScorer(tokenizer, model.to(device), device=device)
+
+# cascade ------------------------------------------------------------------------------
+
+def _combine(c, cross):
+    c["cross_score"] = float(cross)
+    c["combined"] = 0.5 * c.get("score", 0) + 0.5 * c["cross_score"]
+
+class RerankCascade:
+    """
+    Pass as cross_encoder to retrieve / retrieve_batch / hybrid_rerank_batch. early_exit=False
+    scores all prune_n survivors in one call; prune_n=None skips the cheap stage. The reranker
+    is fetched from the model registry per call (loaded up front), so an eviction frees it.
+    """
+    def __init__(self, path=RERANKER_PATH, precision=None, prune_n=PRUNE_N, chunk=CHUNK, margin=EXIT_MARGIN,
+                 early_exit=True, batch_size=CE_BATCH, weight_sem=0.6, weight_lex=0.4, scorer=None):
+        self.path = path
+        self.precision = precision
+        self._scorer = scorer  # an explicit scorer (tests, benchmarks) is kept as given
+        if scorer is None:
+            self.precision = precision or reranker_precision()
+            get_reranker(self.path, self.precision)
+        self.prune_n = prune_n
+        self.chunk = chunk
+        self.margin = margin
+        self.early_exit = early_exit
+        self.batch_size = batch_size
+        self.weight_sem = weight_sem
+        self.weight_lex = weight_lex
+        self.pairs = 0   # cross-encoder pairs scored
+        self.exits = 0   # queries that stopped before scoring every survivor
+
+    @property
+    def scorer(self):
+        return self._scorer or get_reranker(self.path, self.precision)
+
+    @traced("retrieve.cascade", batch=1)
+    def rerank_batch(self, queries, candidate_lists, topn=RERANK_K, ctx=None):
+        if self.prune_n is None:
+            pruned = [list(cands) for cands in candidate_lists]
+        else:
+            pruned = hybrid_rerank_batch(queries, candidate_lists, topn=self.prune_n, weight_sem=self.weight_sem,
+                                         weight_lex=self.weight_lex, ctx=ctx)
+        scored = [[] for _ in queries]
+        pos = [0] * len(queries)
+        active = [i for i, cands in enumerate(pruned) if cands]
+        size = max(topn, self.chunk) if self.early_exit else None
+        scorer = self.scorer
+        while active:
+            take = {i: pruned[i][pos[i]:pos[i] + size if size else None] for i in active}
+            pairs = [(queries[i], c.get("meta", {}).get("text", "")) for i in active for c in take[i]]
+            with span("retrieve.cross_encoder", batch=len(pairs)):
+                scores = iter(scorer.predict(pairs, batch_size=self.batch_size))
+            self.pairs += len(pairs)
+            still = []
+            for i in active:
+                for c in take[i]:
+                    _combine(c, next(scores))
+                pos[i] += len(take[i])
+                scored[i] += take[i]
+                if pos[i] >= len(pruned[i]):
+                    continue
+                ranked = sorted((c["combined"] for c in scored[i]), reverse=True)
+                if len(ranked) > topn and len(scored[i]) > len(take[i]):
+                    kth = ranked[topn - 1]
+                    if max(c["combined"] for c in take[i]) < kth - self.margin:
+                        self.exits += 1
+                        continue
+                still.append(i)
+            active = still
+            size = self.chunk
+        out = []
+        for i, cands in enumerate(pruned):
+            rest = cands[pos[i]:]
+            out.append((sorted(scored[i], key=lambda c: c["combined"], reverse=True) + rest)[:topn])
+        return out
+
+    def rerank(self, query, candidates, topn=RERANK_K, ctx=None):
+        return self.rerank_batch([query], [candidates], topn=topn, ctx=ctx)[0]
+
+# quantization check -------------------------------------------------------------------
+
+def _ranks(x):
+    r = np.empty(len(x))
+    r[np.argsort(x, kind="stable")] = np.arange(len(x))
+    return r
+
+def quantization_report(queries, candidate_lists, precision, path=RERANKER_PATH, k=RERANK_K, reference="fp32"):
+    """
+    Scores of the precision build vs the reference build on the same (query, candidate) pairs:
+    mean / max absolute difference, mean per-query Spearman correlation and top-k overlap.
+    """
+    ref, quant = get_reranker(path, reference), get_reranker(path, precision)
+    diffs, rhos, overlaps = [], [], []
+    for q, cands in zip(queries, candidate_lists):
+        pairs = [(q, c.get("meta", {}).get("text", "")) for c in cands]
+        if not pairs:
+            continue
+        a, b = ref.predict(pairs), quant.predict(pairs)
+        diffs.append(np.abs(a - b))
+        if len(pairs) > 1:
+            rhos.append(float(np.corrcoef(_ranks(a), _ranks(b))[0, 1]))
+        top = min(k, len(pairs))
+        overlaps.append(len(set(np.argsort(-a)[:top]) & set(np.argsort(-b)[:top])) / top)
+    d = np.concatenate(diffs) if diffs else np.zeros(1)
+    report = {"precision": precision, "pairs": int(sum(len(x) for x in diffs)), "mean_abs_diff": float(d.mean()),
+              "max_abs_diff": float(d.max()), "spearman": float(np.mean(rhos)) if rhos else 1.0,
+              "topk_overlap": float(np.mean(overlaps)) if overlaps else 1.0}
+    report["ok"] = report["mean_abs_diff"] <= MAX_MEAN_ABS_DIFF and report["topk_overlap"] >= MIN_TOPK_OVERLAP
+    return report
+
+if __name__ == "__main__":
+    import argparse, json, sys
+    from retriever_gpu import candidates_batch
+    parser = argparse.ArgumentParser(description="build the reranker export and check it against fp32")
+    parser.add_argument("--path", default=RERANKER_PATH)
+    parser.add_argument("--precision", default="int8", choices=PRECISIONS[1:])
+    parser.add_argument("--queries", help="JSONL with a question per line (default: CHECK_QUERIES)")
+    args = parser.parse_args()
+    queries = CHECK_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [json.loads(line)["question"] for line in f if line.strip()]
+    report = quantization_report(queries, candidates_batch(queries), args.precision, path=args.path)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
@@ -1,63 +1,243 @@
 # src/retriever_gpu.py
-import faiss, json, numpy as np, torch
-from sentence_transformers import SentenceTransformer
-from pathlib import Path
-from utils import load_json
-from fuzzywuzzy import fuzz
-
-INDEX_FILE = "./indices/faiss_index.faiss"
-MAPPING_FILE = "./indices/vectors_meta.json"
-EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"
+"""
+Dense, BM25 and hybrid first-stage retrieval plus reranking. Searches accept filters on
+document attributes (doc_attrs: issuer, doc_type, number, date, fiscal_year, doc_id), one
+dict for all queries or one per query. Filters select rows from the meta store before the
+ANN search: small selections are scored exactly from their stored vectors, larger ones
+are searched through a FAISS IDSelector, and BM25 only scores selected rows.
+"""
+import numpy as np
+from pipeline import get_context
+from tracing import span, traced
+
 TOP_K = 40
 RERANK_K = 8
+RRF_K = 60
+FILTER_EXACT_ROWS = 4096  # filtered selections up to this size are scored exactly instead of through the index
+
+def _hit(store, idx, score):
+    row = store.get(idx)
+    if row is None:
+        return None
+    # chunk text is also exposed as meta.text, which the reranker and build_prompt read
+    return {"row": idx, "score": float(score), "doc_id": row["doc_id"], "chunk_id": row["chunk_id"],
+            "text": row["text"], "meta": {**row["meta"], "text": row["text"]}}
 
-embedder = SentenceTransformer(EMB_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
-index = faiss.read_index(INDEX_FILE)
-mapping = load_json(MAPPING_FILE)
+def hits_for_rows(rows, scores, ctx=None):
+    """Hit dicts (as returned by the searches) for known rows; dead rows are skipped."""
+    ctx = ctx or get_context()
+    hits = (_hit(ctx.meta, int(r), s) for r, s in zip(rows, scores))
+    return [h for h in hits if h is not None]
 
-def dense_search(query, k=TOP_K):
-    q_emb = embedder.encode([query], convert_to_numpy=True)
+@traced("retrieve.encode", batch=0)
+def _encode(queries, ctx):
+    import faiss
+    from embedding_cache import cached_encode
+    # misses are buffered in memory so an uncached query does not write to disk
+    q_emb = cached_encode(ctx.emb_model, ctx.embedder, queries, buffer=True)
     faiss.normalize_L2(q_emb)
-    D, I = index.search(q_emb, k)
-    ids = I[0].tolist()
-    scores = D[0].tolist()
+    return q_emb
+
+def row_vectors(ctx, rows):
+    """Stored (normalized) vectors of indexed rows, or None if the index cannot reconstruct them."""
+    try:
+        return np.asarray(ctx.index.reconstruct_batch(np.asarray(rows, dtype="int64")), dtype="float32")
+    except (AttributeError, RuntimeError, ValueError):
+        pass
+    try:
+        return np.stack([ctx.index.reconstruct(int(r)) for r in rows]).astype("float32")
+    except (RuntimeError, ValueError):
+        return None
+
+def _filter_groups(filters, n, ctx):
+    """[(query positions, allowed rows or None)] for one filters dict or a list of n (one per query)."""
+    per_query = list(filters) if isinstance(filters, (list, tuple)) else [filters] * n
+    groups = {}
+    for i, f in enumerate(per_query):
+        groups.setdefault(repr(sorted(f.items())) if f else "", (f, []))[1].append(i)
+    return [(pos, ctx.meta.rows_matching(f) if f else None) for f, pos in groups.values()]
+
+def _search_rows(ctx, q_emb, k, rows, nprobe=None, ef_search=None):
+    """(D, I) for q_emb, only over rows if given; missing results are -1."""
+    from ann_index import search_params
+    if rows is None:
+        return ctx.index.search(q_emb, k, params=search_params(ctx.index_params, nprobe, ef_search))
+    D = np.full((len(q_emb), k), -np.inf, dtype="float32")
+    I = np.full((len(q_emb), k), -1, dtype="int64")
+    if not len(rows):
+        return D, I
+    vecs = row_vectors(ctx, rows) if len(rows) <= FILTER_EXACT_ROWS else None
+    if vecs is not None:
+        S = q_emb @ vecs.T
+        top = np.argsort(-S, axis=1, kind="stable")[:, :k]
+        D[:, :top.shape[1]] = np.take_along_axis(S, top, axis=1)
+        I[:, :top.shape[1]] = rows[top]
+        return D, I
+    import faiss
+    sel = faiss.IDSelectorBatch(rows)  # kept referenced until the search returns
+    return ctx.index.search(q_emb, k, params=search_params(ctx.index_params, nprobe, ef_search, sel=sel))
+
+@traced("retrieve.ann", batch=1)
+def _dense_groups(groups, q_emb, k, ctx, nprobe=None, ef_search=None):
+    store = ctx.meta
+    results = [None] * len(q_emb)
+    for pos, rows in groups:
+        D, I = _search_rows(ctx, q_emb[pos], k, rows, nprobe, ef_search)
+        for i, ids, scores in zip(pos, I.tolist(), D.tolist()):
+            hits = (_hit(store, idx, score) for idx, score in zip(ids, scores))
+            results[i] = [h for h in hits if h is not None]
+    return results
+
+@traced("retrieve.dense", batch=0)
+def dense_search_batch(queries, k=TOP_K, ctx=None, nprobe=None, ef_search=None, q_emb=None, filters=None):
+    """
+    One embedder batch and one FAISS search over the whole query matrix (one per distinct filter);
+    returns a hit list per query. nprobe / ef_search override the IVF / HNSW defaults stored with the index.
+    """
+    ctx = ctx or get_context()
+    if not queries:
+        return []
+    if q_emb is None:
+        q_emb = _encode(queries, ctx)
+    return _dense_groups(_filter_groups(filters, len(queries), ctx), q_emb, k, ctx, nprobe, ef_search)
+
+def dense_search(query, k=TOP_K, ctx=None, nprobe=None, ef_search=None, q_emb=None, filters=None):
+    return dense_search_batch([query], k=k, ctx=ctx, nprobe=nprobe, ef_search=ef_search, q_emb=q_emb, filters=filters)[0]
+
+@traced("retrieve.bm25")
+def lexical_search(query, k=TOP_K, ctx=None, filters=None, rows=None):
+    """BM25 top-k; "score" is the BM25 score. rows (or filters) restrict the rows scored."""
+    ctx = ctx or get_context()
+    if rows is None and filters:
+        rows = ctx.meta.rows_matching(filters)
+    rows, scores = ctx.lexical.search(query, k, rows=rows)
     hits = []
-    for idx, score in zip(ids, scores):
-        meta = mapping.get(str(idx)) or mapping.get(idx)
-        if meta is None:
-            continue
-        # attempt to fetch text from processed JSONs (expensive). For speed, store a small text excerpt in mapping.meta earlier.
-        hits.append({"row": idx, "score": float(score), "doc_id": meta["doc_id"], "chunk_id": meta["chunk_id"], "meta": meta.get("meta", {})})
+    for idx, score in zip(rows.tolist(), scores.tolist()):
+        h = _hit(ctx.meta, idx, score)
+        if h is not None:
+            h["bm25"] = h["score"]
+            hits.append(h)
     return hits
 
+def _dense_scores(ctx, q_vec, rows):
+    # cosine of lexical-only hits, from the stored vectors; 0 if the index cannot reconstruct
+    vecs = row_vectors(ctx, rows) if len(rows) else None
+    return [0.0] * len(rows) if vecs is None else (vecs @ q_vec).tolist()
+
+def _fuse(query, dense, lex, q_vec, ctx, fusion, weight_sem, weight_lex, rrf_k):
+    hits = {h["row"]: h for h in dense}
+    for h, s in zip(dense, ctx.lexical.score_rows(query, [h["row"] for h in dense]).tolist()):
+        h["bm25"] = s
+    lex_only = [h for h in lex if h["row"] not in hits]
+    for h, s in zip(lex_only, _dense_scores(ctx, q_vec, [h["row"] for h in lex_only])):
+        h["score"] = s
+        hits[h["row"]] = h
+    if fusion == "rrf":
+        rank_d = {h["row"]: r for r, h in enumerate(dense)}
+        rank_l = {h["row"]: r for r, h in enumerate(lex)}
+        for row, h in hits.items():
+            h["fused"] = sum(1.0 / (rrf_k + ranks[row] + 1) for ranks in (rank_d, rank_l) if row in ranks)
+    else:
+        top = max([h["bm25"] for h in hits.values()] + [1e-9])
+        for h in hits.values():
+            h["fused"] = weight_sem * h["score"] + weight_lex * h["bm25"] / top
+    return sorted(hits.values(), key=lambda h: h["fused"], reverse=True)
+
+@traced("retrieve.hybrid", batch=0)
+def hybrid_search_batch(queries, k=TOP_K, ctx=None, fusion="rrf", weight_sem=0.6, weight_lex=0.4, rrf_k=RRF_K,
+                        filters=None):
+    """
+    Union of the dense top-k and the BM25 top-k, fused by reciprocal-rank fusion
+    (fusion="rrf") or by weight_sem*cosine + weight_lex*normalized BM25 (fusion="weighted").
+    Every hit carries "score" (cosine), "bm25" and "fused", best fused first.
+    """
+    ctx = ctx or get_context()
+    if not queries:
+        return []
+    q_emb = _encode(queries, ctx)
+    groups = _filter_groups(filters, len(queries), ctx)
+    dense = _dense_groups(groups, q_emb, k, ctx)
+    rows = [None] * len(queries)
+    for pos, allowed in groups:
+        for i in pos:
+            rows[i] = allowed
+    return [_fuse(q, d, lexical_search(q, k=k, ctx=ctx, rows=r), q_vec, ctx, fusion, weight_sem, weight_lex, rrf_k)
+            for q, d, r, q_vec in zip(queries, dense, rows, q_emb)]
+
+def hybrid_search(query, k=TOP_K, ctx=None, fusion="rrf", weight_sem=0.6, weight_lex=0.4, rrf_k=RRF_K, filters=None):
+    return hybrid_search_batch([query], k=k, ctx=ctx, fusion=fusion, weight_sem=weight_sem, weight_lex=weight_lex, rrf_k=rrf_k,
+                               filters=filters)[0]
+
 def lexical_score(query, text):
     if not text:
         return 0.0
+    from fuzzywuzzy import fuzz  # only the fallback when no BM25 index was built
     return fuzz.partial_ratio(query.lower(), text.lower())/100.0
 
-def hybrid_rerank(query, candidates, cross_encoder=None, topn=RERANK_K, weight_sem=0.6, weight_lex=0.4):
-    # If cross_encoder provided (a CrossEncoder object), use it; otherwise combine sem+lex
+@traced("retrieve.rerank", batch=0)
+def hybrid_rerank_batch(queries, candidate_lists, cross_encoder=None, topn=RERANK_K, weight_sem=0.6, weight_lex=0.4,
+                        ctx=None, batch_size=64):
+    """
+    Rerank every query's candidates; cross-encoder pairs of all queries go through one predict call.
+    Without a cross-encoder, candidates from hybrid_search keep their "fused" order; others
+    rank by weight_sem * cosine + weight_lex * lexical score.
+    """
+    if hasattr(cross_encoder, "rerank_batch"):
+        # a rerank_cascade.RerankCascade prunes and scores in stages itself
+        return cross_encoder.rerank_batch(queries, candidate_lists, topn=topn, ctx=ctx)
     if cross_encoder is not None:
-        pairs = [(query, c.get("meta", {}).get("text", "")) for c in candidates]
-        scores = cross_encoder.predict(pairs, batch_size=16)
-        for c,s in zip(candidates, scores):
-            c["cross_score"] = float(s)
-            c["combined"] = 0.5*c.get("score",0) + 0.5*c["cross_score"]
+        pairs = [(q, c.get("meta", {}).get("text", "")) for q, cands in zip(queries, candidate_lists) for c in cands]
+        with span("retrieve.cross_encoder", batch=len(pairs)):
+            scores = cross_encoder.predict(pairs, batch_size=batch_size) if pairs else []
+        it = iter(scores)
+        for cands in candidate_lists:
+            for c in cands:
+                c["cross_score"] = float(next(it))
+                c["combined"] = 0.5*c.get("score",0) + 0.5*c["cross_score"]
     else:
-        for c in candidates:
-            sem = c.get("score", 0)
-            text = c.get("meta", {}).get("text", "") or ""
-            lex = lexical_score(query, text)
-            c["lex"] = lex
-            c["combined"] = weight_sem*sem + weight_lex*lex
-    ranked = sorted(candidates, key=lambda x: x["combined"], reverse=True)
-    return ranked[:topn]
-
-def retrieve(query, cross_encoder=None):
-    den = dense_search(query)
-    # For speed, ensure mapping.meta contains small 'text' field (modify embed_index_gpu to store snippet)
-    reranked = hybrid_rerank(query, den, cross_encoder=cross_encoder)
-    return reranked
+        ctx = ctx or get_context()
+        for q, cands in zip(queries, candidate_lists):
+            if cands and all("fused" in c for c in cands):
+                # the first stage already fused dense and BM25 ranks; re-scoring would discard that
+                for c in cands:
+                    c["combined"] = c["fused"]
+                continue
+            if ctx.lexical is not None:
+                # vectorized BM25, normalized to [0, 1] within the candidate set
+                bm25 = np.array([c.get("bm25", np.nan) for c in cands], dtype=float)
+                missing = np.isnan(bm25)
+                if missing.any():
+                    bm25[missing] = ctx.lexical.score_rows(q, [c["row"] for c, m in zip(cands, missing) if m])
+                lex = (bm25 / max(bm25.max(initial=0.0), 1e-9)).tolist()
+            else:
+                lex = [lexical_score(q, c.get("meta", {}).get("text", "") or "") for c in cands]
+            for c, l in zip(cands, lex):
+                c["lex"] = l
+                c["combined"] = weight_sem*c.get("score", 0) + weight_lex*l
+    return [sorted(cands, key=lambda x: x["combined"], reverse=True)[:topn] for cands in candidate_lists]
+
+def hybrid_rerank(query, candidates, cross_encoder=None, topn=RERANK_K, weight_sem=0.6, weight_lex=0.4, ctx=None):
+    # If cross_encoder provided (a CrossEncoder object), use it; otherwise combine sem+lex
+    return hybrid_rerank_batch([query], [candidates], cross_encoder=cross_encoder, topn=topn, weight_sem=weight_sem,
+                               weight_lex=weight_lex, ctx=ctx, batch_size=16)[0]
+
+@traced("retrieve.search", batch=0)
+def candidates_batch(queries, ctx=None, filters=None):
+    """First-stage candidates (before reranking) for each query."""
+    ctx = ctx or get_context()
+    # dense + BM25 union when embed_index_gpu built the lexical index, dense only otherwise
+    if ctx.lexical is not None:
+        return hybrid_search_batch(queries, ctx=ctx, filters=filters)
+    return dense_search_batch(queries, ctx=ctx, filters=filters)
+
+@traced("retrieve", batch=0)
+def retrieve_batch(queries, cross_encoder=None, ctx=None, filters=None):
+    ctx = ctx or get_context()
+    return hybrid_rerank_batch(queries, candidates_batch(queries, ctx=ctx, filters=filters), cross_encoder=cross_encoder,
+                               ctx=ctx)
+
+def retrieve(query, cross_encoder=None, ctx=None, filters=None):
+    return retrieve_batch([query], cross_encoder=cross_encoder, ctx=ctx, filters=filters)[0]
 
 if __name__ == "__main__":
     print(retrieve("What was Apple's net income in FY2023?"))
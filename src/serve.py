@@ -0,0 +1,305 @@
+# src/serve.py
+"""
+asyncio service core for the RAG pipeline. Requests are queued per stage and
+micro-batched: each stage waits at most max_wait_ms for up to max_batch requests, then
+runs the batch on its own single-thread executor, so the embedder (search), cross-encoder
+(rerank), generator and verifier each see batched calls while the event loop stays free.
+Verifier calls made by MES for different requests are coalesced in the same way.
+
+Backpressure: stage queues are bounded (max_queue) and at most max_inflight requests are
+admitted; a request that cannot get in or finish before its deadline gets a
+"deadline exceeded" error event instead of occupying the models. RAGService.ask streams
+events as they become available: evidence, then the answer, then one verification per claim.
+With tracing enabled (--trace / --metrics_port, see tracing), every stage batch is a
+serve.<stage> span, batch sizes and expired requests are counted per stage and every request
+is recorded as serve.request; --profile sample writes one collapsed-stack profile per request.
+Try it from the repo root: echo "What is the due date for GSTR-3B?" | python src/serve.py
+"""
+import asyncio, concurrent.futures, itertools, json, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import tracing
+
+MAX_BATCH = 8
+VERIFY_MAX_BATCH = 64  # verifier pairs are small; MES sends several per claim
+MAX_WAIT_MS = 10
+MAX_QUEUE = 256
+MAX_INFLIGHT = 64
+TIMEOUT_S = 30.0
+EVIDENCE_K = 4
+MES_THREADS = 16
+MES_GRACE_S = 1.0  # how long past the deadline a MES thread waits for the loop before giving up
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class MicroBatcher:
+    """Collects submitted items into batches and runs fn(items) -> results on a dedicated thread."""
+    def __init__(self, name, fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"rag-{name}")
+        self.batches = 0
+        self.items = 0
+        self.expired = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, item, deadline):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        try:
+            await asyncio.wait_for(self.queue.put((item, fut, deadline)), deadline - loop.time())
+            return await asyncio.wait_for(asyncio.shield(fut), deadline - loop.time())
+        except asyncio.TimeoutError:
+            fut.cancel()
+            raise DeadlineExceeded(self.name) from None
+
+    async def submit_many(self, items, deadline):
+        return await asyncio.gather(*(self.submit(x, deadline) for x in items))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            end = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                if loop.time() >= end:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), end - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            now = loop.time()
+            live = []
+            for item, fut, deadline in batch:
+                if fut.done():
+                    continue
+                if deadline <= now:
+                    self.expired += 1
+                    tracing.inc("deadline_expired_total", stage=self.name)
+                    fut.set_exception(DeadlineExceeded(self.name))
+                else:
+                    live.append((item, fut))
+            if not live:
+                continue
+            self.batches += 1
+            self.items += len(live)
+            tracing.observe("batch_size", len(live), tracing.BATCH_BUCKETS, stage=self.name)
+            try:
+                results = await loop.run_in_executor(self.executor, self._call, [item for item, _ in live])
+            except Exception as e:
+                for _, fut in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(live, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+    def _call(self, items):
+        with tracing.span(f"serve.{self.name}", batch=len(items)):
+            return self.fn(items)
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items, "expired": self.expired,
+                "mean_batch": self.items / self.batches if self.batches else 0.0}
+
+def default_stage_fns(ctx=None, cross_encoder=None):
+    """Batch functions for the real models: search, rerank, generate, verify, plus claim extraction."""
+    from pipeline import get_context
+    from retriever_gpu import candidates_batch, hybrid_rerank_batch
+    from generator_gpu import generate_answers
+    from verifier_api import verifier_predict_batch
+    from verifier_cache import CachedVerifier, get_default_cache
+    from claim_extractor import extract_claims
+    from table_store import sql_hits
+    ctx = ctx or get_context()
+    verifier = CachedVerifier(partial(verifier_predict_batch, ctx=ctx), cache=get_default_cache(), tag=ctx.verifier_path)
+    return {
+        "search": lambda items: candidates_batch([q for q, _ in items], ctx=ctx, filters=[f for _, f in items]),
+        "rerank": lambda items: hybrid_rerank_batch([q for q, _ in items], [c for _, c in items],
+                                                    cross_encoder=cross_encoder, ctx=ctx),
+        "generate": lambda items: generate_answers([q for q, _ in items], [ev for _, ev in items],
+                                                   sql_hits([q for q, _ in items], ctx=ctx)),
+        "verify": verifier.predict_batch,
+        "claims": extract_claims,
+    }
+
+def _evidence_view(c):
+    return {"doc_id": c.get("doc_id"), "chunk_id": c.get("chunk_id"), "score": c.get("combined", c.get("score")),
+            "text": c.get("meta", {}).get("text", "")}
+
+class RAGService:
+    def __init__(self, stage_fns=None, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE,
+                 max_inflight=MAX_INFLIGHT, timeout_s=TIMEOUT_S, mes_strategy="greedy", ctx=None, cross_encoder=None,
+                 verify_max_batch=VERIFY_MAX_BATCH, profile=None):
+        self.fns = stage_fns or default_stage_fns(ctx, cross_encoder)
+        sizes = {"search": max_batch, "rerank": max_batch, "generate": max_batch, "verify": verify_max_batch}
+        self.stages = {name: MicroBatcher(name, self.fns[name], n, max_wait_ms, max_queue) for name, n in sizes.items()}
+        self.max_inflight = max_inflight
+        self.timeout_s = timeout_s
+        self.mes_strategy = mes_strategy
+        self.profile = profile
+        self._requests = itertools.count(1)
+        self.mes_pool = ThreadPoolExecutor(max_workers=MES_THREADS, thread_name_prefix="rag-mes")
+        self._admit = None
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._admit = asyncio.Semaphore(self.max_inflight)
+        for st in self.stages.values():
+            st.start()
+
+    async def stop(self):
+        for st in self.stages.values():
+            await st.stop()
+        self.mes_pool.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _mes(self, claim, evidence, deadline):
+        # runs on a MES thread; its verifier calls join the shared verify micro-batches, which
+        # fail at the deadline themselves; the timeout only guards against a stalled loop
+        from mes import minimal_evidence_set
+
+        def verify(pairs):
+            fut = asyncio.run_coroutine_threadsafe(self.stages["verify"].submit_many(pairs, deadline), self._loop)
+            try:
+                return fut.result(timeout=max(0.0, deadline - self._loop.time()) + MES_GRACE_S)
+            except concurrent.futures.TimeoutError:
+                fut.cancel()
+                raise DeadlineExceeded("verify") from None
+        return minimal_evidence_set(claim, evidence, lambda c, texts: verify([(c, texts)])[0], threshold=0.85,
+                                    verifier_predict_batch=verify, strategy=self.mes_strategy)
+
+    async def ask(self, question, timeout_s=None, filters=None):
+        """
+        Async generator of events: evidence, answer, one verification per claim, then done (or error).
+        filters restrict retrieval to documents with matching attributes (see doc_attrs).
+        """
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        deadline = t0 + (timeout_s or self.timeout_s)
+        elapsed = lambda: loop.time() - t0
+        stage = "admission"
+        try:
+            await asyncio.wait_for(self._admit.acquire(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            tracing.record("serve.request", elapsed(), error="deadline", stage=stage)
+            yield {"type": "error", "error": "deadline exceeded", "stage": stage, "t": elapsed()}
+            return
+        start, error = time.time() - elapsed(), None
+        prof = tracing.profile(f"request-{next(self._requests)}", self.profile)
+        prof.__enter__()
+        try:
+            stage = "search"
+            cands = await self.stages["search"].submit((question, filters), deadline)
+            stage = "rerank"
+            evidence = (await self.stages["rerank"].submit((question, cands), deadline))[:EVIDENCE_K]
+            yield {"type": "evidence", "evidence": [_evidence_view(c) for c in evidence], "t": elapsed()}
+            stage = "generate"
+            answer = await self.stages["generate"].submit((question, evidence), deadline)
+            yield {"type": "answer", "answer": answer, "t": elapsed()}
+            stage = "verify"
+            claims = await loop.run_in_executor(self.mes_pool, self.fns["claims"], answer)
+            # all claims run at once; each wait is bounded by the request deadline, and the
+            # yields stay outside the timeout so a slow consumer is never cancelled mid-event
+            jobs = [asyncio.ensure_future(loop.run_in_executor(self.mes_pool, self._mes, c["text"], evidence, deadline))
+                    for c in claims]
+            try:
+                for c, job in zip(claims, jobs):
+                    S, p = await asyncio.wait_for(job, max(0.0, deadline - loop.time()))
+                    yield {"type": "verification", "claim": c["text"], "mes": [s["chunk_id"] for s in S], "p_entail": p,
+                           "t": elapsed()}
+            finally:
+                for job in jobs:
+                    job.cancel()
+                await asyncio.gather(*jobs, return_exceptions=True)  # retrieve what the cancelled jobs raised
+            yield {"type": "done", "t": elapsed()}
+        except (DeadlineExceeded, asyncio.TimeoutError):
+            error = "deadline"
+            yield {"type": "error", "error": "deadline exceeded", "stage": stage, "t": elapsed()}
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._admit.release()
+            prof.__exit__(None, None, None)
+            attrs = {"error": error, "stage": stage} if error else {}
+            tracing.record("serve.request", elapsed(), start=start, **attrs)
+
+    async def answer(self, question, timeout_s=None, filters=None):
+        """The whole response as one dict (evidence, answer, verifications, error)."""
+        out = {"question": question, "verifications": []}
+        async for ev in self.ask(question, timeout_s, filters):
+            if ev["type"] == "verification":
+                out["verifications"].append({k: v for k, v in ev.items() if k != "type"})
+            elif ev["type"] in ("evidence", "answer"):
+                out[ev["type"]] = ev[ev["type"]]
+            elif ev["type"] == "error":
+                out["error"] = ev["error"]
+            out["latency"] = ev["t"]
+        return out
+
+    def stats(self):
+        return {name: st.stats() for name, st in self.stages.items()}
+
+async def _serve_stdin(service):
+    loop = asyncio.get_running_loop()
+    async with service:
+        while True:
+            line = await loop.run_in_executor(None, _input_line)
+            if line is None:
+                break
+            if line.strip():
+                async for ev in service.ask(line.strip()):
+                    print(json.dumps(ev, ensure_ascii=False), flush=True)
+
+def _input_line():
+    try:
+        return input()
+    except EOFError:
+        return None
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max_wait_ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--timeout_s", type=float, default=TIMEOUT_S)
+    parser.add_argument("--trace", help="append stage spans to this JSONL")
+    parser.add_argument("--metrics_port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--profile", choices=["cprofile", "sample"], help="profile every request (cprofile skips requests that overlap another)")
+    parser.add_argument("--cascade", action="store_true", help="rerank with the models/reranker cascade (rerank_cascade)")
+    args = parser.parse_args()
+    if args.trace or args.metrics_port:
+        tracing.enable(args.trace, args.metrics_port)
+    cross_encoder = None
+    if args.cascade:
+        from rerank_cascade import RerankCascade
+        cross_encoder = RerankCascade()
+    asyncio.run(_serve_stdin(RAGService(max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, timeout_s=args.timeout_s,
+                                        profile=args.profile, cross_encoder=cross_encoder)))
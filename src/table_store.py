@@ -0,0 +1,239 @@
+# src/table_store.py
+"""
+SQLite store over the tables extracted at ingest (the {table_id, page, csv} entries of
+data/processed/*.json), used as the structured "SQL probe" for numeric questions.
+
+Tables in indices/tables.sqlite:
+  docs      doc_id -> hash of its tables, so reloading only touches changed documents
+  tables    table_id, doc_id, page, shape
+  cells     one row per body cell: row / column label, raw text, value (utils.parse_number)
+            and ISO date (utils.extract_dates); indexed on (table_id, row_idx) and (table_id, col_idx)
+  labels    label term -> (table_id, axis, idx), indexed on term
+  term_df   number of tables each label term occurs in (for idf), kept up to date on load
+A probe tokenizes the question, looks its terms up in labels, ranks tables by their best
+row + column label match (idf-weighted terms shared with the question, aggregated in
+SQLite), scores the cells of the top MAX_TABLES tables the same way, and returns the best numeric/date cells as {table_id, row, col, raw, value, date, page} hits,
+the shape generator_gpu.build_prompt formats as [SQL-j] evidence.
+Run from the repo root after ingest.py (incremental): python src/table_store.py
+"""
+import csv, io, json, math, os, re, sqlite3, threading
+from pathlib import Path
+from utils import content_hash, extract_dates, load_json, parse_number
+from lexical_index import tokenize
+from tracing import traced
+
+TABLE_DB = "./indices/tables.sqlite"
+PROC = "./data/processed"
+SQL_K = 5
+MAX_HEADER_ROWS = 3
+MIN_SCORE = 1.5  # idf-weighted label overlap a cell needs to be returned
+MAX_TABLES = 20  # tables whose cells are scored per probe
+COMMON_DF = 0.25  # terms in more than this share of tables do not rank tables
+_NUMERIC_RE = re.compile(r"[\s(\-+]*[$₹]?\s*\d[\d,]*(?:\.\d+)?\s*%?\)?\s*(?:cr|crore|lakh|mn|bn)?\.?", re.I)
+_STOP = {"a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with", "is", "was", "are", "were", "what",
+         "which", "who", "how", "much", "many", "did", "does", "do", "as", "at", "from", "its", "their", "per", "total"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, hash TEXT);
+CREATE TABLE IF NOT EXISTS tables (table_id TEXT PRIMARY KEY, doc_id TEXT, page INTEGER, n_rows INTEGER, n_cols INTEGER);
+CREATE TABLE IF NOT EXISTS cells (table_id TEXT, row_idx INTEGER, col_idx INTEGER, row_label TEXT, col_label TEXT,
+                                  raw TEXT, value REAL, date TEXT);
+CREATE TABLE IF NOT EXISTS labels (term TEXT, table_id TEXT, axis TEXT, idx INTEGER);
+CREATE TABLE IF NOT EXISTS term_df (term TEXT PRIMARY KEY, df INTEGER);
+CREATE INDEX IF NOT EXISTS cells_row ON cells (table_id, row_idx);
+CREATE INDEX IF NOT EXISTS cells_col ON cells (table_id, col_idx);
+CREATE INDEX IF NOT EXISTS labels_term ON labels (term);
+CREATE INDEX IF NOT EXISTS labels_table ON labels (table_id, term);
+CREATE INDEX IF NOT EXISTS tables_doc ON tables (doc_id);
+"""
+
+def label_terms(text):
+    """Label/question terms: BM25 tokens without stopwords; fy2023 / q4fy24 also yield their digits."""
+    terms = set()
+    for t in tokenize(text):
+        if t in _STOP:
+            continue
+        terms.add(t)
+        terms.update(re.findall(r"\d{2,4}", t) if re.search(r"[a-z]", t) else ())
+    return terms
+
+def _is_numeric(raw):
+    return bool(_NUMERIC_RE.fullmatch(raw))
+
+def parse_cell(raw):
+    """(value, date) for a cell: numbers via parse_number, dates via extract_dates (not for plain numbers)."""
+    raw = raw.strip()
+    if not raw:
+        return None, None
+    if _is_numeric(raw):
+        return parse_number(raw), None
+    date = extract_dates(raw)
+    return (None if date else parse_number(raw)), date
+
+def parse_table(csv_text):
+    """(col_labels, [(row_label, [cell, ...]), ...]) from an ingested csv string."""
+    rows = [r for r in csv.reader(io.StringIO(csv_text or "")) if any(c.strip() for c in r)]
+    # camelot / pdfplumber frames are written with their positional column names as the first row
+    if rows and [c.strip() for c in rows[0]] == [str(i) for i in range(len(rows[0]))]:
+        rows = rows[1:]
+    if not rows:
+        return [], []
+    width = max(len(r) for r in rows)
+    rows = [[c.strip() for c in r] + [""] * (width - len(r)) for r in rows]
+    # header: leading rows (at least one) until the first row with a number outside the label column
+    n_head = 1
+    while n_head < min(MAX_HEADER_ROWS, len(rows) - 1) and not any(_is_numeric(c) for c in rows[n_head][1:]):
+        n_head += 1
+    cols = [" ".join(dict.fromkeys(r[j] for r in rows[:n_head] if r[j])) for j in range(width)]
+    return cols, [(r[0], r) for r in rows[n_head:]]
+
+def _label_scores(weights, n_tables=0):
+    """CTE m(table_id, axis, idx, s): summed term weights per row / column label (of n_tables given tables)."""
+    # for given tables, look (table, term) up directly rather than scanning a common term's postings
+    src = f"labels INDEXED BY labels_table JOIN q USING (term) WHERE table_id IN ({','.join('?' * n_tables)}) " \
+        if n_tables else "labels JOIN q USING (term) "
+    return (f"WITH q(term, w) AS (VALUES {','.join(['(?, ?)'] * len(weights))}), "
+            f"m AS (SELECT table_id, axis, idx, SUM(w) AS s FROM {src}"
+            "GROUP BY table_id, axis, idx) ")
+
+class TableStore:
+    def __init__(self, db_path=TABLE_DB):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(db_path=TABLE_DB):
+        return os.path.exists(db_path)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tables").fetchone()[0]
+
+    def _delete_doc(self, doc_id):
+        ids = [r[0] for r in self._db.execute("SELECT table_id FROM tables WHERE doc_id = ?", (doc_id,))]
+        self._db.executemany("UPDATE term_df SET df = df - 1 WHERE term IN "
+                             "(SELECT DISTINCT term FROM labels WHERE table_id = ?)", [(t,) for t in ids])
+        for sql in ("DELETE FROM cells WHERE table_id = ?", "DELETE FROM labels WHERE table_id = ?",
+                    "DELETE FROM tables WHERE table_id = ?"):
+            self._db.executemany(sql, [(t,) for t in ids])
+        self._db.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+
+    def add_document(self, doc_id, tables):
+        """Load (or replace) one document's tables; returns False if they are unchanged since the last load."""
+        h = content_hash(json.dumps(tables, sort_keys=True, ensure_ascii=False))
+        with self._lock, self._db:
+            row = self._db.execute("SELECT hash FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None and row[0] == h:
+                return False
+            self._delete_doc(doc_id)
+            for t in tables:
+                cols, body = parse_table(t.get("csv", ""))
+                if not body:
+                    continue
+                tid = t.get("table_id")
+                self._db.execute("INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?, ?)",
+                                 (tid, doc_id, t.get("page"), len(body), len(cols)))
+                cells = [(tid, i, j, label, cols[j], raw, *parse_cell(raw))
+                         for i, (label, vals) in enumerate(body) for j, raw in enumerate(vals) if j and raw]
+                self._db.executemany("INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?)", cells)
+                terms = [(term, tid, "r", i) for i, (label, _) in enumerate(body) for term in label_terms(label)]
+                terms += [(term, tid, "c", j) for j, label in enumerate(cols) if j for term in label_terms(label)]
+                self._db.executemany("INSERT INTO labels VALUES (?, ?, ?, ?)", terms)
+                self._db.executemany("INSERT INTO term_df VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                                     [(t,) for t in {t for t, *_ in terms}])
+            self._db.execute("INSERT INTO docs VALUES (?, ?)", (doc_id, h))
+        return True
+
+    def remove_document(self, doc_id):
+        with self._lock, self._db:
+            self._delete_doc(doc_id)
+
+    def load_processed(self, proc=PROC, prune=True):
+        """Incrementally load data/processed/*.json; documents that no longer exist are dropped if prune."""
+        stats = {"loaded": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        for f in sorted(Path(proc).glob("*.json")):
+            j = load_json(f)
+            doc_id = j.get("id") or f.stem
+            seen.add(doc_id)
+            stats["loaded" if self.add_document(doc_id, j.get("tables", [])) else "unchanged"] += 1
+        if prune:
+            with self._lock:
+                gone = [r[0] for r in self._db.execute("SELECT doc_id FROM docs")]
+            for doc_id in set(gone) - seen:
+                self.remove_document(doc_id)
+                stats["removed"] += 1
+        return stats
+
+    def probe(self, question, k=SQL_K, min_score=MIN_SCORE, max_tables=MAX_TABLES):
+        """Best-matching numeric/date cells for question (see module docstring)."""
+        terms = sorted(label_terms(question))
+        if not terms:
+            return []
+        marks = ",".join("?" * len(terms))
+        with self._lock:
+            n_tables = max(1, self._db.execute("SELECT COUNT(*) FROM tables").fetchone()[0])
+            df = self._db.execute(f"SELECT term, df FROM term_df WHERE df > 0 AND term IN ({marks})", terms).fetchall()
+            if not df:
+                return []
+            weights = [(t, math.log(1 + n_tables / n)) for t, n in df]
+            # tables are ranked by best row + best column score over the selective terms only (labels
+            # like "2023" can occur in every table); all terms score the cells of the tables kept
+            rare = [(t, w) for (t, w), (_, n) in zip(weights, df) if n <= max(max_tables, COMMON_DF * n_tables)] or weights
+            top = self._db.execute(
+                _label_scores(rare) + "SELECT table_id FROM m GROUP BY table_id ORDER BY "
+                "MAX(CASE WHEN axis = 'r' THEN s ELSE 0 END) + MAX(CASE WHEN axis = 'c' THEN s ELSE 0 END) DESC "
+                "LIMIT ?", [x for tw in rare for x in tw] + [max_tables]).fetchall()
+            tids = [t for t, in top]
+            if not tids:
+                return []
+            matches = {}
+            for tid, axis, idx, score in self._db.execute(
+                    _label_scores(weights, len(tids)) + "SELECT * FROM m", [x for tw in weights for x in tw] + tids):
+                matches.setdefault(tid, {})[(axis, idx)] = score
+            hits = []
+            for tid in tids:
+                m = matches.get(tid, {})
+                # cells of the matched rows; of the matched columns only if no row label matched
+                axis = "row" if any(a == "r" for a, _ in m) else "col"
+                idx = ",".join(str(i) for a, i in m if a == axis[0]) or "-1"
+                for i, j, row, col, raw, value, date, page in self._db.execute(
+                        "SELECT row_idx, col_idx, row_label, col_label, raw, value, date, page FROM cells "
+                        f"JOIN tables USING (table_id) WHERE table_id = ? AND {axis}_idx IN ({idx}) "
+                        "AND (value IS NOT NULL OR date IS NOT NULL)", (tid,)):
+                    score = m.get(("r", i), 0.0) + m.get(("c", j), 0.0)
+                    if score >= min_score:
+                        hits.append((score, {"table_id": tid, "row": row, "col": col, "raw": raw, "value": value,
+                                             "date": date, "page": page}))
+        hits.sort(key=lambda h: h[0], reverse=True)
+        return [dict(h, score=round(s, 3)) for s, h in hits[:k]]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+@traced("sql", batch=0)
+def sql_hits(questions, ctx=None, k=SQL_K):
+    """Probe hits for each question; empty lists when no table store has been built."""
+    from pipeline import get_context
+    store = (ctx or get_context()).tables
+    if store is None:
+        return [[] for _ in questions]
+    return [store.probe(q, k=k) for q in questions]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--proc", default=PROC)
+    parser.add_argument("--db", default=TABLE_DB)
+    parser.add_argument("--probe", help="print the hits for this question after loading")
+    args = parser.parse_args()
+    store = TableStore(args.db)
+    print(store.load_processed(args.proc), f"{len(store)} tables in {args.db}")
+    if args.probe:
+        for h in store.probe(args.probe):
+            print(json.dumps(h, ensure_ascii=False))
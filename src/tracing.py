@@ -0,0 +1,405 @@
+# src/tracing.py
+"""
+Lightweight tracing and metrics for the pipeline stages. Off by default: a traced call then
+costs one flag check and span() returns a shared no-op object.
+
+  span(name, **attrs)        context manager; nested spans (same thread / task) record their parent
+  traced(name, batch=0)      decorator; batch is the position of the argument whose len() is the batch size
+  current().set(k=v)         attach attributes to the innermost open span
+  inc / observe / record     counters, histograms, and spans timed elsewhere (e.g. across awaits)
+
+Every finished span adds to rag_stage_seconds{stage} (histogram), rag_stage_calls_total,
+rag_stage_items_total (batch sizes) and rag_stage_errors_total, and is appended to the JSONL
+trace file as {"ts", "name", "dur_ms", "trace", "span", "parent", "thread", attrs...}.
+metrics_text() renders all metrics in the Prometheus text format; serve_metrics(port) exposes
+it on http://host:port/metrics.
+
+profile(name, mode) profiles one request: "cprofile" writes <name>.prof (calling thread only;
+open with pstats or snakeviz); only one block can be cProfiled at a time, so a block that
+overlaps another is not profiled and only counted (profiles_skipped(), and the
+rag_profiles_skipped_total metric). "sample" profiles every block: it samples the stacks of
+all threads every few ms and writes <name>.folded, the collapsed-stack format of py-spy
+--format raw (flamegraph.pl, speedscope).
+
+Enable with enable(path) or RAG_TRACE=path (RAG_PROFILE=cprofile|sample, RAG_METRICS_PORT=9108).
+Rank the hottest stages of a trace: python src/tracing.py results/trace.jsonl
+"""
+import bisect, contextvars, functools, itertools, json, os, sys, threading, time
+from contextlib import contextmanager
+
+TRACE_FILE = "./results/trace.jsonl"
+PROFILE_DIR = "./results/profiles"
+METRICS_PORT = 9108
+SAMPLE_INTERVAL_S = 0.005
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_enabled = False
+_sink = None
+_sink_lock = threading.Lock()
+_ids = itertools.count(1)
+_run = os.urandom(4).hex()  # span ids stay unique across runs appending to one trace file
+_current = contextvars.ContextVar("rag_span", default=None)
+_cprofile_lock = threading.Lock()  # one cProfile.Profile can be active at a time
+_skipped = {"cprofile": 0}          # blocks not profiled because another held _cprofile_lock
+
+# metrics ------------------------------------------------------------------------------
+
+class Metrics:
+    """Counters and fixed-bucket histograms keyed by (name, sorted label items)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.hists = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            h["counts"][bisect.bisect_left(h["buckets"], value)] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.hists.clear()
+
+    def text(self, prefix="rag_"):
+        """Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+        lines = []
+        with self.lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                lines += [f"{prefix}{name}{fmt(l)} {v}" for (n, l), v in sorted(self.counters.items()) if n == name]
+            for name in sorted({n for n, _ in self.hists}):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for (n, l), h in sorted(self.hists.items(), key=lambda kv: kv[0]):
+                    if n != name:
+                        continue
+                    cum = 0
+                    for le, c in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+                        cum += c
+                        lines.append(f"{prefix}{name}_bucket{fmt(l, [('le', le)])} {cum}")
+                    lines.append(f"{prefix}{name}_sum{fmt(l)} {h['sum']}")
+                    lines.append(f"{prefix}{name}_count{fmt(l)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def inc(name, value=1, **labels):
+    if _enabled:
+        metrics.inc(name, value, **labels)
+
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    if _enabled:
+        metrics.observe(name, value, buckets, **labels)
+
+def metrics_text():
+    return metrics.text()
+
+# spans --------------------------------------------------------------------------------
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "trace_id", "parent", "start", "_t0", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = f"{_run}-{next(_ids)}"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _finish(self.name, self.start, dt, self.attrs, self.trace_id, self.span_id, self.parent)
+        return False
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+_NOOP = _NoSpan()
+
+def span(name, **attrs):
+    return Span(name, attrs) if _enabled else _NOOP
+
+def current():
+    """The innermost open span of this thread / task (a no-op object when there is none)."""
+    return (_current.get() or _NOOP) if _enabled else _NOOP
+
+def traced(name, batch=None):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            attrs = {}
+            if batch is not None and len(args) > batch:
+                try:
+                    attrs["batch"] = len(args[batch])
+                except TypeError:
+                    pass
+            with Span(name, attrs):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def record(name, seconds, start=None, **attrs):
+    """A span measured by the caller, e.g. a request that spans awaits; it has no parent."""
+    if _enabled:
+        sid = f"{_run}-{next(_ids)}"
+        _finish(name, start if start is not None else time.time() - seconds, seconds, attrs, sid, sid, None)
+
+def _finish(name, start, dt, attrs, trace_id, span_id, parent):
+    metrics.observe("stage_seconds", dt, stage=name)
+    metrics.inc("stage_calls_total", stage=name)
+    if "batch" in attrs:
+        metrics.inc("stage_items_total", attrs["batch"], stage=name)
+    if "error" in attrs:
+        metrics.inc("stage_errors_total", stage=name)
+    if _sink is not None:
+        rec = {"ts": round(start, 6), "name": name, "dur_ms": round(dt * 1000, 3), "trace": trace_id, "span": span_id,
+               "parent": parent, "thread": threading.current_thread().name, **attrs}
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        with _sink_lock:
+            if _sink is not None:
+                _sink.write(line)
+
+# setup --------------------------------------------------------------------------------
+
+def enable(path=TRACE_FILE, metrics_port=None, append=True):
+    """Start collecting spans and metrics; spans are written to path (None: metrics only)."""
+    global _enabled, _sink
+    with _sink_lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            _sink = open(path, "a" if append else "w", encoding="utf-8", buffering=1)
+    _enabled = True
+    if metrics_port:
+        serve_metrics(metrics_port)
+
+def disable():
+    global _enabled, _sink
+    _enabled = False
+    with _sink_lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+
+def enabled():
+    return _enabled
+
+def serve_metrics(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve metrics_text() at /metrics from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="rag-metrics").start()
+    return server
+
+# profiling ----------------------------------------------------------------------------
+
+class StackSampler:
+    """
+    One process-wide thread that samples the Python stacks of all other threads every interval
+    seconds while any profile is subscribed; each subscriber gets its own collapsed-stack counts.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        counts = {}
+        with self.lock:
+            self.subscribers.append(counts)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="rag-sampler")
+                self._thread.start()
+        return counts
+
+    def unsubscribe(self, counts):
+        with self.lock:
+            self.subscribers = [c for c in self.subscribers if c is not counts]
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                subs = list(self.subscribers)
+                if not subs:
+                    self._thread = None
+                    return
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(f"thread {names.get(tid, tid)}")
+                stacks.append(";".join(reversed(stack)))
+            for counts in subs:
+                for key in stacks:
+                    counts[key] = counts.get(key, 0) + 1
+
+def write_folded(counts, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+            f.write(f"{stack} {n}\n")
+
+_sampler = StackSampler()
+
+@contextmanager
+def profile(name, mode=None, out_dir=PROFILE_DIR):
+    """
+    Profile the enclosed block ("cprofile" or "sample"); yields the output path, or None when
+    mode is unset or another block on a different thread is already being cProfiled (counted
+    in profiles_skipped()).
+    """
+    mode = mode or os.environ.get("RAG_PROFILE")
+    if not mode:
+        yield None
+        return
+    if mode not in ("cprofile", "sample"):
+        raise ValueError(f"unknown profile mode {mode!r}, expected 'cprofile' or 'sample'")
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in str(name)))
+    if mode == "cprofile":
+        import cProfile
+        if not _cprofile_lock.acquire(blocking=False):
+            with _sink_lock:
+                _skipped["cprofile"] += 1
+            inc("profiles_skipped_total", mode="cprofile")
+            yield None
+            return
+        prof, path = cProfile.Profile(), stem + ".prof"
+        try:
+            prof.enable()
+            try:
+                yield path
+            finally:
+                prof.disable()
+                prof.dump_stats(path)
+        finally:
+            _cprofile_lock.release()
+    else:
+        counts, path = _sampler.subscribe(), stem + ".folded"
+        try:
+            yield path
+        finally:
+            _sampler.unsubscribe(counts)
+            write_folded(counts, path)
+
+def profiles_skipped():
+    """Number of blocks that were not cProfiled because another one was."""
+    return _skipped["cprofile"]
+
+# summary ------------------------------------------------------------------------------
+
+def load_trace(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(spans):
+    """
+    Per span name: calls, total and self time (total minus the time of child spans), mean /
+    p50 / p95 latency and mean batch size, sorted by self time, i.e. the hottest stages first.
+    """
+    child_ms = {}
+    for s in spans:
+        if s.get("parent") is not None:
+            child_ms[s["parent"]] = child_ms.get(s["parent"], 0.0) + s["dur_ms"]
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s)
+    total_self = sum(max(s["dur_ms"] - child_ms.get(s["span"], 0.0), 0.0) for s in spans) or 1e-9
+    rows = []
+    for name, group in by_name.items():
+        durs = sorted(s["dur_ms"] for s in group)
+        self_ms = sum(max(s["dur_ms"] - child_ms.get(s["span"], 0.0), 0.0) for s in group)
+        batches = [s["batch"] for s in group if "batch" in s]
+        rows.append({"stage": name, "calls": len(group), "total_s": sum(durs) / 1000, "self_s": self_ms / 1000,
+                     "self_pct": 100 * self_ms / total_self, "mean_ms": sum(durs) / len(durs),
+                     "p50_ms": durs[len(durs) // 2], "p95_ms": durs[min(len(durs) - 1, int(0.95 * len(durs)))],
+                     "mean_batch": sum(batches) / len(batches) if batches else None,
+                     "errors": sum(1 for s in group if "error" in s)})
+    return sorted(rows, key=lambda r: -r["self_s"])
+
+def format_summary(rows, top=None):
+    out = [f"{'stage':<22} {'calls':>7} {'total s':>9} {'self s':>9} {'self %':>7} {'mean ms':>9} {'p50 ms':>9} "
+           f"{'p95 ms':>9} {'batch':>6} {'err':>4}"]
+    for r in rows[:top]:
+        batch = f"{r['mean_batch']:.1f}" if r["mean_batch"] is not None else "-"
+        out.append(f"{r['stage']:<22} {r['calls']:>7} {r['total_s']:>9.2f} {r['self_s']:>9.2f} {r['self_pct']:>7.1f} "
+                   f"{r['mean_ms']:>9.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {batch:>6} {r['errors']:>4}")
+    return "\n".join(out)
+
+if os.environ.get("RAG_TRACE"):
+    enable(os.environ["RAG_TRACE"], int(os.environ.get("RAG_METRICS_PORT") or 0) or None)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="rank the hottest stages of a JSONL trace")
+    parser.add_argument("trace", nargs="?", default=TRACE_FILE)
+    parser.add_argument("--top", type=int)
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = parser.parse_args()
+    rows = summarize(load_trace(args.trace))
+    print(json.dumps(rows[:args.top], indent=2) if args.json else format_summary(rows, args.top))
@@ -0,0 +1,132 @@
+# src/train_data.py
+"""
+Training data pipeline shared by reranker_finetune.py and verifier_train.py.
+
+Pairs are tokenized once, without padding, and the tokenized dataset is cached on disk
+under data/train_cache/, keyed on the JSONL's sha256, the tokenizer and the fields, so
+later runs load it in a second. Batches are formed by length: examples are sorted by
+token count and cut into batches that stay under a padded-token budget (at most
+max_batch examples each). Every epoch the examples are reshuffled within length buckets
+of LENGTH_BUCKET tokens before being cut, so batches mix differently each time, and the
+batch order is reshuffled too. A DataCollatorWithPadding pads each batch only to its
+longest member, so short pairs no longer pay for max_length positions. Gradient
+accumulation comes from TrainingArguments.
+"""
+import itertools, os, random
+from utils import content_hash, file_sha256, length_batches
+
+TRAIN_CACHE_DIR = "./data/train_cache"
+MAX_LENGTH = 256
+MAX_BATCH_TOKENS = 4096   # padded tokens per batch (16 x 256, the reranker's old fixed batch)
+MAX_BATCH = 128           # examples per token-budget batch
+LENGTH_BUCKET = 16        # examples whose lengths round up to the same multiple are shuffled together
+MODEL_COLUMNS = ("input_ids", "attention_mask", "token_type_ids", "labels")
+
+def pretokenize(path, tokenizer, text_a, text_b, label="label", max_length=MAX_LENGTH, cache_dir=TRAIN_CACHE_DIR):
+    """
+    JSONL with text_a / text_b / label fields -> datasets.Dataset with input_ids, attention_mask
+    (token_type_ids), labels and length. Loaded from cache_dir when the inputs are unchanged.
+    """
+    from datasets import load_dataset, load_from_disk
+    key = content_hash("|".join(map(str, [file_sha256(path), tokenizer.name_or_path, len(tokenizer), text_a, text_b,
+                                           label, max_length])))[:16]
+    cached = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{key}")
+    if os.path.exists(cached):
+        return load_from_disk(cached)
+    ds = load_dataset("json", data_files=path)["train"]
+
+    def tokenize(ex):
+        t = tokenizer(ex[text_a], ex[text_b], truncation=True, max_length=max_length)
+        t["labels"] = ex[label]
+        t["length"] = [len(ids) for ids in t["input_ids"]]
+        return t
+
+    ds = ds.map(tokenize, batched=True, remove_columns=ds.column_names)
+    tmp = cached + ".tmp"
+    ds.save_to_disk(tmp)
+    os.replace(tmp, cached)
+    return load_from_disk(cached)
+
+class TokenBudgetBatchSampler:
+    """
+    Batches of dataset positions with similar lengths: at most max_batch examples and
+    max_tokens padded tokens each. Batch sizes are fixed, computed on lengths rounded up to
+    bucket_width; every epoch the positions are shuffled within those buckets before being
+    cut (sortish sampling), so any member order keeps a batch under budget, and the batch
+    order is shuffled as well.
+    """
+    def __init__(self, lengths, max_tokens=MAX_BATCH_TOKENS, max_batch=MAX_BATCH, shuffle=True, seed=0,
+                 bucket_width=LENGTH_BUCKET):
+        self.buckets = [-(-n // bucket_width) for n in lengths]
+        self.sizes = [len(b) for b in length_batches([b * bucket_width for b in self.buckets], max_batch, max_tokens)]
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        rng = random.Random(self.seed + self.epoch)
+        # ties within a bucket keep their position order without shuffle, as length_batches sorts
+        jitter = (lambda i: rng.random()) if self.shuffle else (lambda i: i)
+        order = sorted(range(len(self.buckets)), key=lambda i: (self.buckets[i], jitter(i)))
+        starts = list(itertools.accumulate(self.sizes, initial=0))
+        batches = [order[a:b] for a, b in zip(starts, starts[1:])]
+        if self.shuffle:
+            rng.shuffle(batches)
+            self.epoch += 1
+        yield from batches
+
+def collator(tokenizer):
+    import torch
+    from transformers import DataCollatorWithPadding
+    # multiples of 8 keep fp16 tensor cores busy
+    return DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8 if torch.cuda.is_available() else None)
+
+def model_inputs(ds):
+    return ds.remove_columns([c for c in ds.column_names if c not in MODEL_COLUMNS])
+
+def bucketed_trainer_class():
+    from torch.utils.data import DataLoader
+    from transformers import Trainer
+
+    class BucketedTrainer(Trainer):
+        """Trainer whose training batches come from a TokenBudgetBatchSampler when max_batch_tokens is set."""
+        def __init__(self, *args, max_batch_tokens=None, max_batch=MAX_BATCH, lengths=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.max_batch_tokens = max_batch_tokens
+            self.max_batch = max_batch
+            self.lengths = lengths
+
+        def get_train_dataloader(self):
+            if not self.max_batch_tokens:
+                return super().get_train_dataloader()
+            sampler = TokenBudgetBatchSampler(self.lengths, self.max_batch_tokens, self.max_batch, seed=self.args.seed)
+            loader = DataLoader(self.train_dataset, batch_sampler=sampler, collate_fn=self.data_collator,
+                                num_workers=self.args.dataloader_num_workers, pin_memory=self.args.dataloader_pin_memory)
+            return self.accelerator.prepare(loader)
+
+    return BucketedTrainer
+
+def train(model, tokenizer, ds, output_dir, batch_size=16, epochs=3, learning_rate=2e-5, grad_accum=1,
+          max_batch_tokens=MAX_BATCH_TOKENS, max_batch=MAX_BATCH, logging_steps=50):
+    """
+    Fine-tune model on a pretokenize()d dataset with dynamic padding. With max_batch_tokens,
+    batches are length-bucketed under that token budget (at most max_batch examples);
+    without it, batches are batch_size random examples. Returns the Trainer.
+    """
+    import torch
+    from transformers import TrainingArguments
+    args = TrainingArguments(output_dir=output_dir, per_device_train_batch_size=batch_size, num_train_epochs=epochs,
+                             gradient_accumulation_steps=grad_accum, fp16=torch.cuda.is_available(),
+                             learning_rate=learning_rate, save_strategy="epoch", logging_steps=logging_steps,
+                             report_to=[])
+    trainer = bucketed_trainer_class()(model=model, args=args, train_dataset=model_inputs(ds),
+                                       data_collator=collator(tokenizer), max_batch_tokens=max_batch_tokens,
+                                       max_batch=max_batch, lengths=ds["length"])
+    trainer.train()
+    return trainer
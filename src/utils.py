@@ -1,12 +1,67 @@
 # src/utils.py
-import re, json, os
+import re, json, os, hashlib, itertools, queue, threading
 from dateutil.parser import parse as dateparse
 from typing import Optional
 
 def save_json(obj, path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    # write-then-rename so an interrupted run never leaves a truncated file behind
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def batched(it, n):
+    it = iter(it)
+    while True:
+        batch = list(itertools.islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+def length_batches(lengths, max_batch, max_tokens):
+    """Group positions (sorted by length) so each padded batch stays under the token budget."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batch = []
+    for i in order:
+        # lengths are ascending, so the padded width of the batch is lengths[i]
+        if batch and (len(batch) >= max_batch or (len(batch) + 1) * lengths[i] > max_tokens):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+def prefetch(it, depth=2):
+    """Run a generator in a background thread, buffering at most `depth` items."""
+    q = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for item in it:
+                q.put(item)
+            q.put(done)
+        except BaseException as e:
+            q.put(e)
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
@@ -1,16 +1,38 @@
 # src/verifier_api.py
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
-tokenizer = AutoTokenizer.from_pretrained("./models/verifier")
-model = AutoModelForSequenceClassification.from_pretrained("./models/verifier").to("cuda" if torch.cuda.is_available() else "cpu")
+from pipeline import get_context
+from tracing import span, traced
+from utils import length_batches
 label_map = {0: "entailment", 1: "neutral", 2: "contradiction"}  # depends on your label mapping
 
-def verifier_predict(claim, evidence_texts):
-    joint = " ||| ".join(evidence_texts)
-    inputs = tokenizer(claim, joint, return_tensors="pt", truncation=True, padding=True).to(model.device)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.softmax(logits, dim=-1).cpu().numpy()[0]
-        # assume index 0 is entailment; adapt if different
-        entail_prob = float(probs[0])
-    return entail_prob
+MAX_BATCH = 32
+MAX_BATCH_TOKENS = 8192  # padded tokens per forward pass
+
+@traced("verifier", batch=0)
+def verifier_predict_batch(pairs, max_batch=MAX_BATCH, max_tokens=MAX_BATCH_TOKENS, ctx=None):
+    """
+    pairs: list of (claim, evidence_texts). Returns the entailment prob for each pair.
+    Pairs are tokenized once, sorted by length and padded per batch only to the longest member.
+    """
+    import torch
+    if not pairs:
+        return []
+    tokenizer, model = (ctx or get_context()).verifier
+    claims = [c for c, _ in pairs]
+    joints = [" ||| ".join(ev) for _, ev in pairs]
+    enc = tokenizer(claims, joints, truncation=True)
+    lengths = [len(ids) for ids in enc["input_ids"]]
+    probs = [0.0] * len(pairs)
+    with torch.inference_mode():
+        for batch in length_batches(lengths, max_batch, max_tokens):
+            feats = [{k: enc[k][i] for k in enc.keys()} for i in batch]
+            inputs = tokenizer.pad(feats, return_tensors="pt").to(model.device)
+            with span("verifier.model", batch=len(batch), input_tokens=int(inputs["input_ids"].shape[1])):
+                logits = model(**inputs).logits
+            # assume index 0 is entailment; adapt if different
+            entail = torch.softmax(logits.float(), dim=-1)[:, 0].cpu().tolist()
+            for i, p in zip(batch, entail):
+                probs[i] = float(p)
+    return probs
+
+def verifier_predict(claim, evidence_texts, ctx=None):
+    return verifier_predict_batch([(claim, evidence_texts)], ctx=ctx)[0]
@@ -0,0 +1,111 @@
+# src/verifier_cache.py
+"""
+Memoizing layer in front of the verifier. Results are keyed on a hash of the
+normalized claim plus the ordered evidence texts (and the verifier tag, so two
+checkpoints never share entries). An in-memory LRU tier sits over an optional
+SQLite tier, so repeated evaluation runs over the same QA set skip model calls.
+"""
+import hashlib, os, re, sqlite3, threading
+from collections import OrderedDict
+import tracing
+
+VERIFIER_CACHE_DB = "./indices/verifier_cache.sqlite"
+MAX_ITEMS = 100_000
+
+def _norm(text):
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+def cache_key(claim, evidence_texts, tag=""):
+    h = hashlib.sha1()
+    h.update(tag.encode("utf-8"))
+    h.update(b"\x00" + _norm(claim).encode("utf-8"))
+    for t in evidence_texts:
+        # per-text digests keep the key order-sensitive without ambiguity between joins
+        h.update(b"\x00" + hashlib.sha1(_norm(t).encode("utf-8")).digest())
+    return h.hexdigest()
+
+class VerifierCache:
+    def __init__(self, max_items=MAX_ITEMS, db_path=None):
+        self.max_items = max_items
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, p REAL)")
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return self._mem[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT p FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.hits["disk"] += 1
+                    self._remember(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put_many(self, items):
+        with self._lock:
+            for key, p in items:
+                self._remember(key, p)
+            if self._db is not None and items:
+                self._db.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?)", items)
+                self._db.commit()
+
+    def _remember(self, key, p):
+        self._mem[key] = p
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def stats(self):
+        total = self.hits["memory"] + self.hits["disk"] + self.misses
+        return {"memory_hits": self.hits["memory"], "disk_hits": self.hits["disk"], "misses": self.misses,
+                "hit_rate": (total - self.misses) / total if total else 0.0}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class CachedVerifier:
+    """Wraps a batch verifier function([(claim, texts)]) -> [prob] with a VerifierCache."""
+    def __init__(self, predict_batch, cache=None, tag=""):
+        self.predict_batch_fn = predict_batch
+        self.cache = cache if cache is not None else VerifierCache()
+        self.tag = tag
+
+    def predict_batch(self, pairs):
+        keys = [cache_key(claim, texts, self.tag) for claim, texts in pairs]
+        out = [self.cache.get(k) for k in keys]
+        todo = {}  # key -> first position needing a model call (dedupes repeats within the batch)
+        for i, (k, p) in enumerate(zip(keys, out)):
+            if p is None and k not in todo:
+                todo[k] = i
+        tracing.inc("verifier_cache_hits_total", len(keys) - len(todo))
+        tracing.inc("verifier_cache_misses_total", len(todo))
+        if todo:
+            probs = self.predict_batch_fn([pairs[i] for i in todo.values()])
+            fresh = dict(zip(todo.keys(), probs))
+            self.cache.put_many(list(fresh.items()))
+            out = [fresh[k] if p is None else p for k, p in zip(keys, out)]
+        return out
+
+    def predict(self, claim, evidence_texts):
+        return self.predict_batch([(claim, evidence_texts)])[0]
+
+_default_cache = None
+
+def get_default_cache(db_path=VERIFIER_CACHE_DB):
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = VerifierCache(db_path=db_path)
+    return _default_cache
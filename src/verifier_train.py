@@ -2,30 +2,22 @@
 """
 Fine-tune a verifier (NLI) model to classify (claim, evidence) -> entailment/neutral/contradiction.
 Provide training JSONL with {"claim":..,"evidence":..,"label":0/1/2}
+Pairs are pre-tokenized once (cached in data/train_cache/) and trained in length-bucketed,
+dynamically padded batches (see train_data).
 """
-from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
-import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from train_data import pretokenize, train
 
 BASE = "roberta-large-mnli"
 SAVE_DIR = "./models/verifier"
+MAX_BATCH_TOKENS = 2048  # padded tokens per batch (8 x 256, the old fixed verifier batch)
 
-def main(train_jsonl):
-    ds = load_dataset("json", data_files=train_jsonl)["train"]
+def main(train_jsonl, batch_size=8, max_batch_tokens=MAX_BATCH_TOKENS, grad_accum=1, epochs=3):
     tokenizer = AutoTokenizer.from_pretrained(BASE)
+    ds = pretokenize(train_jsonl, tokenizer, "claim", "evidence")
     model = AutoModelForSequenceClassification.from_pretrained(BASE, num_labels=3)
-
-    def preprocess(ex):
-        t = tokenizer(ex["claim"], ex["evidence"], truncation=True, padding="max_length", max_length=256)
-        t["labels"] = ex["label"]
-        return t
-
-    ds = ds.map(preprocess, batched=True)
-    ds.set_format(type="torch", columns=["input_ids", "attention_mask", "labels"])
-
-    args = TrainingArguments(output_dir=SAVE_DIR, per_device_train_batch_size=8, num_train_epochs=3, fp16=torch.cuda.is_available(), logging_steps=25, learning_rate=2e-5, save_strategy="epoch", report_to=[])
-    trainer = Trainer(model=model, args=args, train_dataset=ds)
-    trainer.train()
+    train(model, tokenizer, ds, SAVE_DIR, batch_size=batch_size, epochs=epochs, learning_rate=2e-5, grad_accum=grad_accum,
+          max_batch_tokens=max_batch_tokens, logging_steps=25)
     model.save_pretrained(SAVE_DIR)
     tokenizer.save_pretrained(SAVE_DIR)
     print("Saved verifier to", SAVE_DIR)
@@ -34,5 +26,10 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--train_jsonl", required=True)
+    parser.add_argument("--batch_size", type=int, default=8, help="examples per batch without a token budget")
+    parser.add_argument("--max_batch_tokens", type=int, default=MAX_BATCH_TOKENS, help="padded tokens per batch (0: fixed batch_size)")
+    parser.add_argument("--grad_accum", type=int, default=1)
+    parser.add_argument("--epochs", type=int, default=3)
     args = parser.parse_args()
-    main(args.train_jsonl)
\ No newline at end of file
+    main(args.train_jsonl, batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens or None,
+         grad_accum=args.grad_accum, epochs=args.epochs)
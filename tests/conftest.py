@@ -0,0 +1,5 @@
+# tests/conftest.py
+# the pipeline modules are flat scripts under src/ that import each other by name
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
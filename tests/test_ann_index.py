@@ -0,0 +1,76 @@
+# tests/test_ann_index.py
+import numpy as np
+import pytest
+
+import ann_index
+import embed_index_gpu
+from utils import save_json
+
+def _vectors(n, d=16, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+@pytest.fixture
+def faiss():
+    return pytest.importorskip("faiss")
+
+@pytest.mark.parametrize("kind", ["flat", "ivf_flat", "ivf_pq"])
+def test_remove_then_add_keeps_ids(faiss, kind):
+    x = _vectors(400)
+    index, params = ann_index.build_ann_index(x[:300], ids=np.arange(300), type=kind, nlist=4, pq_m=4, nprobe=4)
+    assert hasattr(index, "id_map") == (kind == "flat")
+    removed = np.arange(0, 300, 3)
+    ann_index.remove_ids(index, removed)
+    index.add_with_ids(x[300:], np.arange(300, 400, dtype="int64"))
+    assert index.ntotal == 300 - len(removed) + 100
+    _, got = index.search(x[300:], 1 if kind != "ivf_pq" else 10)
+    # every new vector is found under its own id (PQ is lossy, so only within its top 10)
+    assert all(i in row for i, row in zip(range(300, 400), got.tolist()))
+    _, got = index.search(x[:300], 10)
+    assert not set(got.ravel().tolist()) & set(removed.tolist())
+    if kind != "ivf_pq":
+        ann_index.enable_reconstruct(index, params)
+        assert np.allclose(index.reconstruct(301), x[301], atol=1e-6)
+        assert np.allclose(index.reconstruct(1), x[1], atol=1e-6)
+
+def test_round_trip_keeps_ids(faiss, tmp_path):
+    x = _vectors(300)
+    index, params = ann_index.build_ann_index(x, ids=np.arange(1000, 1300), type="ivf_flat", nlist=4)
+    path = str(tmp_path / "index.faiss")
+    ann_index.save_index(index, path, params)
+    index, params = ann_index.load_index(path)
+    assert params["nlist"] == 4 and ann_index.supports_remove(params, index)
+    _, got = index.search(x[:5], 1)
+    assert got[:, 0].tolist() == list(range(1000, 1005))
+
+def test_legacy_id_mapped_ivf_is_rebuilt(faiss):
+    x = _vectors(300)
+    params = {**ann_index.DEFAULT_PARAMS, "type": "ivf_flat", "nlist": 4}
+    inner = ann_index.make_index(x.shape[1], params, len(x))
+    ann_index.train_index(inner, x, params)
+    assert not ann_index.supports_remove(params, faiss.IndexIDMap2(inner))
+    assert ann_index.supports_remove(params, inner)
+    assert not ann_index.supports_remove({**params, "type": "hnsw"})
+
+def test_rebuild_params_keeps_stored_build():
+    params = {**ann_index.DEFAULT_PARAMS, "type": "ivf_pq", "nlist": 512, "pq_m": 8, "nprobe": 32}
+    got = ann_index.rebuild_params(params)
+    assert "type" not in got
+    assert got["nlist"] == 512 and got["pq_m"] == 8 and got["nprobe"] == 32
+    assert "nlist" not in ann_index.rebuild_params(dict(ann_index.DEFAULT_PARAMS))
+
+@pytest.mark.parametrize("emb_model, kind", [("old-model", "ivf_pq"), (embed_index_gpu.EMB_MODEL, "hnsw")])
+def test_update_fallback_rebuilds_with_stored_params(monkeypatch, tmp_path, emb_model, kind):
+    manifest, index_file = str(tmp_path / "manifest.json"), str(tmp_path / "index.faiss")
+    save_json({"emb_model": emb_model, "next_id": 1,
+               "docs": {"gone": {"hash": "h", "chunks": {"gone_0": {"hash": "c", "id": 0}}}}}, manifest)
+    open(index_file, "w").close()
+    params = {**ann_index.DEFAULT_PARAMS, "type": kind, "nlist": 64, "pq_m": 8, "hnsw_m": 48, "ef_search": 96}
+    calls = []
+    monkeypatch.setattr(embed_index_gpu, "MANIFEST_FILE", manifest)
+    monkeypatch.setattr(embed_index_gpu, "INDEX_FILE", index_file)
+    monkeypatch.setattr(ann_index, "load_index", lambda path: (object(), dict(params)))
+    monkeypatch.setattr(embed_index_gpu, "build_index", lambda chunks, **kw: calls.append(kw))
+    embed_index_gpu.update_index([], neighbors_k=5)
+    assert calls == [{"index_type": kind, "neighbors_k": 5, **ann_index.rebuild_params(params)}]
+    assert calls[0]["nlist"] == 64 and calls[0]["hnsw_m"] == 48
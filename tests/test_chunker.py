@@ -0,0 +1,91 @@
+# tests/test_chunker.py
+import re
+
+import chunker
+
+class WordTokenizer:
+    """Whitespace tokens with character offsets, shaped like a Hugging Face tokenizer's output."""
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        spans = [[m.span() for m in re.finditer(r"\S+", t)] for t in texts]
+        out = {"input_ids": [list(range(len(s))) for s in spans]}
+        if return_offsets_mapping:
+            out["offset_mapping"] = spans
+        return out
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+TOK = WordTokenizer()
+
+def _sentence(i, n=8):
+    return "Sentence %d " % i + " ".join(f"w{i}x{j}" for j in range(n - 3)) + " end."
+
+def _chunks(text, max_tokens=22, overlap=6, **kw):
+    return chunker.chunk_text("doc", text, tokenizer=TOK, max_tokens=max_tokens, overlap=overlap, **kw)
+
+def test_chunks_are_bounded_exact_slices():
+    text = "\n\n".join(" ".join(_sentence(p * 10 + i) for i in range(5)) for p in range(3))
+    chunks = _chunks(text)
+    assert len(chunks) > 3
+    for c in chunks:
+        m = c["meta"]
+        assert c["text"] == text[m["start"]:m["end"]]
+        assert m["n_tokens"] == len(c["text"].split()) <= 20
+    # together the chunks cover every word of the document
+    assert set(text.split()) == {w for c in chunks for w in c["text"].split()}
+
+def test_paragraphs_that_fit_are_not_split():
+    paras = [_sentence(1), " ".join([_sentence(2, n=4), _sentence(3, n=4)]), _sentence(4)]
+    text = "\n\n".join(paras)
+    chunks = _chunks(text, max_tokens=20)
+    # 8 + 8 tokens share a chunk; the third paragraph starts a new one instead of being cut
+    assert [c["text"] for c in chunks] == ["\n\n".join(paras[:2]), paras[2]]
+
+def test_overlap_inside_a_paragraph():
+    text = " ".join(_sentence(i, n=5) for i in range(8))
+    chunks = _chunks(text, max_tokens=17, overlap=5)
+    assert len(chunks) > 1
+    for a, b in zip(chunks, chunks[1:]):
+        assert b["meta"]["start"] < a["meta"]["end"]  # the last sentence of a repeats in b
+        assert a["text"].endswith(text[b["meta"]["start"]:a["meta"]["end"]])
+
+def test_long_sentences_are_cut_at_words():
+    text = " ".join(f"word{i}" for i in range(50)) + "."
+    chunks = _chunks(text, max_tokens=12)
+    assert [len(c["text"].split()) for c in chunks] == [10] * 5
+    assert " ".join(c["text"] for c in chunks) == text
+
+def test_abbreviations_do_not_end_sentences():
+    text = "Notification No. 12 of 2023 amends Rule 5. Penalty is Rs. 500 per day."
+    assert [text[s:e] for s, e in chunker._sentences(text, 0, len(text))] == [
+        "Notification No. 12 of 2023 amends Rule 5.", "Penalty is Rs. 500 per day."]
+
+def test_ids_survive_edits_elsewhere():
+    paras = [_sentence(1), _sentence(2), _sentence(3)]
+    before = _chunks("\n\n".join(paras), max_tokens=12)
+    after = _chunks("\n\n".join([paras[0], _sentence(9), paras[2]]), max_tokens=12)
+    assert before[0]["chunk_id"] == after[0]["chunk_id"] and before[2]["chunk_id"] == after[2]["chunk_id"]
+    assert before[1]["chunk_id"] != after[1]["chunk_id"]
+    dup = _chunks(paras[0] + "\n\n" + paras[0], max_tokens=12)
+    assert dup[0]["chunk_id"] != dup[1]["chunk_id"]
+
+def test_pages():
+    text = _sentence(1) + "\n\n" + _sentence(2)
+    chunks = _chunks(text, max_tokens=12, page_starts=[0, text.index("Sentence 2")])
+    assert [c["meta"]["page"] for c in chunks] == [1, 2]
+
+def test_tables_repeat_the_header():
+    csv_text = "item,fy2022,fy2023\n" + "".join(f"line {i},{i},{i + 1}\n" for i in range(10))
+    chunks = chunker.chunk_table("doc", {"table_id": "t1", "page": 3, "csv": csv_text}, tokenizer=TOK, max_tokens=12)
+    assert len(chunks) > 1
+    assert all(c["text"].startswith("item,fy2022,fy2023\n") for c in chunks)
+    assert chunks[0]["meta"]["row_start"] == 1 and chunks[-1]["meta"]["row_end"] == 11
+    assert all(a["meta"]["row_end"] == b["meta"]["row_start"] for a, b in zip(chunks, chunks[1:]))
+    assert all(c["meta"]["page"] == 3 and c["meta"]["type"] == "table" for c in chunks)
+
+def test_doc_chunks_rechunks_old_files():
+    new = {"id": "d", "chunks": [{"chunk_id": "d_1", "text": "x", "meta": {}}]}
+    assert chunker.doc_chunks(new) is new["chunks"]
+    old = {"filename": "d.pdf", "chunks": ["First part.", "Second part."]}
+    chunks = chunker.doc_chunks(old, "d", tokenizer=TOK)
+    assert [c["text"] for c in chunks] == ["First part. Second part."]
@@ -0,0 +1,36 @@
+# tests/test_doc_attrs.py
+from doc_attrs import doc_attributes, fiscal_year_of, matches, query_filters
+
+CBIC = ("Government of India Ministry of Finance (Department of Revenue) Central Board of Indirect Taxes "
+        "and Customs Notification No. 03/2025-Central Tax New Delhi, dated the 5th January, 2024")
+
+def test_doc_attributes_from_the_header():
+    assert doc_attributes("ct-03-2025", CBIC) == {"issuer": "CBIC", "doc_type": "notification", "number": "03/2025",
+                                                  "date": "2024-01-05", "year": 2024, "fiscal_year": 2024}
+
+def test_doc_attributes_fallbacks():
+    rbi = doc_attributes("RBI_20230512_x", "RESERVE BANK OF INDIA circular no. 12 on lending")
+    assert (rbi["issuer"], rbi["doc_type"], rbi["date"], rbi["fiscal_year"]) == ("RBI", "circular", "2023-05-12", 2024)
+    assert doc_attributes("tbl", "", tables=[{}])["doc_type"] == "table"
+    undated = doc_attributes("misc", "Annual report for financial year 2022-23")
+    assert (undated["doc_type"], undated["date"], undated["fiscal_year"]) == ("document", None, 2023)
+
+def test_fiscal_year_of():
+    assert fiscal_year_of("2024-03-31") == 2024 and fiscal_year_of("2024-04-01") == 2025
+    assert fiscal_year_of("2024-04-01", start_month=1) == 2024
+
+def test_matches():
+    attrs = {"doc_id": "a", "issuer": "CBIC", "fiscal_year": 2024, "number": None}
+    assert matches(attrs, None) and matches(attrs, {"issuer": None})
+    assert matches(attrs, {"issuer": "CBIC", "fiscal_year": {"gte": 2023, "lt": 2025}})
+    assert not matches(attrs, {"fiscal_year": {"gt": 2024}})
+    assert matches(attrs, {"doc_id": ["a", "b"]}) and not matches(attrs, {"doc_id": {"b"}})
+    assert not matches(attrs, {"number": {"gte": "01/2024"}})  # ranges never match a missing value
+    assert matches(attrs, {"issuer": lambda v: v.startswith("CB")})
+
+def test_query_filters():
+    q = "What did Notification No. 03/2025 in ct-03-2025 change for FY23?"
+    assert query_filters(q, ["ct-03-2025", "other"]) == {"fiscal_year": 2023, "number": "03/2025",
+                                                         "doc_id": ["ct-03-2025"]}
+    assert query_filters("revenue in financial year 2022-23") == {"fiscal_year": 2023}
+    assert query_filters("what is GST?") == {}
@@ -0,0 +1,40 @@
+# tests/test_embed_index.py
+import pytest
+
+import ann_index
+import embed_index_gpu
+from embed_index_gpu import EMB_MODEL, _check_resumable, _next_checkpoint
+
+def _state(**params):
+    return {"emb_model": EMB_MODEL, "params": {**ann_index.DEFAULT_PARAMS, "type": "ivf_pq", "nlist": 256, **params},
+            "next_id": 1000, "docs": {}}
+
+def test_resume_accepts_the_same_build():
+    _check_resumable(_state(), "ivf_pq", {})
+    _check_resumable(_state(), "ivf_pq", {"nlist": 256, "pq_m": 16, "hnsw_m": None})
+
+@pytest.mark.parametrize("index_type, params", [("flat", {}), ("ivf_pq", {"nlist": 1024}), ("ivf_pq", {"pq_m": 8})])
+def test_resume_refuses_a_different_build(index_type, params):
+    with pytest.raises(ValueError, match="without --resume"):
+        _check_resumable(_state(), index_type, params)
+
+def test_resume_refuses_a_different_model():
+    with pytest.raises(ValueError, match="emb_model"):
+        _check_resumable({**_state(), "emb_model": "other"}, "ivf_pq", {})
+
+def test_checkpoint_io_stays_linear():
+    every, n, written = 20 * 256, 10_000_000, 0
+    at = _next_checkpoint(0, every)
+    while at <= n:
+        written += at  # each checkpoint writes the whole partial index
+        at = _next_checkpoint(at, every)
+    assert written < (embed_index_gpu.CHECKPOINT_GROWTH + 2) * n
+    assert _next_checkpoint(0, every) == every
+
+def test_reservoir_sample_covers_the_whole_stream():
+    sample = embed_index_gpu.reservoir_sample(iter(range(10_000)), 500, seed=1)
+    assert len(sample) == 500 == len(set(sample)) and sample == sorted(sample)
+    # a document-ordered corpus: every tenth of the stream is represented, not just the first
+    assert all(20 <= sum(lo <= x < lo + 1000 for x in sample) <= 80 for lo in range(0, 10_000, 1000))
+    assert sample == embed_index_gpu.reservoir_sample(range(10_000), 500, seed=1)
+    assert embed_index_gpu.reservoir_sample(range(3), 5) == [0, 1, 2]
@@ -0,0 +1,87 @@
+# tests/test_embedding_cache.py
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, text_key
+
+class Encoder:
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.stack([np.random.default_rng(abs(hash(t)) % 2**32).standard_normal(self.dim) for t in texts])
+
+@pytest.fixture
+def cache(tmp_path):
+    c = EmbeddingCache("model", path=str(tmp_path))
+    yield c
+    c.close()
+
+def test_encode_only_misses(cache):
+    enc = Encoder()
+    first = cache.encode(["a", "b", "a"], enc)
+    assert enc.calls == [["a", "b"]] and first.shape == (3, 4) and first.dtype == np.float32
+    second = cache.encode(["b  ", "c", "a"], enc)  # whitespace-normalized "b " is a hit
+    assert enc.calls[1] == ["c"]
+    assert np.array_equal(second[0], first[1]) and np.array_equal(second[2], first[0])
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 3
+
+def test_persists_per_model_revision(tmp_path):
+    enc = Encoder()
+    c = EmbeddingCache("model", "rev1", path=str(tmp_path))
+    c.encode(["a"], enc)
+    c.close()
+    c = EmbeddingCache("model", "rev1", path=str(tmp_path))
+    assert text_key("a") in c.get_many([text_key("a")])
+    c.close()
+    other = EmbeddingCache("model", "rev2", path=str(tmp_path))
+    assert other.get_many([text_key("a")]) == {}
+    other.close()
+
+def test_hits_do_not_commit(cache, monkeypatch):
+    cache.encode(["a", "b"], Encoder())
+    before = cache._db.total_changes
+    for _ in range(20):
+        cache.get_many([text_key("a")])
+    assert cache._db.total_changes == before
+    monkeypatch.setattr(embedding_cache, "LAST_USED_FLUSH_S", 0)
+    cache.get_many([text_key("a")])
+    assert cache._db.total_changes > before and not cache._used
+
+def test_eviction_keeps_the_active_shard(cache, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "SHARD_ROWS", 4)
+    enc = Encoder()
+    cache.encode([f"t{i}" for i in range(10)], enc)  # shards 0, 1 full, shard 2 has 2 rows
+    cache.get_many([text_key("t0")])  # shard 0 is used most recently, shard 1 least
+    cache.max_bytes = 7 * 4 * 4       # seven float32 rows of dim 4
+    cache.encode(["t10"], enc)
+    shards = [s for s, in cache._db.execute("SELECT shard FROM shards ORDER BY shard")]
+    assert shards == [0, 2]
+    cache.max_bytes = 0               # even then the shard being appended to stays
+    cache.encode(["t11"], enc)
+    assert [s for s, in cache._db.execute("SELECT shard FROM shards")] == [2]
+    assert set(cache.get_many([text_key(t) for t in ("t8", "t10", "t11")])) == {text_key(t) for t in ("t8", "t10", "t11")}
+
+def test_buffered_misses_are_written_in_batches(cache, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "PENDING_ROWS", 3)
+    enc = Encoder()
+    before = cache._db.total_changes
+    first = cache.encode(["q1", "q2"], enc, buffer=True)
+    assert cache._db.total_changes == before and cache.get_many([text_key("q1")]) == {}
+    assert np.array_equal(cache.encode(["q1"], enc, buffer=True)[0], first[0]) and len(enc.calls) == 1
+    cache.encode(["q3"], enc, buffer=True)  # the third pending row triggers the write
+    assert not cache._pending and set(cache.get_many([text_key(q) for q in ("q1", "q2", "q3")])) == \
+        {text_key(q) for q in ("q1", "q2", "q3")}
+
+def test_float32_is_exact_and_close_flushes(tmp_path):
+    enc = Encoder()
+    c = EmbeddingCache("model", path=str(tmp_path))
+    out = c.encode(["a"], enc, buffer=True)
+    assert np.array_equal(out[0], enc(["a"])[0].astype(np.float32))
+    c.close()
+    c = EmbeddingCache("model", path=str(tmp_path))
+    assert text_key("a") in c.get_many([text_key("a")])
+    c.close()
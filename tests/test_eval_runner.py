@@ -0,0 +1,78 @@
+# tests/test_eval_runner.py
+import json
+
+import pytest
+
+import eval_runner
+from eval_runner import claim_label_matches, load_results, normalize_answer, numeric_match, summarize, token_f1
+
+def test_normalize_answer():
+    assert normalize_answer("The net income was $96,995 million.") == "net income was 96995 million"
+    assert normalize_answer("Margin: 4.5%") == "margin 4.5%"
+
+def test_token_f1():
+    assert token_f1("net income rose", "net income rose") == 1.0
+    assert token_f1("", "") == 1.0 and token_f1("x", "") == 0.0
+    assert token_f1("net income of apple", "apple net income rose") == pytest.approx(2 * (3 / 4) * (3 / 4) / 1.5)
+
+def test_numeric_match():
+    assert numeric_match("Net income was $96,995 million", "96995")
+    assert numeric_match("about 4.51%", "4.5%", rel_tol=0.01)
+    assert not numeric_match("96,000", "96995")
+    assert not numeric_match("anything", "no numbers here")
+
+def test_claim_label_matches_aligns_by_f1():
+    verifications = [{"claim": "Apple net income was 97 billion", "p_entail": 0.9},
+                     {"claim": "Revenue fell sharply in 2023", "p_entail": 0.1}]
+    gold = [{"claim": "apple net income was 97 billion", "label": "supported"},
+            {"claim": "revenue fell sharply in 2023", "label": True},
+            {"claim": "something unrelated entirely", "label": "refuted"}]
+    assert claim_label_matches(verifications, gold) == [(True, True), (True, False)]
+
+def _record(answer, gold, claims, **timings):
+    return {"answer": answer, "gold_answers": gold, "timings": timings, "latency": sum(timings.values()),
+            "verifications": [{"claim": c, "p_entail": p, "mes": ["x"] * n, "fragility": 0.5} for c, p, n in claims],
+            "gold_claim_labels": [{"claim": claims[0][0], "label": "refuted"}]}
+
+def test_summarize():
+    records = [_record("96,995 million", ["$96,995 million"], [("income was 96995", 0.2, 2)], retrieve=0.1, generate=0.3),
+               _record("no idea", ["42"], [("claim two", 0.9, 1), ("claim three", 0.1, 3)], retrieve=0.2, generate=0.5)]
+    s = summarize(records, wall_seconds=2.0)
+    assert s["items"] == 2 and s["throughput_items_per_s"] == 1.0
+    assert s["answer_em"] == 0.5 and s["answer_numeric"] == 0.5
+    assert s["claims"] == 3 and s["hallucination_rate"] == pytest.approx(2 / 3) and s["mes_size"] == 2.0
+    assert s["latency"]["retrieve"]["p50_ms"] == pytest.approx(150.0)
+    assert s["latency"]["verify"] == {}
+    # gold says both aligned claims are unsupported; the verifier flags the first, not the second
+    assert s["gold_claims_matched"] == 2 and s["claim_label_accuracy"] == 0.5
+    assert s["hallucination_precision"] == 1.0 and s["hallucination_recall"] == 0.5
+
+def test_load_results_drops_a_torn_line(tmp_path):
+    path = tmp_path / "eval.jsonl"
+    path.write_text(json.dumps({"id": "1"}) + "\n" + json.dumps({"id": "2"}) + "\n" + '{"id": "3", "ans')
+    assert [r["id"] for r in load_results(str(path))] == ["1", "2"]
+    assert path.read_text().endswith('{"id": "2"}\n')
+    assert load_results(str(tmp_path / "missing.jsonl")) == []
+
+def test_timed_records_stage_time():
+    batches = [[{"id": "a", "timings": {}}, {"id": "b", "timings": {}}]]
+    out = list(eval_runner._timed("generate", lambda b: None, iter(batches)))
+    assert out == batches and all("generate" in r["timings"] for r in out[0])
+
+def test_verify_uses_the_shared_helper():
+    for mod in ("torch", "nltk"):
+        pytest.importorskip(mod)
+    import evaluate
+
+    class Verifier:
+        def predict(self, claim, texts):
+            return 0.9 if any("96995" in t for t in texts) else 0.1
+
+        def predict_batch(self, pairs):
+            return [self.predict(c, t) for c, t in pairs]
+
+    evidence = [{"chunk_id": "c1", "text": "net income 96995"}, {"chunk_id": "c2", "text": "unrelated"}]
+    batch = [{"answer": "Net income was 96995 [1].", "_evidence": evidence}]
+    eval_runner._verify(batch, Verifier(), "greedy", 0, None)
+    assert batch[0]["verifications"] == evaluate.verify_answers([batch[0]["answer"]], [evidence], Verifier(), n_perturb=0)[0]
+    assert batch[0]["verifications"][0]["mes"] == ["c1"] and batch[0]["verifications"][0]["citations"] == ["1"]
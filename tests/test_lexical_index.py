@@ -0,0 +1,77 @@
+# tests/test_lexical_index.py
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from lexical_index import K1, B, LexicalIndex, build_bm25, tokenize, update_bm25
+
+TEXTS = {
+    0: "Apple net income for FY2023 was 96,995 million",
+    1: "Revenue of Apple in fy2023 grew; gstr-3b filed",
+    2: "Microsoft revenue 211,915 million in FY2023",
+    3: "Tesla automotive revenue and regulatory credits",
+    4: "Net income attributable to shareholders",
+    5: "Apple services revenue reached a record",
+}
+QUERIES = ["apple net income fy2023", "revenue million", "gstr-3b", "tesla credits", "record services apple"]
+
+def _bm25(texts, query):
+    """Reference BM25 over {row: text}."""
+    toks = {r: tokenize(t) for r, t in texts.items()}
+    n, avgdl = len(toks), sum(map(len, toks.values())) / len(toks)
+    out = {}
+    for r, ts in toks.items():
+        tf, s = Counter(ts), 0.0
+        for t in set(tokenize(query)):
+            if tf[t]:
+                df = sum(t in x for x in toks.values())
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                s += idf * tf[t] * (K1 + 1) / (tf[t] + K1 * (1 - B + B * len(ts) / avgdl))
+        out[r] = s
+    return out
+
+def _scores(index, query, n):
+    s = index.scores(query)
+    return np.pad(s, (0, max(0, n - len(s))))[:n]
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("GSTR-3B for FY2023: 1,234.5 crore") == ["gstr-3b", "for", "fy2023", "1234.5", "crore"]
+
+def test_scores_match_reference(tmp_path):
+    index = build_bm25(TEXTS.items(), str(tmp_path))
+    for q in QUERIES:
+        ref = _bm25(TEXTS, q)
+        assert np.allclose(_scores(index, q, 6), [ref[r] for r in range(6)], atol=1e-5)
+    assert LexicalIndex.exists(str(tmp_path))
+
+def test_search_and_score_rows(tmp_path):
+    index = build_bm25(TEXTS.items(), str(tmp_path))
+    rows, scores = index.search("apple revenue", 2)
+    assert len(rows) == 2 and scores[0] >= scores[1] > 0
+    rows, _ = index.search("apple revenue", 10, rows=np.array([2, 3, 99]))
+    assert set(rows.tolist()) <= {2, 3}
+    assert index.score_rows("apple", [0, 3, -1, 99]).tolist()[1:] == [0.0, 0.0, 0.0]
+
+@pytest.mark.parametrize("merge_fraction", [0.0, 10.0])
+def test_update_matches_full_rebuild(tmp_path, merge_fraction):
+    path = str(tmp_path / "bm25")
+    build_bm25([(r, TEXTS[r]) for r in range(4)], path)
+    update_bm25([(4, TEXTS[4])], [(1, TEXTS[1])], path, merge_fraction=merge_fraction)
+    index = update_bm25([(5, TEXTS[5]), (7, "Apple revenue restated")], [(2, TEXTS[2])], path,
+                        merge_fraction=merge_fraction)
+    live = {0: TEXTS[0], 3: TEXTS[3], 4: TEXTS[4], 5: TEXTS[5], 7: "Apple revenue restated"}
+    full = build_bm25(live.items(), str(tmp_path / "full"))
+    assert len(index.segments) == (1 if merge_fraction == 0.0 else 2)
+    for q in QUERIES:
+        assert np.allclose(_scores(index, q, 8), _scores(full, q, 8), atol=1e-5)
+        ref = _bm25(live, q)
+        assert np.allclose([_scores(index, q, 8)[r] for r in live], [ref[r] for r in live], atol=1e-5)
+    rows, _ = index.search("microsoft revenue fy2023", 10)
+    assert not {1, 2} & set(rows.tolist())
+
+def test_update_rejects_indexed_rows(tmp_path):
+    build_bm25(TEXTS.items(), str(tmp_path))
+    with pytest.raises(ValueError):
+        update_bm25([(3, "again")], path=str(tmp_path))
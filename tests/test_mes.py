@@ -0,0 +1,82 @@
+# tests/test_mes.py
+import pytest
+from mes import STRATEGIES, minimal_evidence_set
+
+def candidates(n):
+    return [{"chunk_id": f"c{i}", "text": f"t{i}"} for i in range(n)]
+
+class Verifier:
+    """Entails (0.95) iff every required chunk is present; records every evidence list it scores."""
+    def __init__(self, required):
+        self.required = set(required)
+        self.scored = []
+
+    def predict(self, claim, texts):
+        self.scored.append(tuple(texts))
+        return 0.95 if self.required <= set(texts) else 0.1
+
+    def predict_batch(self, pairs):
+        return [self.predict(c, t) for c, t in pairs]
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+@pytest.mark.parametrize("required", [{"t3"}, {"t1", "t6"}, {"t0", "t4", "t7"}])
+def test_finds_the_minimal_set(strategy, required):
+    v = Verifier(required)
+    S, p = minimal_evidence_set("claim", candidates(8), v.predict, verifier_predict_batch=v.predict_batch,
+                                strategy=strategy)
+    assert {c["text"] for c in S} == required
+    assert p == 0.95
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_probability_was_scored_on_the_returned_set(strategy):
+    v = Verifier({"t2", "t5"})
+    S, p = minimal_evidence_set("claim", candidates(8), v.predict, verifier_predict_batch=v.predict_batch,
+                                strategy=strategy)
+    texts = tuple(c["text"] for c in S)
+    assert texts in v.scored
+    assert [c["chunk_id"] for c in S] == sorted(c["chunk_id"] for c in S)  # returned in relevance order
+
+def test_importance_rescores_the_relevance_ordered_set():
+    # t4 alone scores higher than t1, so importance order (t4, t1) differs from relevance order (t1, t4);
+    # the verifier is order-sensitive, so the returned p must belong to exactly the returned list
+    def predict(claim, texts):
+        if {"t1", "t4"} <= set(texts):
+            return 0.9 + 0.01 * texts.index("t4")
+        return 0.3 if "t4" in texts else 0.2 if "t1" in texts else 0.0
+    S, p = minimal_evidence_set("claim", candidates(6), predict,
+                                verifier_predict_batch=lambda pairs: [predict(*x) for x in pairs], strategy="importance")
+    assert [c["text"] for c in S] == ["t1", "t4"]
+    assert p == predict("claim", ["t1", "t4"])
+
+def test_below_threshold_returns_empty():
+    v = Verifier({"missing"})
+    assert minimal_evidence_set("claim", candidates(4), v.predict) == ([], 0.1)
+    assert minimal_evidence_set("claim", [], v.predict) == ([], 0.0)
+
+def test_stats_and_unknown_strategy():
+    v = Verifier({"t1"})
+    stats = {}
+    minimal_evidence_set("claim", candidates(16), v.predict, strategy="quickxplain", stats=stats)
+    assert 0 < stats["verifier_calls"] < 16
+    with pytest.raises(ValueError):
+        minimal_evidence_set("claim", candidates(2), v.predict, strategy="nope")
+
+def test_quickxplain_needs_fewer_calls_than_greedy():
+    counts = {}
+    for strategy in ("greedy", "quickxplain"):
+        stats = {}
+        v = Verifier({"t3"})
+        minimal_evidence_set("claim", candidates(32), v.predict, strategy=strategy, stats=stats)
+        counts[strategy] = stats["verifier_calls"]
+    assert counts["quickxplain"] < counts["greedy"]
+
+def test_batched_greedy_counts_sequential_calls_and_pairs_separately():
+    results = {}
+    for batch in (False, True):
+        v, stats = Verifier({"t3"}), {}
+        S, _ = minimal_evidence_set("claim", candidates(8), v.predict, strategy="greedy", stats=stats,
+                                    verifier_predict_batch=v.predict_batch if batch else None)
+        results[batch] = ([c["text"] for c in S], stats)
+    (seq_S, seq), (bat_S, bat) = results[False], results[True]
+    assert seq_S == bat_S and bat["verifier_calls"] == seq["verifier_calls"] == seq["verifier_pairs"]
+    assert bat["verifier_pairs"] > bat["verifier_calls"] and bat["verifier_batches"] < seq["verifier_batches"]
@@ -0,0 +1,78 @@
+# tests/test_meta_store.py
+import os
+import numpy as np
+import pytest
+
+from meta_store import MetaStore
+
+def _chunk(doc, i, text=None, **meta):
+    return {"doc_id": doc, "chunk_id": f"{doc}_{i}", "text": text or f"text {doc} {i}", "meta": meta}
+
+def test_append_and_get(tmp_path):
+    store = MetaStore.create([(0, _chunk("a", 0, page=1)), (1, _chunk("a", 1, "ünïcode – text"))], str(tmp_path))
+    store.append([(2, _chunk("b", 0))])
+    assert len(store) == 3
+    assert store.get(0) == {"doc_id": "a", "chunk_id": "a_0", "text": "text a 0", "meta": {"page": 1}}
+    assert store.text(1) == "ünïcode – text"
+    assert bytes(store.text_bytes(1)).decode("utf-8") == "ünïcode – text"
+    assert store.get(2)["doc_id"] == "b"
+    assert store.get(3) is None and store.get(-1) is None
+    assert store.docs == ["a", "b"]
+
+def test_reopen_reads_the_same_rows(tmp_path):
+    rows = [(i, _chunk(f"d{i % 3}", i)) for i in range(10)]
+    MetaStore.create(rows[:4], str(tmp_path)).append(rows[4:])
+    store = MetaStore(str(tmp_path))
+    assert [store.get(i) for i in range(10)] == [{**c, "meta": {}} for _, c in rows]
+
+def test_gaps_are_dead_rows(tmp_path):
+    store = MetaStore.create([(0, _chunk("a", 0)), (3, _chunk("a", 3))], str(tmp_path))
+    assert len(store) == 4
+    assert store.alive.tolist() == [1, 0, 0, 1]
+    assert store.get(1) is None and store.get(3)["chunk_id"] == "a_3"
+
+def test_append_rejects_existing_ids(tmp_path):
+    store = MetaStore.create([(0, _chunk("a", 0)), (1, _chunk("a", 1))], str(tmp_path))
+    with pytest.raises(ValueError):
+        store.append([(1, _chunk("a", 9))])
+
+def test_delete(tmp_path):
+    store = MetaStore.create([(i, _chunk("a", i)) for i in range(5)], str(tmp_path))
+    store.delete([1, 3, 99])
+    assert [store.get(i) is not None for i in range(5)] == [True, False, True, False, True]
+    assert MetaStore(str(tmp_path)).alive.tolist() == [1, 0, 1, 0, 1]
+    store.append([(5, _chunk("a", 5))])
+    assert store.get(5)["chunk_id"] == "a_5" and store.get(3) is None
+
+def test_truncate_then_append(tmp_path):
+    store = MetaStore.create([(i, _chunk("a", i)) for i in range(6)], str(tmp_path))
+    store.truncate(4)
+    assert len(store) == 4
+    store.append([(4, _chunk("b", 4, "replacement"))])
+    assert len(store) == 5 and store.text(4) == "replacement"
+    assert store.text(3) == "text a 3"
+
+def test_partial_append_is_cut(tmp_path):
+    store = MetaStore.create([(0, _chunk("a", 0))], str(tmp_path))
+    # a crash after the string columns were written but before alive.u8: the tail is ignored
+    with open(os.path.join(str(tmp_path), "text.bin"), "ab") as f:
+        f.write(b"garbage")
+    store = MetaStore(str(tmp_path))
+    assert len(store) == 1
+    store.append([(1, _chunk("a", 1))])
+    assert store.text(0) == "text a 0" and store.text(1) == "text a 1"
+
+def test_rows_matching(tmp_path):
+    a = {"issuer": "CBIC", "fiscal_year": 2024}
+    b = {"issuer": "RBI", "fiscal_year": 2023}
+    store = MetaStore.create([(0, {**_chunk("a", 0), "attrs": a}), (1, _chunk("a", 1)),
+                              (2, {**_chunk("b", 0), "attrs": b}), (4, _chunk("c", 0))], str(tmp_path))
+    assert store.doc_attrs == [a, b, {}]
+    assert store.rows_matching({"issuer": "CBIC"}).tolist() == [0, 1]
+    assert store.rows_matching({"fiscal_year": {"gte": 2023}}).tolist() == [0, 1, 2]
+    assert store.rows_matching({"doc_id": ["b", "c"]}).tolist() == [2, 4]
+    assert store.rows_matching({}).tolist() == [0, 1, 2, 4]  # the gap at 3 is a dead row
+    assert store.rows_matching({"issuer": "SEBI"}).dtype == np.int64
+    store.delete([1])
+    store.set_doc_attrs({"b": {"issuer": "CBIC"}, "zz": {"issuer": "CBIC"}})
+    assert MetaStore(str(tmp_path)).rows_matching({"issuer": "CBIC"}).tolist() == [0, 2]
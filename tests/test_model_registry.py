@@ -0,0 +1,75 @@
+# tests/test_model_registry.py
+import pytest
+import model_registry
+from model_registry import ModelRegistry
+
+class Blob:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def get_memory_footprint(self):
+        return self.nbytes
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load(path, precision):
+        calls.append((path, precision))
+        return Blob(int(path.split(":")[1]) * 2**20)
+    monkeypatch.setitem(model_registry.LOADERS, "blob", load)
+    return calls
+
+def test_loads_once_per_key(loads):
+    reg = ModelRegistry()
+    a = reg.get("blob", "a:1")
+    assert reg.get("blob", "a:1") is a
+    reg.get("blob", "a:1", "int8")
+    assert loads == [("a:1", "fp32"), ("a:1", "int8")]
+
+def test_max_models_evicts_least_recently_used(loads):
+    reg = ModelRegistry(max_models=2)
+    reg.get("blob", "a:1")
+    reg.get("blob", "b:1")
+    reg.get("blob", "a:1")  # a is now the most recent
+    reg.get("blob", "c:1")
+    assert [m["path"] for m in reg.memory_report()] == ["a:1", "c:1"]
+
+def test_memory_budget_keeps_the_new_model(loads):
+    reg = ModelRegistry(memory_budget_mb=3)
+    reg.get("blob", "a:2")
+    reg.get("blob", "b:2")
+    assert [m["path"] for m in reg.memory_report()] == ["b:2"]
+    reg.get("blob", "c:5")  # over budget on its own, but never evicted while being loaded
+    assert [m["path"] for m in reg.memory_report()] == ["c:5"]
+    assert reg.total_mb() == 5
+
+def test_evict_and_clear(loads):
+    reg = ModelRegistry()
+    reg.get("blob", "a:1")
+    reg.get("blob", "b:1")
+    reg.evict("blob", "a:1")
+    reg.evict("blob", "missing:1")
+    assert [m["path"] for m in reg.memory_report()] == ["b:1"]
+    reg.clear()
+    assert reg.memory_report() == []
+
+def test_evicted_model_still_in_use_is_counted_and_reused(loads):
+    reg = ModelRegistry(max_models=1)
+    held = reg.get("blob", "a:2")  # a caller keeps a reference past the eviction
+    reg.get("blob", "b:1")
+    report = {m["path"]: m["evicted"] for m in reg.memory_report()}
+    assert report == {"b:1": False, "a:2": True} and reg.total_mb() == 3
+    assert reg.get("blob", "a:2") is held and loads == [("a:2", "fp32"), ("b:1", "fp32")]
+    del held
+    reg.get("blob", "c:1")  # evicts a, which is now released
+    assert [m["path"] for m in reg.memory_report()] == ["c:1"] and reg.total_mb() == 1
+
+def test_budget_counts_models_held_elsewhere(loads):
+    reg = ModelRegistry(memory_budget_mb=4)
+    reg.get("blob", "a:1")
+    held = reg.get("blob", "b:3")
+    reg.evict("blob", "b:3")
+    reg.get("blob", "c:1")  # a + c fit, but b is still in memory, so a goes
+    assert [(m["path"], m["evicted"]) for m in reg.memory_report()] == [("c:1", False), ("b:3", True)]
+    assert held is not None
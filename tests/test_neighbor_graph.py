@@ -0,0 +1,83 @@
+# tests/test_neighbor_graph.py
+import numpy as np
+
+from neighbor_graph import NeighborGraph, build_neighbor_graph, update_neighbor_graph
+
+class ExactIndex:
+    """Brute-force inner-product index keyed by vector id, with the FAISS calls the graph uses."""
+    def __init__(self):
+        self.vecs = {}
+
+    def add(self, ids, vecs):
+        self.vecs.update(zip(ids, vecs))
+
+    def remove(self, ids):
+        for i in ids:
+            del self.vecs[i]
+
+    def reconstruct_batch(self, rows):
+        return np.stack([self.vecs[int(r)] for r in rows])
+
+    def search(self, q, k):
+        keys = np.array(sorted(self.vecs))
+        sims = q @ np.stack([self.vecs[i] for i in keys]).T
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(sims, order, 1), keys[order]
+
+class Store:
+    def __init__(self, n):
+        self.alive = np.ones(n, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.alive)
+
+def _vectors(n, d=8, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def test_build(tmp_path):
+    x = _vectors(50)
+    index, store = ExactIndex(), Store(50)
+    index.add(range(50), x)
+    store.alive[7] = 0
+    index.remove([7])
+    g = build_neighbor_graph(index, store, k=5, path=str(tmp_path))
+    rows, sims = g.neighbors(0)
+    exact = np.argsort(-(x[1:] @ x[0]))
+    exact = [i + 1 for i in exact if i + 1 != 7][:5]
+    assert rows.tolist() == exact and np.all(np.diff(sims.astype(float)) <= 1e-3)
+    assert len(g.neighbors(7)[0]) == 0 and len(g.neighbors(99)[0]) == 0
+
+def test_update_patches_changed_rows(tmp_path):
+    x = _vectors(140)
+    index, store = ExactIndex(), Store(100)
+    index.add(range(100), x[:100])
+    k, path = 6, str(tmp_path / "g")
+    build_neighbor_graph(index, store, k=k, path=path)
+    removed, added = list(range(0, 100, 9)), list(range(100, 140))
+    index.remove(removed)
+    index.add(added, x[100:])
+    store.alive = np.concatenate([store.alive, np.ones(40, dtype=np.uint8)])
+    store.alive[removed] = 0
+    g = update_neighbor_graph(index, store, removed, added, k=k, path=path)
+    full = build_neighbor_graph(index, store, k=k, path=str(tmp_path / "full"))
+    assert len(g) == len(full) == 140
+    assert not set(np.asarray(g.ids).ravel().tolist()) & set(removed)
+    for row in removed:
+        assert len(g.neighbors(row)[0]) == 0
+    for row in added:
+        assert g.neighbors(row)[0].tolist() == full.neighbors(row)[0].tolist()
+    live = [r for r in range(140) if store.alive[r]]
+    recall = np.mean([len(set(g.neighbors(r)[0].tolist()) & set(full.neighbors(r)[0].tolist())) / k for r in live])
+    assert recall > 0.95
+    # an added row that lists an older row (and belongs in its top k) is offered back to it
+    pairs = [(a, nb) for a in added for nb in g.neighbors(a)[0].tolist()
+             if nb < 100 and a in full.neighbors(nb)[0].tolist()]
+    assert pairs and all(a in g.neighbors(nb)[0].tolist() for a, nb in pairs)
+
+def test_update_without_graph_builds_one(tmp_path):
+    x = _vectors(20)
+    index, store = ExactIndex(), Store(20)
+    index.add(range(20), x)
+    g = update_neighbor_graph(index, store, [], range(10, 20), k=3, path=str(tmp_path))
+    assert NeighborGraph.exists(str(tmp_path)) and len(g) == 20 and all(len(g.neighbors(r)[0]) == 3 for r in range(20))
@@ -0,0 +1,29 @@
+# tests/test_pipeline.py
+from model_registry import ModelRegistry
+from pipeline import PipelineContext
+
+class FakeRegistry(ModelRegistry):
+    def __init__(self):
+        super().__init__()
+        self.evicted = []
+
+    def evict(self, kind, path, precision="fp32"):
+        self.evicted.append((kind, path))
+
+def test_close_keeps_shared_models_by_default(tmp_path):
+    reg = FakeRegistry()
+    with PipelineContext(meta_dir=str(tmp_path / "meta"), registry=reg):
+        pass
+    ctx = PipelineContext(registry=reg)
+    ctx.close()
+    assert reg.evicted == []
+
+def test_close_evicts_models_on_request():
+    reg = FakeRegistry()
+    PipelineContext(registry=reg, emb_model="emb", verifier_path="ver", cross_encoder_path="ce").close(evict_models=True)
+    assert reg.evicted == [("embedder", "emb"), ("verifier", "ver"), ("cross_encoder", "ce")]
+
+def test_missing_optional_resources_are_none(tmp_path):
+    ctx = PipelineContext(bm25_dir=str(tmp_path / "bm25"), neighbors_dir=str(tmp_path / "nb"),
+                          table_db=str(tmp_path / "tables.sqlite"))
+    assert ctx.lexical is None and ctx.neighbors is None and ctx.tables is None
@@ -0,0 +1,60 @@
+# tests/test_rerank_cascade.py
+import numpy as np
+import pytest
+
+from rerank_cascade import RerankCascade
+
+class Scorer:
+    """Cross scores looked up by passage text; records the size of every predict call."""
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def predict(self, pairs, batch_size=16):
+        self.calls.append(len(pairs))
+        return np.array([self.scores[p] for _, p in pairs], dtype="float32")
+
+class Ctx:
+    lexical = None
+
+def _cands(texts, dense=0.5):
+    return [{"row": i, "score": dense, "fused": 1.0 / (60 + i), "meta": {"text": t}} for i, t in enumerate(texts)]
+
+def test_scores_everything_without_early_exit():
+    texts = [f"p{i}" for i in range(6)]
+    scorer = Scorer({t: i / 10 for i, t in enumerate(texts)})
+    cascade = RerankCascade(scorer=scorer, prune_n=None, early_exit=False)
+    top = cascade.rerank("q", _cands(texts), topn=3)
+    assert [c["row"] for c in top] == [5, 4, 3] and scorer.calls == [6]
+    assert top[0]["combined"] == pytest.approx(0.5 * 0.5 + 0.5 * 0.5) and cascade.exits == 0
+
+def test_cheap_stage_prunes_by_fused_rank():
+    texts = [f"p{i}" for i in range(10)]
+    scorer = Scorer({t: 0.5 for t in texts})
+    cascade = RerankCascade(scorer=scorer, prune_n=4, early_exit=False)
+    top = cascade.rerank_batch(["q"], [_cands(texts)], topn=10, ctx=Ctx())[0]
+    assert sorted(c["row"] for c in top) == [0, 1, 2, 3] and cascade.pairs == 4
+
+def test_early_exit_in_lockstep():
+    texts = [f"p{i}" for i in range(10)]
+    # query a: only the first two passages are relevant, so it exits after the second round;
+    # query b: relevance rises down the list, so every survivor is scored
+    a = {t: (0.9 if i < 2 else 0.0) for i, t in enumerate(texts)}
+    b = {f"b{i}": i / 10 for i in range(10)}
+    scorer = Scorer({**a, **b})
+    cascade = RerankCascade(scorer=scorer, prune_n=None, chunk=2)
+    top_a, top_b = cascade.rerank_batch(["qa", "qb"], [_cands(texts), _cands(list(b))], topn=2)
+    assert [c["row"] for c in top_a] == [0, 1] and [c["row"] for c in top_b] == [9, 8]
+    assert cascade.exits == 1 and scorer.calls == [4, 4, 2, 2, 2]  # a drops out after the second round
+    assert cascade.pairs == sum(scorer.calls) == 14
+
+def test_margin_keeps_close_rounds_going():
+    texts = [f"p{i}" for i in range(8)]
+    scorer = Scorer({t: (0.9 if i < 2 else 0.8) for i, t in enumerate(texts)})
+    # later rounds add nothing to the top 2 but trail it by only 0.05: within the margin
+    cascade = RerankCascade(scorer=scorer, prune_n=None, chunk=2, margin=0.1)
+    assert [c["row"] for c in cascade.rerank("q", _cands(texts), topn=2)] == [0, 1]
+    assert cascade.exits == 0 and cascade.pairs == 8
+    cascade = RerankCascade(scorer=scorer, prune_n=None, chunk=2, margin=0.01)
+    assert [c["row"] for c in cascade.rerank("q", _cands(texts), topn=2)] == [0, 1]
+    assert cascade.exits == 1 and cascade.pairs == 4
@@ -0,0 +1,22 @@
+# tests/test_retriever.py
+import pytest
+
+import retriever_gpu
+
+class Ctx:
+    lexical = None
+
+def test_rerank_keeps_fused_order_without_cross_encoder():
+    # high cosine, low fused: the fused order from hybrid_search must survive reranking
+    cands = [{"row": 0, "score": 0.9, "bm25": 0.0, "fused": 0.01, "meta": {"text": "a"}},
+             {"row": 1, "score": 0.2, "bm25": 5.0, "fused": 0.03, "meta": {"text": "b"}},
+             {"row": 2, "score": 0.5, "bm25": 1.0, "fused": 0.02, "meta": {"text": "c"}}]
+    top = retriever_gpu.hybrid_rerank_batch(["q"], [cands], topn=2, ctx=Ctx())[0]
+    assert [c["row"] for c in top] == [1, 2]
+
+def test_rerank_combines_without_fused():
+    pytest.importorskip("fuzzywuzzy")  # lexical fallback without a BM25 index
+    cands = [{"row": 0, "score": 0.9, "meta": {"text": "unrelated"}},
+             {"row": 1, "score": 0.2, "meta": {"text": "unrelated"}}]
+    top = retriever_gpu.hybrid_rerank_batch(["q"], [cands], ctx=Ctx())[0]
+    assert [c["row"] for c in top] == [0, 1] and "lex" in top[0]
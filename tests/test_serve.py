@@ -0,0 +1,107 @@
+# tests/test_serve.py
+import asyncio, gc, time
+
+import pytest
+
+from serve import DeadlineExceeded, MicroBatcher, RAGService
+
+def _run(coro):
+    """asyncio.run that also fails on exceptions the loop reports as never retrieved."""
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        try:
+            return await coro
+        finally:
+            gc.collect()
+            await asyncio.sleep(0.05)
+    out = asyncio.run(main())
+    assert not errors, errors
+    return out
+
+def test_micro_batcher_batches_and_maps_results():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        time.sleep(0.02)
+        return [x * 10 for x in items]
+
+    async def main():
+        b = MicroBatcher("t", fn, max_batch=4, max_wait_ms=20)
+        b.start()
+        loop = asyncio.get_running_loop()
+        out = await b.submit_many(list(range(6)), loop.time() + 5)
+        await b.stop()
+        return out, b.stats()
+    out, stats = _run(main())
+    assert out == [0, 10, 20, 30, 40, 50]
+    assert sorted(x for c in calls for x in c) == list(range(6)) and max(map(len, calls)) == 4
+    assert stats["items"] == 6 and stats["batches"] == len(calls)
+
+def test_micro_batcher_drops_expired_items():
+    seen = []
+
+    def fn(items):
+        seen.extend(items)
+        time.sleep(0.2)
+        return items
+
+    async def main():
+        b = MicroBatcher("t", fn, max_batch=1, max_wait_ms=1)
+        b.start()
+        loop = asyncio.get_running_loop()
+        slow = asyncio.ensure_future(b.submit("first", loop.time() + 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            await b.submit("late", loop.time() + 0.05)  # queued behind a 200 ms batch
+        assert await slow == "first"
+        await asyncio.sleep(0.05)
+        await b.stop()
+    _run(main())
+    assert seen == ["first"]  # the expired item never reached the model
+
+def test_micro_batcher_propagates_errors():
+    def fn(items):
+        raise ValueError("model failed")
+
+    async def main():
+        b = MicroBatcher("t", fn, max_batch=4)
+        b.start()
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(b.submit(1, loop.time() + 5), b.submit(2, loop.time() + 5), return_exceptions=True)
+        await b.stop()
+        return results
+    assert all(isinstance(r, ValueError) for r in _run(main()))
+
+def _fns(verify_s=0.0, n_claims=3):
+    def verify(pairs):
+        time.sleep(verify_s)
+        return [0.9 if "chunk 0" in texts else 0.1 for _, texts in pairs]
+    return {
+        "search": lambda items: [[{"chunk_id": f"c{i}", "score": 1 - i / 10, "meta": {"text": f"chunk {i}"}}
+                                  for i in range(6)] for _ in items],
+        "rerank": lambda items: [cands for _, cands in items],
+        "generate": lambda items: [". ".join(f"Claim {i}" for i in range(n_claims)) for _ in items],
+        "verify": verify,
+        "claims": lambda answer: [{"text": s, "citations": []} for s in answer.split(". ")],
+    }
+
+def test_ask_streams_events():
+    async def main():
+        async with RAGService(stage_fns=_fns(), max_wait_ms=1) as service:
+            return [ev async for ev in service.ask("q", timeout_s=5)]
+    events = _run(main())
+    assert [e["type"] for e in events] == ["evidence", "answer", "verification", "verification", "verification", "done"]
+    assert all(e["mes"] == ["c0"] and e["p_entail"] == 0.9 for e in events if e["type"] == "verification")
+
+def test_ask_meets_the_deadline_with_slow_verification():
+    async def main():
+        async with RAGService(stage_fns=_fns(verify_s=0.3), max_wait_ms=1, mes_strategy="deletion") as service:
+            t0 = time.perf_counter()
+            events = [ev async for ev in service.ask("q", timeout_s=0.5)]
+            return events, time.perf_counter() - t0
+    events, took = _run(main())
+    assert events[-1]["type"] == "error" and events[-1]["stage"] == "verify"
+    assert took < 0.8  # not one timeout per claim
@@ -0,0 +1,45 @@
+# tests/test_table_store.py
+import pytest
+
+from table_store import TableStore, label_terms, parse_cell, parse_table
+
+INCOME = "0,1,2\nItem,FY2023,FY2022\nNet income,\"96,995\",\"99,803\"\nRevenue,383285,394328\nNotes,see below,\n"
+DATES = "Event,Date\nRecord date,31 March 2023\nPayment date,15 April 2023\n"
+
+@pytest.fixture
+def store(tmp_path):
+    s = TableStore(str(tmp_path / "tables.sqlite"))
+    s.add_document("apple", [{"table_id": "apple-t1", "page": 4, "csv": INCOME}])
+    s.add_document("divs", [{"table_id": "divs-t1", "page": 9, "csv": DATES}])
+    yield s
+    s.close()
+
+def test_parse_table_and_cells():
+    cols, body = parse_table(INCOME)
+    assert cols == ["Item", "FY2023", "FY2022"]  # the positional header row is dropped
+    assert [label for label, _ in body] == ["Net income", "Revenue", "Notes"]
+    assert parse_cell("96,995") == (96995.0, None) and parse_cell("") == (None, None)
+    assert parse_cell("31 March 2023") == (None, "2023-03-31T00:00:00")
+    assert label_terms("What was net income in FY2023?") == {"net", "income", "fy2023", "2023"}
+
+def test_probe_returns_the_matching_cell(store):
+    hits = store.probe("What was Apple net income in FY2023?")
+    assert hits[0]["table_id"] == "apple-t1" and hits[0]["page"] == 4
+    assert (hits[0]["row"], hits[0]["col"], hits[0]["value"]) == ("Net income", "FY2023", 96995.0)
+    # the other year of the matched row scores lower; text cells are never returned
+    assert [h["col"] for h in hits if h["row"] == "Net income"] == ["FY2023", "FY2022"]
+    assert all(h["row"] != "Notes" for h in hits)
+    assert hits == sorted(hits, key=lambda h: h["score"], reverse=True)
+
+def test_probe_dates_and_misses(store):
+    hits = store.probe("When is the payment date?")
+    assert hits[0]["row"] == "Payment date" and hits[0]["date"] == "2023-04-15T00:00:00"
+    assert store.probe("the of and") == [] and store.probe("unrelated wording") == []
+    assert store.probe("net income", min_score=100) == []
+    assert len(store.probe("net income revenue", k=1)) == 1
+
+def test_reload_and_remove(store):
+    assert not store.add_document("apple", [{"table_id": "apple-t1", "page": 4, "csv": INCOME}])
+    store.remove_document("apple")
+    assert len(store) == 1 and store.probe("net income FY2023") == []
+    assert store._db.execute("SELECT df FROM term_df WHERE term = 'income'").fetchone()[0] == 0
@@ -0,0 +1,61 @@
+# tests/test_tracing.py
+import threading
+
+import pytest
+
+import tracing
+
+def _span(name, span, dur_ms, parent=None, **attrs):
+    return {"name": name, "span": span, "parent": parent, "dur_ms": dur_ms, **attrs}
+
+def test_summarize_ranks_by_self_time():
+    spans = [_span("request", "r1", 100.0), _span("retrieve", "a", 30.0, "r1", batch=4),
+             _span("embed", "e", 25.0, "a"), _span("generate", "g", 60.0, "r1", batch=2, error="Timeout"),
+             _span("request", "r2", 50.0), _span("generate", "g2", 45.0, "r2", batch=4)]
+    rows = {r["stage"]: r for r in tracing.summarize(spans)}
+    assert [r["stage"] for r in tracing.summarize(spans)] == ["generate", "embed", "request", "retrieve"]
+    assert rows["request"]["self_s"] == pytest.approx((10 + 5) / 1000)
+    assert rows["request"]["total_s"] == pytest.approx(0.15) and rows["request"]["calls"] == 2
+    assert rows["retrieve"]["self_s"] == pytest.approx(0.005) and rows["retrieve"]["mean_batch"] == 4
+    assert rows["generate"]["mean_batch"] == 3 and rows["generate"]["errors"] == 1
+    assert rows["embed"]["mean_batch"] is None
+    assert sum(r["self_pct"] for r in rows.values()) == pytest.approx(100)
+
+def test_self_time_never_negative():
+    # children that overlap (concurrent spans) can add up to more than their parent
+    rows = tracing.summarize([_span("p", "p", 10.0), _span("c", "c1", 8.0, "p"), _span("c", "c2", 8.0, "p")])
+    assert {r["stage"]: r["self_s"] for r in rows} == {"c": 0.016, "p": 0.0}
+
+def test_spans_record_parents(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    tracing.enable(path, append=False)
+    try:
+        with tracing.span("outer"):
+            with tracing.span("inner", batch=3):
+                pass
+    finally:
+        tracing.disable()
+    inner, outer = tracing.load_trace(path)
+    assert inner["parent"] == outer["span"] and inner["trace"] == outer["trace"] and inner["batch"] == 3
+
+def test_overlapping_cprofile_blocks_are_counted(tmp_path):
+    started, release, paths = threading.Event(), threading.Event(), []
+
+    def hold():
+        with tracing.profile("first", "cprofile", out_dir=str(tmp_path)) as p:
+            paths.append(p)
+            started.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    started.wait(5)
+    before = tracing.profiles_skipped()
+    with tracing.profile("second", "cprofile", out_dir=str(tmp_path)) as p:
+        assert p is None
+    with tracing.profile("third", "sample", out_dir=str(tmp_path)) as p:
+        assert p.endswith("third.folded")
+    release.set()
+    t.join()
+    assert tracing.profiles_skipped() == before + 1
+    assert paths[0].endswith("first.prof") and (tmp_path / "first.prof").exists()
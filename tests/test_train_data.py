@@ -0,0 +1,29 @@
+# tests/test_train_data.py
+import random
+
+from train_data import TokenBudgetBatchSampler
+from utils import length_batches
+
+LENGTHS = [random.Random(i).randint(5, 256) for i in range(2000)]
+
+def test_every_epoch_covers_each_position_once_under_budget():
+    sampler = TokenBudgetBatchSampler(LENGTHS, max_tokens=2048, max_batch=64, seed=1)
+    for _ in range(3):
+        batches = list(sampler)
+        assert len(batches) == len(sampler)
+        assert sorted(i for b in batches for i in b) == list(range(len(LENGTHS)))
+        assert all(len(b) <= 64 and len(b) * max(LENGTHS[i] for i in b) <= 2048 for b in batches)
+
+def test_batches_are_reshuffled_within_length_buckets():
+    sampler = TokenBudgetBatchSampler(LENGTHS, max_tokens=2048, max_batch=64, seed=1, bucket_width=16)
+    first, second = (list(map(frozenset, sampler)) for _ in range(2))
+    assert set(first) != set(second)  # batch membership changes, not just the batch order
+    for b in first:
+        buckets = {-(-LENGTHS[i] // 16) for i in b}
+        assert max(buckets) - min(buckets) <= 1  # members stay of similar length
+    sampler.set_epoch(0)
+    assert list(map(frozenset, sampler)) == first
+
+def test_without_shuffle_matches_length_batches():
+    sampler = TokenBudgetBatchSampler(LENGTHS, max_tokens=4096, max_batch=128, shuffle=False, bucket_width=1)
+    assert list(sampler) == list(length_batches(LENGTHS, 128, 4096)) == list(sampler)
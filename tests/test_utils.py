@@ -0,0 +1,36 @@
+# tests/test_utils.py
+import random
+import pytest
+from utils import length_batches, prefetch
+
+def test_length_batches_cover_every_position_once():
+    lengths = [random.Random(i).randint(1, 300) for i in range(500)]
+    batches = list(length_batches(lengths, max_batch=32, max_tokens=2048))
+    assert sorted(i for b in batches for i in b) == list(range(500))
+
+def test_length_batches_respect_size_and_token_budget():
+    lengths = [random.Random(i).randint(1, 300) for i in range(500)]
+    for b in length_batches(lengths, max_batch=32, max_tokens=2048):
+        assert len(b) <= 32
+        assert len(b) * max(lengths[i] for i in b) <= 2048
+
+def test_length_batches_group_similar_lengths():
+    lengths = [5, 100, 6, 101, 7, 102]
+    assert list(length_batches(lengths, max_batch=3, max_tokens=10**6)) == [[0, 2, 4], [1, 3, 5]]
+
+def test_length_batches_oversized_item_gets_its_own_batch():
+    assert list(length_batches([10, 5000, 10], max_batch=8, max_tokens=100)) == [[0, 2], [1]]
+
+def test_length_batches_empty():
+    assert list(length_batches([], 8, 100)) == []
+
+def test_prefetch_keeps_order_and_reraises():
+    assert list(prefetch(iter(range(50)), depth=3)) == list(range(50))
+
+    def failing():
+        yield 1
+        raise KeyError("boom")
+    it = prefetch(failing())
+    assert next(it) == 1
+    with pytest.raises(KeyError):
+        next(it)
@@ -0,0 +1,41 @@
+# tests/test_verifier_cache.py
+from verifier_cache import CachedVerifier, VerifierCache, cache_key
+
+def test_key_normalizes_whitespace_and_case_but_keeps_order():
+    assert cache_key("A  claim", ["x", "y"]) == cache_key("a claim ", ["X", " y"])
+    assert cache_key("a claim", ["x", "y"]) != cache_key("a claim", ["y", "x"])
+    assert cache_key("a claim", ["xy"]) != cache_key("a claim", ["x", "y"])
+    assert cache_key("a claim", ["x"], tag="v1") != cache_key("a claim", ["x"], tag="v2")
+
+def test_memory_lru_bound():
+    cache = VerifierCache(max_items=2)
+    cache.put_many([("a", 0.1), ("b", 0.2)])
+    assert cache.get("a") == 0.1  # a becomes most recent
+    cache.put_many([("c", 0.3)])
+    assert cache.get("b") is None
+    assert cache.get("a") == 0.1 and cache.get("c") == 0.3
+
+def test_disk_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    cache = VerifierCache(db_path=db)
+    cache.put_many([("k", 0.75)])
+    cache.close()
+    cache = VerifierCache(db_path=db)
+    assert cache.get("k") == 0.75
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("k") == 0.75
+    assert cache.stats()["memory_hits"] == 1
+    cache.close()
+
+def test_cached_verifier_only_scores_unseen_pairs_once():
+    calls = []
+
+    def predict_batch(pairs):
+        calls.append(list(pairs))
+        return [len(texts) / 10 for _, texts in pairs]
+    v = CachedVerifier(predict_batch, cache=VerifierCache())
+    pairs = [("c", ["a"]), ("c", ["a", "b"]), ("c", ["a"])]
+    assert v.predict_batch(pairs) == [0.1, 0.2, 0.1]
+    assert calls == [[("c", ["a"]), ("c", ["a", "b"])]]  # the repeat inside the batch is deduped
+    assert v.predict("c", ["a", "b"]) == 0.2
+    assert len(calls) == 1